@@ -0,0 +1,86 @@
+# analysis_cache.py
+"""
+Cache des résultats d'analyse
+=============================
+
+Une analyse complète est identifiée par les empreintes SHA-256 des
+fichiers j, jMinus1 et mMinus1 et par la version des spécifications de
+tableaux (table_specs.SPEC_VERSION). Relancer l'analyse sur les mêmes
+fichiers, depuis l'interface ou le préchargement planifié, retourne le
+résultat conservé avec le même ETag, sans recalcul ni réécriture de
+l'historique.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from table_specs import SPEC_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Nombre d'analyses conservées en mémoire (LRU)
+ANALYSIS_CACHE_SIZE = 8
+
+_analyses = OrderedDict()
+_lock = threading.Lock()
+
+
+def analysis_key(file_hashes: dict):
+    """Clé d'une analyse à partir des empreintes {"j", "jMinus1", "mMinus1"}, None si incomplète"""
+    hashes = (file_hashes.get("j"), file_hashes.get("jMinus1"), file_hashes.get("mMinus1"))
+    return None if None in hashes else hashes + (SPEC_VERSION,)
+
+
+def analysis_etag(key) -> str:
+    return '"' + hashlib.sha256("|".join(key).encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def get_cached_analysis(file_hashes: dict):
+    """Entrée {"results", "etag", "source", "computed_at", ...} ou None"""
+    key = analysis_key(file_hashes)
+    if key is None:
+        return None
+    with _lock:
+        entry = _analyses.get(key)
+        if entry is not None:
+            _analyses.move_to_end(key)
+        return entry
+
+
+def store_analysis(file_hashes: dict, results: dict, source: str, **extra):
+    """
+    Conserve une analyse (source: "analyze", "prefetch", ...).
+    Retourne l'entrée, ou None si les empreintes sont incomplètes.
+    """
+    key = analysis_key(file_hashes)
+    if key is None:
+        return None
+
+    entry = {
+        "results": results,
+        "etag": analysis_etag(key),
+        "source": source,
+        "spec_version": SPEC_VERSION,
+        "computed_at": datetime.now().isoformat(),
+        **extra,
+    }
+    with _lock:
+        _analyses[key] = entry
+        _analyses.move_to_end(key)
+        while len(_analyses) > ANALYSIS_CACHE_SIZE:
+            _analyses.popitem(last=False)
+    return entry
+
+
+def cached_analyses(source: str = None):
+    """Entrées conservées (sans les résultats), filtrées par source si donnée"""
+    with _lock:
+        entries = list(_analyses.values())
+    return [
+        {k: v for k, v in entry.items() if k != "results"}
+        for entry in entries
+        if source is None or entry["source"] == source
+    ]
@@ -0,0 +1,189 @@
+# analysis_jobs.py
+"""
+Jobs d'analyse en tâche de fond
+===============================
+
+L'analyse complète est soumise comme job : l'endpoint retourne
+immédiatement un job_id et les tableaux sont calculés dans un thread
+dédié. Chaque tableau terminé est ajouté au journal d'événements du job,
+diffusé en Server-Sent Events : le navigateur affiche les tableaux au fur
+et à mesure, et le flux (avec battements de cœur) ne laisse plus de
+requête muette pendant toute la durée de l'analyse.
+
+Événements : started (liste des tableaux), table (nom + tableau),
+done (résultat final du job) ou failed (message d'erreur). Avec
+compact=True, le tableau de chaque événement table est au format compact
+de wire_format (libellés propres à l'événement).
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from wire_format import dumps, encode_compact
+
+logger = logging.getLogger(__name__)
+
+# Une analyse à la fois : chaque analyse parallélise déjà ses trois périodes
+ANALYSIS_JOB_WORKERS = 1
+
+# Durée de conservation des jobs terminés (secondes)
+JOB_RETENTION_SECONDS = 3600
+
+# Scrutation du journal d'événements et battement de cœur du flux SSE (secondes)
+SSE_POLL_SECONDS = 0.2
+SSE_HEARTBEAT_SECONDS = 15
+
+# Jobs d'analyse : job_id -> état
+analysis_jobs = {}
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=ANALYSIS_JOB_WORKERS, thread_name_prefix="analysis-job")
+    return _executor
+
+
+def shutdown_analysis_jobs():
+    """Arrête le thread des jobs d'analyse (à l'arrêt de l'application)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _purge_finished_jobs():
+    now = time.monotonic()
+    for job_id in list(analysis_jobs):
+        finished = analysis_jobs[job_id].get("finished")
+        if finished is not None and now - finished > JOB_RETENTION_SECONDS:
+            del analysis_jobs[job_id]
+
+
+def _emit(job, event: str, **payload):
+    # list.append est atomique : le thread d'analyse et la boucle asyncio écrivent sans verrou
+    job["events"].append({"event": event, **payload})
+
+
+def submit_analysis(run_tables, table_names, on_complete):
+    """
+    Enregistre un job d'analyse et retourne son état sans attendre le calcul.
+
+    run_tables: fonction () -> itérable de (nom, tableau), exécutée dans un thread
+    table_names: noms des tableaux attendus (annoncés dans l'événement started)
+    on_complete: fonction (job, results) -> dict, appelée sur la boucle asyncio ;
+                 son retour devient le résultat du job
+    """
+    _purge_finished_jobs()
+    loop = asyncio.get_running_loop()
+
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "status": "running",
+        "tables": list(table_names),
+        "submitted_at": datetime.now().isoformat(),
+        "started": time.monotonic(),
+        "finished": None,
+        "events": [],
+        "result": None,
+        "error": None,
+    }
+    analysis_jobs[job["job_id"]] = job
+    _emit(job, "started", tables=job["tables"])
+
+    def produce():
+        results = {}
+        for name, table in run_tables():
+            results[name] = table
+            _emit(job, "table", name=name, table=table)
+        return results
+
+    future = loop.run_in_executor(_get_executor(), produce)
+    job["task"] = asyncio.create_task(_finalize(job, future, on_complete))
+    return job
+
+
+async def _finalize(job, future, on_complete):
+    try:
+        results = await future
+        job["result"] = on_complete(job, results)
+        job["status"] = "done"
+        _emit(job, "done", **job["result"])
+        logger.info(f"Analyse {job['job_id'][:8]} terminée en {time.monotonic() - job['started']:.1f}s")
+    except Exception as e:
+        job["status"] = "error"
+        job["error"] = str(e)
+        _emit(job, "failed", error=str(e))
+        logger.error(f"Erreur analyse {job['job_id'][:8]}: {e}")
+    finally:
+        job["finished"] = time.monotonic()
+
+
+def get_job_status(job_id: str):
+    """État public d'un job (sans le journal d'événements), ou None"""
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return None
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "tables": job["tables"],
+        "tables_done": sum(1 for event in job["events"] if event["event"] == "table"),
+        "submitted_at": job["submitted_at"],
+        "elapsed_seconds": round((job["finished"] or time.monotonic()) - job["started"], 3),
+        "result": job["result"],
+        "error": job["error"],
+    }
+
+
+def _format_event(event_id: int, event: dict, compact: bool = False, prepare_table=None) -> str:
+    if "table" in event:
+        table = prepare_table(event["name"], event["table"]) if prepare_table else event["table"]
+        event = {**event, "table": encode_compact(table) if compact else table}
+    data = dumps(event).decode("utf-8")
+    return f"id: {event_id}\nevent: {event['event']}\ndata: {data}\n\n"
+
+
+def _resume_cursor(last_event_id) -> int:
+    """Premier événement à envoyer après l'en-tête Last-Event-ID (0 si absent ou invalide)"""
+    if last_event_id is None:
+        return 0
+    try:
+        return max(int(last_event_id) + 1, 0)
+    except (TypeError, ValueError):
+        logger.warning(f"⚠️ Last-Event-ID invalide ignoré: {last_event_id!r}")
+        return 0
+
+
+async def stream_job_events(job_id: str, last_event_id=None, compact: bool = False, prepare_table=None):
+    """
+    Générateur SSE du journal d'un job, à partir de l'événement suivant
+    last_event_id (reprise après reconnexion du navigateur)
+    compact: tableaux au format compact (wire_format)
+    prepare_table: fonction (nom, tableau) -> tableau envoyé (élagage), optionnelle
+    """
+    job = analysis_jobs[job_id]
+    cursor = _resume_cursor(last_event_id)
+    last_sent = time.monotonic()
+
+    while True:
+        events = job["events"]
+        while cursor < len(events):
+            yield _format_event(cursor, events[cursor], compact, prepare_table)
+            cursor += 1
+            last_sent = time.monotonic()
+
+        if job["finished"] is not None and cursor >= len(job["events"]):
+            return
+
+        if time.monotonic() - last_sent > SSE_HEARTBEAT_SECONDS:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
+
+        await asyncio.sleep(SSE_POLL_SECONDS)
@@ -0,0 +1,104 @@
+# compute_backend.py
+"""
+Moteur de calcul de l'agrégation des cubes
+==========================================
+
+L'étape coûteuse de l'analyse est l'agrégation de chaque fichier complet
+en cube (lcr_tables.build_cube) : somme des mesures par combinaison des
+dimensions, sur les lignes Top Conso = "O". Elle passe par un moteur
+interchangeable :
+
+- "pandas" : implémentation de référence
+- "polars" : group_by multithread de Polars (paquet optionnel)
+
+Le moteur retourne toujours un DataFrame pandas aux colonnes de dimension
+catégorielles (mêmes catégories que le fichier source) et aux mesures en
+float64 : le plan de table_specs, les tableaux et le JSON servi à
+main.js sont identiques quel que soit le moteur.
+
+Le moteur est choisi par déploiement (ANALYSIS_BACKEND dans run2.py).
+"""
+
+import logging
+
+import pandas as pd
+
+try:
+    import polars as pl
+except ImportError:  # polars absent : seul le moteur pandas est disponible
+    pl = None
+
+logger = logging.getLogger(__name__)
+
+
+class PandasBackend:
+    """Agrégation de référence (pandas groupby)"""
+
+    name = "pandas"
+
+    def aggregate(self, df, mask, dimensions, measures):
+        """
+        Somme des mesures par combinaison présente des dimensions
+        mask: masque booléen numpy des lignes retenues, ou None pour toutes
+        """
+        rows = df[mask] if mask is not None else df
+        data = rows.groupby(dimensions, observed=True, sort=False)[measures].sum().reset_index()
+        data[measures] = data[measures].astype("float64")
+        return data
+
+
+class PolarsBackend:
+    """Agrégation multithread par Polars, résultat converti en pandas"""
+
+    name = "polars"
+
+    def aggregate(self, df, mask, dimensions, measures):
+        frame = pl.from_pandas(df[dimensions + measures])
+        if mask is not None:
+            frame = frame.filter(pl.Series(mask))
+
+        data = (
+            frame.lazy()
+            .drop_nulls(dimensions)  # comme le groupby pandas (dropna)
+            .group_by(dimensions)
+            .agg([pl.col(col).cast(pl.Float64).sum() for col in measures])
+            .collect()
+            .to_pandas()
+        )
+
+        # Mêmes catégories que le fichier source (ordre trié, alignement j / jMinus1 / mMinus1)
+        for col in dimensions:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                data[col] = pd.Categorical(data[col], categories=df[col].cat.categories)
+        data[measures] = data[measures].astype("float64")
+        return data
+
+
+BACKENDS = {
+    "pandas": PandasBackend,
+    "polars": PolarsBackend,
+}
+
+_backend = PandasBackend()
+
+
+def set_compute_backend(name: str):
+    """
+    Sélectionne le moteur d'agrégation ("pandas" ou "polars").
+    Si polars n'est pas installé, le moteur pandas est conservé.
+    """
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Moteur de calcul inconnu: {name} (disponibles: {', '.join(BACKENDS)})")
+
+    if name == "polars" and pl is None:
+        logger.warning("⚠️ polars non installé : moteur de calcul pandas conservé")
+        name = "pandas"
+
+    _backend = BACKENDS[name]()
+    logger.info(f"Moteur de calcul des cubes: {name}")
+    return _backend
+
+
+def get_compute_backend():
+    return _backend
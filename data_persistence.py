@@ -1,87 +1,449 @@
+"""
+Historique des analyses (SQLite)
+================================
+
+Les connexions sont ouvertes une fois et réutilisées (HistoryConnectionPool),
+en journal WAL : les lectures de l'historique ne sont plus bloquées par une
+sauvegarde en cours. Les écritures passent par un verrou unique (un seul
+écrivain SQLite) et save_table_results enregistre tous les tableaux d'une
+analyse en une transaction.
+
+Chaque sauvegarde alimente aussi analysis_facts, table de faits au format
+long (date d'analyse, tableau, dimensions, date de colonne, mesure,
+valeur) : une série historique (ex. consommation de CIB Markets sur 60
+jours) se lit directement en SQL (get_series) sans relire les blobs JSON,
+un point par date d'analyse à la date de colonne la plus récente du fichier.
+Dates d'analyse et de colonne sont enregistrées en AAAA-MM-JJ (normalize_date).
+"""
+
 import sqlite3
 import json
+import queue
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 import logging
 
+from table_specs import ASSIETTE, IMPACT
+
 logger = logging.getLogger(__name__)
 DB_PATH = Path("data/lcr_history.db")
 
+# Lecture des tableaux sauvegardés en faits : chemin jusqu'aux lignes, dimension
+# de groupe et ses valeurs par date, détails éventuels (niveau 2) et leurs valeurs
+HISTORY_FACT_LAYOUTS = {
+    "cappage": {
+        "path": ("data", "j", "pivot_data"),
+        "group": "si_remettant", "group_values": "si_totals_by_date",
+        "details": "commentaire_details", "detail": "commentaire", "detail_values": "date_values",
+        "measure": ASSIETTE,
+    },
+    "buffer_nco_buffer": {
+        "path": (),
+        "group": "section", "group_values": "section_totals_by_date",
+        "details": "client_details", "detail": "client", "detail_values": "date_values",
+        "measure": ASSIETTE,
+    },
+    "buffer_nco_nco": {
+        "path": (),
+        "group": "categorie", "group_values": "date_values",
+        "measure": ASSIETTE,
+    },
+    "consumption_resources_consumption": {
+        "path": (),
+        "group": "lcr_eco_groupe_metiers", "group_values": "dates",
+        "measure": IMPACT,
+    },
+    "consumption_resources_resources": {
+        "path": (),
+        "group": "lcr_eco_groupe_metiers", "group_values": "dates",
+        "measure": IMPACT,
+    },
+}
+
+# dimension_2 des lignes de groupe (total de section, SI Remettant, ...)
+GROUP_TOTAL = "(total)"
+
+# Formats reconnus des dates d'analyse et de colonne, enregistrées en AAAA-MM-JJ
+# (l'ordre alphabétique est alors l'ordre chronologique)
+HISTORY_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%d/%m/%Y %H:%M:%S")
+
+# Version du schéma de l'historique (PRAGMA user_version), voir _migrate_history
+HISTORY_SCHEMA_VERSION = 1
+
+# Connexions conservées ouvertes
+HISTORY_POOL_SIZE = 4
+
+# Pragmas appliqués à chaque connexion (journal_mode=WAL est persistant dans le fichier)
+HISTORY_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",  # en WAL : fsync aux checkpoints, pas à chaque commit
+    "busy_timeout": 5000,  # ms d'attente si la base est verrouillée
+    "cache_size": -16000,  # 16 MB de cache de pages
+    "temp_store": "MEMORY",
+}
+
+
+class HistoryConnectionPool:
+    """Pool de connexions SQLite longue durée, partagées entre threads"""
+
+    def __init__(self, db_path: Path, size: int = HISTORY_POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self.write_lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        for pragma, value in HISTORY_PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma}={value}")
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return self._connect()
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self):
+        """Connexion du pool, rendue à la sortie du bloc"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Connexion en transaction d'écriture (BEGIN IMMEDIATE ... COMMIT, ROLLBACK si erreur)"""
+        with self.write_lock, self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        """Ferme les connexions inactives (arrêt de l'application)"""
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._created -= 1
+
+
+_pool = None
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = HistoryConnectionPool(DB_PATH)
+    return _pool
+
+
+def close_database():
+    """Ferme les connexions de l'historique"""
+    if _pool is not None:
+        _pool.close()
+
+
 def init_database():
     """Initialise la base de données"""
     DB_PATH.parent.mkdir(exist_ok=True)
-    
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS analysis_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            analysis_date TEXT NOT NULL,
-            table_name TEXT NOT NULL,
-            data_json TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(analysis_date, table_name)
-        )
-    """)
-    
-    conn.commit()
-    conn.close()
+
+    with get_pool().transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                analysis_date TEXT NOT NULL,
+                table_name TEXT NOT NULL,
+                data_json TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(analysis_date, table_name)
+            )
+        """)
+
+        # Faits au format long : une valeur par (tableau, dimensions, date d'analyse, date de colonne)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_facts (
+                table_name TEXT NOT NULL,
+                dimension_1 TEXT NOT NULL,
+                dimension_2 TEXT NOT NULL,
+                analysis_date TEXT NOT NULL,
+                value_date TEXT NOT NULL,
+                measure TEXT NOT NULL,
+                value REAL NOT NULL,
+                PRIMARY KEY (table_name, dimension_1, dimension_2, analysis_date, value_date)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_facts_date_table
+            ON analysis_facts (analysis_date, table_name)
+        """)
+        # Dates de colonne par date d'analyse (_series_dates), sans lire les lignes
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_facts_table_date_value
+            ON analysis_facts (table_name, analysis_date, value_date)
+        """)
+
+        _migrate_history(conn)
+        backfilled = _backfill_facts(conn)
+
+    if backfilled:
+        logger.info(f"📚 Faits historiques reconstruits depuis {backfilled} sauvegardes JSON")
     logger.info("✅ Database initialized")
 
-def save_table_result(analysis_date: str, table_name: str, data: dict):
-    """Sauvegarde un résultat de tableau"""
+def normalize_date(value) -> str:
+    """Date d'analyse ou de colonne -> AAAA-MM-JJ (texte inchangé si le format est inconnu)"""
+    text = str(value).strip()
+    for date_format in HISTORY_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return text
+
+def _migrate_history(conn):
+    """
+    Version 1 : dates d'analyse en AAAA-MM-JJ. Les sauvegardes plus anciennes
+    ("09/09/2025", "2025-09-09 00:00:00") sont renommées, la plus récente
+    l'emporte si deux sauvegardes tombent sur la même date ; les faits sont
+    reconstruits (dates de colonne normalisées) par _backfill_facts.
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= HISTORY_SCHEMA_VERSION:
+        return
+
+    rows = conn.execute("""
+        SELECT id, analysis_date, table_name FROM analysis_history ORDER BY created_at, id
+    """).fetchall()
+    migrated = 0
+    for row_id, analysis_date, table_name in rows:
+        normalized = normalize_date(analysis_date)
+        if normalized == analysis_date:
+            continue
+        # Sauvegardes parcourues de la plus ancienne à la plus récente : remplace la précédente
+        conn.execute("DELETE FROM analysis_history WHERE analysis_date = ? AND table_name = ?",
+                     (normalized, table_name))
+        conn.execute("UPDATE analysis_history SET analysis_date = ? WHERE id = ?", (normalized, row_id))
+        migrated += 1
+
+    conn.execute("DELETE FROM analysis_facts")
+    conn.execute(f"PRAGMA user_version = {HISTORY_SCHEMA_VERSION}")
+    if migrated:
+        logger.info(f"📚 {migrated} sauvegardes renommées à la date AAAA-MM-JJ")
+
+def table_facts(table_name: str, data):
+    """
+    Faits d'un tableau sauvegardé : [(dimension_1, dimension_2, value_date, valeur)]
+    Vide pour un tableau sans lecture définie (HISTORY_FACT_LAYOUTS)
+    """
+    layout = HISTORY_FACT_LAYOUTS.get(table_name)
+    if layout is None:
+        return []
+
+    rows = data
+    for key in layout["path"]:
+        rows = rows.get(key, {}) if isinstance(rows, dict) else {}
+    if not isinstance(rows, list):
+        return []
+
+    facts = []
+    for row in rows:
+        group = str(row.get(layout["group"]))
+        for value_date, value in (row.get(layout["group_values"]) or {}).items():
+            if value is not None:
+                facts.append((group, GROUP_TOTAL, normalize_date(value_date), float(value)))
+
+        if "details" in layout:
+            for detail in row.get(layout["details"]) or []:
+                detail_key = str(detail.get(layout["detail"]))
+                for value_date, value in (detail.get(layout["detail_values"]) or {}).items():
+                    if value is not None:
+                        facts.append((group, detail_key, normalize_date(value_date), float(value)))
+    return facts
+
+def _write_facts(conn, analysis_date: str, tables: dict):
+    """Remplace les faits des tableaux d'une date d'analyse (dans la transaction en cours)"""
+    for table_name, data in tables.items():
+        if table_name not in HISTORY_FACT_LAYOUTS:
+            continue
+        measure = HISTORY_FACT_LAYOUTS[table_name]["measure"]
+        conn.execute("DELETE FROM analysis_facts WHERE analysis_date = ? AND table_name = ?",
+                     (analysis_date, table_name))
+        conn.executemany("""
+            INSERT OR REPLACE INTO analysis_facts
+                (table_name, dimension_1, dimension_2, analysis_date, value_date, measure, value)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(table_name, dimension_1, dimension_2, analysis_date, value_date, measure, value)
+              for dimension_1, dimension_2, value_date, value in table_facts(table_name, data)])
+
+def _backfill_facts(conn):
+    """Faits des sauvegardes JSON antérieures à analysis_facts (table de faits vide)"""
+    if conn.execute("SELECT 1 FROM analysis_facts LIMIT 1").fetchone():
+        return 0
+
+    rows = conn.execute("SELECT analysis_date, table_name, data_json FROM analysis_history").fetchall()
+    for analysis_date, table_name, data_json in rows:
+        _write_facts(conn, analysis_date, {table_name: json.loads(data_json)})
+    return len(rows)
+
+def save_table_results(analysis_date: str, tables: dict):
+    """
+    Sauvegarde les tableaux d'une analyse {table_name: data} en une seule
+    transaction, à la date d'analyse normalisée (AAAA-MM-JJ)
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT OR REPLACE INTO analysis_history (analysis_date, table_name, data_json)
-            VALUES (?, ?, ?)
-        """, (analysis_date, table_name, json.dumps(data, ensure_ascii=False)))
-        
-        conn.commit()
-        conn.close()
-        logger.info(f"💾 Saved {table_name} for {analysis_date}")
+        analysis_date = normalize_date(analysis_date)
+        rows = [(analysis_date, table_name, json.dumps(data, ensure_ascii=False))
+                for table_name, data in tables.items()]
+        started = datetime.now()
+
+        with get_pool().transaction() as conn:
+            conn.executemany("""
+                INSERT OR REPLACE INTO analysis_history (analysis_date, table_name, data_json)
+                VALUES (?, ?, ?)
+            """, rows)
+            _write_facts(conn, analysis_date, tables)
+
+        elapsed_ms = (datetime.now() - started).total_seconds() * 1000
+        logger.info(f"💾 Saved {', '.join(tables)} for {analysis_date} ({elapsed_ms:.0f} ms)")
+        return True
     except Exception as e:
-        logger.error(f"❌ Error saving {table_name}: {e}")
+        logger.error(f"❌ Error saving {', '.join(tables)}: {e}")
+        return False
+
+def save_table_result(analysis_date: str, table_name: str, data: dict):
+    """Sauvegarde un résultat de tableau"""
+    return save_table_results(analysis_date, {table_name: data})
 
 def get_historical_data(table_name: str, days_back: int = 10):
     """Récupère les N dernières DATES DISTINCTES pour un tableau"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # D'abord, récupérer les N dernières dates distinctes
-        cursor.execute("""
-            SELECT DISTINCT analysis_date
-            FROM analysis_history
-            WHERE table_name = ?
-            ORDER BY analysis_date DESC
-            LIMIT ?
-        """, (table_name, days_back))
-        
-        dates = [row[0] for row in cursor.fetchall()]
-        
-        if not dates:
-            conn.close()
-            return []
-        
-        # Ensuite, récupérer la donnée la plus récente pour chaque date
-        placeholders = ','.join('?' * len(dates))
-        cursor.execute(f"""
-            SELECT analysis_date, data_json
-            FROM analysis_history
-            WHERE table_name = ? AND analysis_date IN ({placeholders})
-            GROUP BY analysis_date
-            HAVING created_at = MAX(created_at)
-            ORDER BY analysis_date DESC
-        """, (table_name, *dates))
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+
+            # D'abord, récupérer les N dernières dates distinctes
+            cursor.execute("""
+                SELECT DISTINCT analysis_date
+                FROM analysis_history
+                WHERE table_name = ?
+                ORDER BY analysis_date DESC
+                LIMIT ?
+            """, (table_name, days_back))
+
+            dates = [row[0] for row in cursor.fetchall()]
+
+            if not dates:
+                return []
+
+            # Ensuite, récupérer la donnée la plus récente pour chaque date
+            placeholders = ','.join('?' * len(dates))
+            cursor.execute(f"""
+                SELECT analysis_date, data_json
+                FROM analysis_history
+                WHERE table_name = ? AND analysis_date IN ({placeholders})
+                GROUP BY analysis_date
+                HAVING created_at = MAX(created_at)
+                ORDER BY analysis_date DESC
+            """, (table_name, *dates))
+
+            rows = cursor.fetchall()
+
         return [(row[0], json.loads(row[1])) for row in rows]
     except Exception as e:
         logger.error(f"❌ Error retrieving {table_name}: {e}")
-        return []
\ No newline at end of file
+        return []
+
+def _series_dates(conn, table_name: str, days_back: int):
+    """
+    Date de colonne retenue pour chacune des days_back dernières dates
+    d'analyse d'un tableau : la plus récente du fichier J (un seul jour
+    ouvré par point de série). Retourne [(analysis_date, value_date)] par
+    date croissante.
+    """
+    rows = conn.execute("""
+        SELECT analysis_date, MAX(value_date)
+        FROM analysis_facts
+        WHERE table_name = ?
+        GROUP BY analysis_date
+        ORDER BY analysis_date DESC
+        LIMIT ?
+    """, (table_name, days_back)).fetchall()
+    return list(reversed(rows))
+
+def get_series(table_name: str, dimension_1: str, dimension_2: str = GROUP_TOTAL, days_back: int = 60):
+    """
+    Série d'une ligne de tableau sur les days_back dernières dates d'analyse :
+    [(analysis_date, value_date, valeur)] par date croissante, valeur à la
+    date de colonne la plus récente de chaque analyse (None si la ligne n'a
+    pas de valeur ce jour-là)
+    (ex. get_series("consumption_resources_consumption", "CIB Markets"))
+    dimension_2: détail (client, commentaire), total du groupe par défaut
+    """
+    try:
+        with get_pool().connection() as conn:
+            points = _series_dates(conn, table_name, days_back)
+            if not points:
+                return []
+
+            rows = conn.execute("""
+                SELECT analysis_date, value_date, value
+                FROM analysis_facts
+                WHERE table_name = ? AND dimension_1 = ? AND dimension_2 = ? AND analysis_date >= ?
+            """, (table_name, dimension_1, dimension_2, points[0][0])).fetchall()
+
+        values = {(analysis_date, value_date): value for analysis_date, value_date, value in rows}
+        return [(analysis_date, value_date, values.get((analysis_date, value_date)))
+                for analysis_date, value_date in points]
+    except Exception as e:
+        logger.error(f"❌ Error retrieving series {table_name}/{dimension_1}: {e}")
+        return []
+
+def get_table_series(table_name: str, days_back: int = 60, dimension_1: str = None):
+    """
+    Séries de toutes les lignes de groupe d'un tableau (ou, avec dimension_1,
+    de tous les détails de ce groupe) sur les days_back dernières dates
+    d'analyse, à la date de colonne la plus récente de chaque analyse.
+    Retourne ([(analysis_date, value_date)] croissants, {libellé: {analysis_date: valeur}})
+    """
+    try:
+        with get_pool().connection() as conn:
+            points = _series_dates(conn, table_name, days_back)
+            if not points:
+                return [], {}
+
+            if dimension_1 is None:
+                label_column, condition, params = "dimension_1", "dimension_2 = ?", (GROUP_TOTAL,)
+            else:
+                label_column, condition, params = "dimension_2", "dimension_1 = ? AND dimension_2 != ?", \
+                    (dimension_1, GROUP_TOTAL)
+
+            rows = conn.execute(f"""
+                SELECT {label_column}, analysis_date, value_date, value
+                FROM analysis_facts
+                WHERE table_name = ? AND analysis_date >= ? AND {condition}
+            """, (table_name, points[0][0], *params)).fetchall()
+
+        value_dates = dict(points)
+        series = {}
+        for label, analysis_date, value_date, value in rows:
+            if value_dates.get(analysis_date) == value_date:
+                series.setdefault(label, {})[analysis_date] = value
+        return points, series
+    except Exception as e:
+        logger.error(f"❌ Error retrieving series {table_name}: {e}")
+        return [], {}
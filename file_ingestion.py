@@ -0,0 +1,462 @@
+# file_ingestion.py
+"""
+Ingestion des fichiers sources LCR (D_PA / M_PA)
+================================================
+
+Lecture des fichiers uploadés ou récupérés depuis SharePoint et réduction
+au DataFrame minimal utilisé par les analyses (lignes Top Conso = "O",
+colonnes de required_cols uniquement).
+
+Les CSV sont lus en streaming par chunks : le filtre Top Conso et la
+projection des colonnes sont appliqués dans chaque chunk, seules les lignes
+conservées sont concaténées. Le pic mémoire suit donc la taille du DataFrame
+filtré et non celle du fichier brut.
+
+Les fichiers Excel passent par un lecteur à moteur interchangeable :
+calamine (Rust) s'il est installé, sinon openpyxl en mode read-only
+streaming pour .xlsx/.xlsm (xlrd / pyxlsb pour .xls / .xlsb). Seules les
+colonnes de REQUIRED_COLS sont matérialisées.
+
+Les colonnes de mesure sont converties une seule fois en float64 (virgule
+décimale gérée, valeurs invalides à 0) : les analyses lisent des colonnes
+déjà typées sans copie ni to_numeric.
+
+Les colonnes de dimension sont nettoyées (strip) et encodées une seule fois
+en Categorical ; les catégories sont ensuite alignées entre les fichiers
+j, jMinus1 et mMinus1 de la session pour que filtres et groupby travaillent
+sur des codes entiers communs.
+"""
+
+import io
+import logging
+from pathlib import Path
+
+import chardet
+import numpy as np
+import pandas as pd
+
+try:
+    import python_calamine  # noqa: F401  (moteur pandas "calamine")
+    HAS_CALAMINE = True
+except ImportError:
+    HAS_CALAMINE = False
+
+logger = logging.getLogger(__name__)
+
+# Colonnes conservées pour les analyses
+REQUIRED_COLS = ["Top Conso", "LCR_Catégorie", "LCR_Template Section 1", "Libellé Client",
+                 "LCR_Assiette Pondérée", "LCR_ECO_GROUPE_METIERS", "Sous-Métier", "Produit",
+                 "LCR_ECO_IMPACT_LCR", "SI Remettant", "Commentaire", "Date d'arrêté"]
+
+EXCEL_EXTENSIONS = ['.xlsx', '.xls', '.xlsm', '.xlsb']
+
+# Moteur pandas par extension quand calamine n'est pas disponible
+EXCEL_ENGINES = {'.xlsx': 'openpyxl', '.xlsm': 'openpyxl', '.xls': 'xlrd', '.xlsb': 'pyxlsb'}
+CSV_EXTENSIONS = ['.csv', '.tsv', '.txt']
+
+# Colonnes de dimension encodées en Categorical à l'ingestion
+DIMENSION_COLUMNS = ["Top Conso", "LCR_Catégorie", "LCR_Template Section 1", "Libellé Client",
+                     "LCR_ECO_GROUPE_METIERS", "Sous-Métier", "Produit", "SI Remettant",
+                     "Commentaire", "Date d'arrêté"]
+
+# Colonnes de mesure typées à l'ingestion
+MEASURE_COLUMNS = ["LCR_Assiette Pondérée", "LCR_ECO_IMPACT_LCR"]
+MEASURE_DTYPE = "float64"  # montants au centime : pas de float32
+
+# Colonne de la date d'arrêté (clé de l'historique, voir arrete_date)
+ARRETE_DATE_COLUMN = "Date d'arrêté"
+
+# Colonnes numériques des CSV (séparateur décimal virgule)
+NUMERIC_COLUMNS = ['Nominal Value', 'LCR_ECO_IMPACT_LCR']
+
+# Nombre de lignes lues par chunk en mode streaming
+CSV_CHUNK_SIZE = 200_000
+
+# Taille de l'échantillon utilisé pour détecter encodage et délimiteur
+SNIFF_SIZE = 10_000
+
+
+def detect_csv_layout(head: bytes, extension: str):
+    """Détecte l'encodage et le délimiteur à partir du début du fichier"""
+    encoding = chardet.detect(head)['encoding'] or 'utf-8'
+    # Un échantillon purement ASCII ne garantit rien sur la suite du fichier
+    if encoding.lower() == 'ascii':
+        encoding = 'utf-8'
+
+    if extension == '.tsv':
+        return encoding, '\t'
+
+    first_line = head.decode(encoding, errors='ignore').split('\n')[0]
+    if ';' in first_line:
+        delimiter = ';'
+    elif '\t' in first_line:
+        delimiter = '\t'
+    else:
+        delimiter = ','
+    return encoding, delimiter
+
+
+def convert_numeric_columns(df: pd.DataFrame):
+    """Convertit les colonnes numériques texte (virgule décimale) en nombres"""
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col].str.replace(',', '.'), errors='coerce')
+    return df
+
+
+def normalize_measure_columns(df: pd.DataFrame):
+    """
+    Convertit les colonnes de mesure en MEASURE_DTYPE.
+    Texte : espaces et virgule décimale gérés ; valeurs invalides ou vides à 0.
+    """
+    for col in MEASURE_COLUMNS:
+        if col not in df.columns:
+            continue
+
+        values = df[col]
+        if not pd.api.types.is_numeric_dtype(values):
+            values = (values.astype(str)
+                      .str.replace('\u00a0', '', regex=False)
+                      .str.replace(' ', '', regex=False)
+                      .str.replace(',', '.', regex=False))
+
+        df[col] = pd.to_numeric(values, errors='coerce').fillna(0).astype(MEASURE_DTYPE)
+    return df
+
+
+def convert_file_content_to_dataframe(file_content: bytes, filename: str):
+    """
+    Convertit le contenu d'un fichier directement en DataFrame
+    Sans écriture sur disque
+    """
+    try:
+        extension = Path(filename).suffix.lower()
+
+        # Excel - lecture directe depuis bytes
+        if extension in EXCEL_EXTENSIONS:
+            df = pd.read_excel(io.BytesIO(file_content), engine=EXCEL_ENGINES[extension])
+            df.columns = df.columns.astype(str).str.strip()
+            return df, {'format': extension, 'method': 'direct_excel'}
+
+        # CSV/TSV/TXT - traitement en mémoire
+        elif extension in CSV_EXTENSIONS:
+            encoding, delimiter = detect_csv_layout(file_content[:SNIFF_SIZE], extension)
+
+            df = pd.read_csv(
+                io.BytesIO(file_content),
+                delimiter=delimiter,
+                encoding=encoding,
+                low_memory=False,
+                dtype=str,
+                na_filter=False
+            )
+
+            # Nettoyer les colonnes
+            df.columns = df.columns.astype(str).str.strip()
+            convert_numeric_columns(df)
+
+            return df, {
+                'format': extension,
+                'encoding': encoding,
+                'delimiter': delimiter,
+                'method': 'memory_csv'
+            }
+
+        else:
+            raise ValueError(f"Format non supporté: {extension}")
+
+    except Exception as e:
+        raise ValueError(f"Erreur lecture fichier: {str(e)}")
+
+
+def read_csv_streaming(source, filename: str, chunksize: int = CSV_CHUNK_SIZE,
+                       progress_callback=None):
+    """
+    Lit un CSV par chunks en ne gardant que les lignes Top Conso = "O"
+    et les colonnes de REQUIRED_COLS.
+
+    source: contenu brut (bytes) ou objet fichier binaire (ex: UploadFile.file)
+    progress_callback: appelé après chaque chunk avec
+                       (bytes_read, rows_read, rows_kept)
+    Retourne (df_minimal, file_info)
+    """
+    try:
+        extension = Path(filename).suffix.lower()
+        buffer = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+        # Échantillon pour la détection, puis retour au début du flux
+        start = buffer.tell()
+        head = buffer.read(SNIFF_SIZE)
+        buffer.seek(start)
+
+        encoding, delimiter = detect_csv_layout(head, extension)
+        header_line = head.decode(encoding, errors='ignore').split('\n')[0]
+        original_columns = len(header_line.split(delimiter)) if header_line.strip() else 0
+
+        wanted = set(REQUIRED_COLS)
+        reader = pd.read_csv(
+            buffer,
+            delimiter=delimiter,
+            encoding=encoding,
+            dtype=str,
+            na_filter=False,
+            usecols=lambda col: str(col).strip() in wanted,
+            chunksize=chunksize
+        )
+
+        kept_chunks = []
+        columns = []
+        original_rows = 0
+        kept_rows = 0
+        chunk_count = 0
+
+        for chunk in reader:
+            chunk_count += 1
+            original_rows += len(chunk)
+            chunk.columns = chunk.columns.astype(str).str.strip()
+            columns = list(chunk.columns)
+
+            # Filtre Top Conso appliqué dans le chunk
+            if "Top Conso" in chunk.columns:
+                chunk = chunk[chunk["Top Conso"] == "O"]
+
+            if len(chunk) > 0:
+                # Mesures typées dans le chunk : le texte brut n'est pas conservé
+                kept_chunks.append(normalize_measure_columns(chunk.copy()))
+                kept_rows += len(chunk)
+
+            if progress_callback:
+                progress_callback(buffer.tell() - start, original_rows, kept_rows)
+
+        if kept_chunks:
+            df = pd.concat(kept_chunks, ignore_index=True)
+        else:
+            df = pd.DataFrame(columns=columns)
+        del kept_chunks
+
+        # Même ordre de colonnes que REQUIRED_COLS
+        ordered = [col for col in REQUIRED_COLS if col in df.columns]
+        if list(df.columns) != ordered:
+            df = df[ordered].copy()
+
+        logger.info(f"CSV streaming {filename}: {original_rows} lignes lues, "
+                    f"{len(df)} conservées ({chunk_count} chunks)")
+
+        return df, {
+            'format': extension,
+            'encoding': encoding,
+            'delimiter': delimiter,
+            'method': 'streaming_csv',
+            'original_rows': original_rows,
+            'original_columns': original_columns,
+            'chunks': chunk_count
+        }
+
+    except Exception as e:
+        raise ValueError(f"Erreur lecture fichier: {str(e)}")
+
+
+def _is_required_header(col) -> bool:
+    return str(col).strip() in REQUIRED_COLS
+
+
+def _read_excel_openpyxl_streaming(file_content: bytes):
+    """
+    Lecture openpyxl read-only ligne par ligne : seules les cellules des
+    colonnes utiles des lignes Top Conso = "O" sont conservées.
+    Retourne (df, original_rows, original_columns)
+    """
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(io.BytesIO(file_content), read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+
+        header_names = [str(h).strip() if h is not None else None for h in header]
+        original_columns = sum(1 for h in header_names if h)
+        kept = [(i, name) for i, name in enumerate(header_names) if name in REQUIRED_COLS]
+        top_conso_idx = header_names.index("Top Conso") if "Top Conso" in header_names else None
+
+        columns = {name: [] for _, name in kept}
+        original_rows = 0
+
+        for row in rows:
+            if not any(value is not None for value in row):
+                continue
+            original_rows += 1
+
+            if top_conso_idx is not None:
+                top_conso = row[top_conso_idx] if top_conso_idx < len(row) else None
+                if top_conso != "O":
+                    continue
+
+            for i, name in kept:
+                columns[name].append(row[i] if i < len(row) else None)
+    finally:
+        workbook.close()
+
+    return pd.DataFrame(columns), original_rows, original_columns
+
+
+def read_excel_minimal(file_content: bytes, filename: str):
+    """
+    Lit un fichier Excel en ne matérialisant que les colonnes de REQUIRED_COLS
+    et les lignes Top Conso = "O".
+
+    Moteurs, dans l'ordre : calamine si installé, openpyxl read-only en
+    streaming pour .xlsx/.xlsm, sinon le moteur pandas de l'extension.
+    Retourne (df_minimal, file_info)
+    """
+    try:
+        extension = Path(filename).suffix.lower()
+        df = None
+        original_rows = original_columns = None
+
+        if HAS_CALAMINE:
+            try:
+                df = pd.read_excel(io.BytesIO(file_content), engine='calamine',
+                                   usecols=_is_required_header)
+                method = 'calamine_excel'
+            except ValueError as e:
+                # pandas trop ancien pour le moteur calamine
+                logger.warning(f"Moteur calamine indisponible ({e}), repli sur openpyxl")
+                df = None
+
+        if df is None and EXCEL_ENGINES[extension] == 'openpyxl':
+            df, original_rows, original_columns = _read_excel_openpyxl_streaming(file_content)
+            method = 'openpyxl_streaming'
+        elif df is None:
+            df = pd.read_excel(io.BytesIO(file_content), engine=EXCEL_ENGINES[extension],
+                               usecols=_is_required_header)
+            method = f'{EXCEL_ENGINES[extension]}_excel'
+
+        df.columns = df.columns.astype(str).str.strip()
+
+        if original_rows is None:
+            # Lecture pandas : filtre Top Conso après lecture des colonnes utiles
+            # (avec usecols, seules les colonnes utiles sont comptées)
+            original_rows = len(df)
+            original_columns = len(df.columns)
+            df = reduce_to_minimal(df)
+        else:
+            df = df[[col for col in REQUIRED_COLS if col in df.columns]].copy()
+
+        logger.info(f"Excel {filename} ({method}): {original_rows} lignes lues, {len(df)} conservées")
+
+        return df, {
+            'format': extension,
+            'method': method,
+            'original_rows': original_rows,
+            'original_columns': original_columns
+        }
+
+    except Exception as e:
+        raise ValueError(f"Erreur lecture fichier: {str(e)}")
+
+
+def encode_dimension_columns(df: pd.DataFrame):
+    """
+    Nettoie (strip) et encode les colonnes de dimension en Categorical.
+    Le strip est appliqué aux catégories et non à chaque ligne ; les valeurs
+    manquantes deviennent "nan" comme avec l'ancien astype(str).
+    """
+    for col in DIMENSION_COLUMNS:
+        if col not in df.columns:
+            continue
+
+        values = df[col].astype("category")
+        codes = values.cat.codes.to_numpy()
+        stripped = pd.Index(values.cat.categories.astype(str).str.strip())
+
+        if (codes < 0).any():
+            stripped = stripped.append(pd.Index(["nan"]))
+            codes = np.where(codes < 0, len(stripped) - 1, codes)
+
+        # Deux catégories peuvent fusionner une fois nettoyées
+        categories = stripped.unique().sort_values()
+        remap = categories.get_indexer(stripped)
+        df[col] = pd.Categorical.from_codes(remap[codes], categories=categories)
+
+    return df
+
+
+def align_categories(dataframes):
+    """
+    Aligne les catégories des colonnes de dimension entre plusieurs DataFrames
+    (union triée), en place. Les codes d'une même valeur sont alors identiques
+    dans j, jMinus1 et mMinus1.
+    """
+    dataframes = [df for df in dataframes if df is not None]
+    for col in DIMENSION_COLUMNS:
+        frames = [df for df in dataframes
+                  if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype)]
+        if len(frames) < 2:
+            continue
+
+        categories = frames[0][col].cat.categories
+        for df in frames[1:]:
+            categories = categories.union(df[col].cat.categories)
+
+        for df in frames:
+            if not df[col].cat.categories.equals(categories):
+                df[col] = df[col].cat.set_categories(categories)
+
+
+def arrete_date(df: pd.DataFrame):
+    """
+    Date d'arrêté d'un fichier (la plus récente) au format AAAA-MM-JJ, clé
+    des sauvegardes de l'historique ; None si la colonne manque ou est vide.
+    Les libellés sont lus jour en premier (09/09/2025), comme dans les fichiers D_PA.
+    """
+    if ARRETE_DATE_COLUMN not in df.columns:
+        return None
+    labels = pd.Series(df[ARRETE_DATE_COLUMN].dropna().unique()).astype(str)
+    dates = pd.to_datetime(labels, dayfirst=True, errors="coerce").dropna()
+    return dates.max().strftime("%Y-%m-%d") if len(dates) else None
+
+
+def reduce_to_minimal(df: pd.DataFrame):
+    """Filtre Top Conso = "O" et ne garde que les colonnes utiles"""
+    df_filtered = df[df["Top Conso"] == "O"] if "Top Conso" in df.columns else df
+    available_cols = [col for col in REQUIRED_COLS if col in df_filtered.columns]
+    return df_filtered[available_cols].copy()
+
+
+def load_minimal_dataframe(source, filename: str, streaming: bool = True,
+                           progress_callback=None):
+    """
+    Point d'entrée unique de l'ingestion : retourne le DataFrame minimal
+    (filtré et projeté) et les informations de lecture du fichier.
+
+    source: bytes ou objet fichier binaire
+    streaming: lecture par chunks pour les CSV et lecteur Excel limité aux
+               colonnes utiles (sinon lecture complète)
+    progress_callback: voir read_csv_streaming (un seul appel final hors CSV)
+    """
+    extension = Path(filename).suffix.lower()
+
+    if streaming and extension in CSV_EXTENSIONS:
+        df_minimal, file_info = read_csv_streaming(source, filename,
+                                                   progress_callback=progress_callback)
+    elif streaming and extension in EXCEL_EXTENSIONS:
+        content = source if isinstance(source, (bytes, bytearray)) else source.read()
+        df_minimal, file_info = read_excel_minimal(content, filename)
+        del content
+    else:
+        content = source if isinstance(source, (bytes, bytearray)) else source.read()
+        df, file_info = convert_file_content_to_dataframe(content, filename)
+        file_info['original_rows'] = len(df)
+        file_info['original_columns'] = len(df.columns)
+        df_minimal = reduce_to_minimal(df)
+        del df, content
+
+    # Schéma d'ingestion : mesures typées, dimensions encodées
+    normalize_measure_columns(df_minimal)
+    encode_dimension_columns(df_minimal)
+
+    if progress_callback and file_info['method'] != 'streaming_csv':
+        bytes_read = len(source) if isinstance(source, (bytes, bytearray)) else source.tell()
+        progress_callback(bytes_read, file_info['original_rows'], len(df_minimal))
+
+    return df_minimal, file_info
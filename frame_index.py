@@ -0,0 +1,141 @@
+# frame_index.py
+"""
+Index de prédicats par cube
+===========================
+
+Les tableaux et le drill-down filtrent tous le même DataFrame par fichier :
+les données du cube (lcr_tables.build_cube). À la construction du cube, un
+bitmap (booléens compactés par np.packbits, 1 bit par ligne) est calculé
+pour chaque valeur distincte des colonnes filtrées : colonnes des prédicats
+de table_specs et section du drill-down. Les filtres se combinent ensuite
+par ET / OU bit à bit au lieu de rebalayer les colonnes texte, et chaque
+prédicat évalué reste en cache dans l'index, conservé avec le cube : une
+nouvelle analyse ou un drill-down sur les mêmes fichiers ne réévalue rien.
+
+Les bitmaps sont indexés par valeur et non par code de catégorie :
+align_categories peut renuméroter les codes sans invalider l'index.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+from table_specs import PREDICATES
+
+logger = logging.getLogger(__name__)
+
+# Section des tableaux BUFFER / BUFFER & NCO (drill-down par section)
+SECTION_COLUMN = "LCR_Template Section 1"
+
+# Colonnes indexées : colonnes des prédicats nommés + section
+INDEXED_COLUMNS = list(dict.fromkeys([column for column, _, _ in PREDICATES.values()] + [SECTION_COLUMN]))
+
+# Au-delà, une colonne n'est pas indexée (coût mémoire : 1 bit par ligne et par valeur)
+INDEX_MAX_CARDINALITY = 512
+
+
+class FrameIndex:
+    """Bitmaps {colonne: {valeur: bitmap}} d'un DataFrame"""
+
+    def __init__(self, df, columns=INDEXED_COLUMNS, max_cardinality: int = INDEX_MAX_CARDINALITY):
+        self.n_rows = len(df)
+        self.bitmaps = {}
+        self._predicates = {}
+
+        for col in columns:
+            if col not in df.columns:
+                continue
+
+            values = df[col]
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype("category")
+
+            codes = values.cat.codes.to_numpy()
+            present = np.unique(codes[codes >= 0])
+            if len(present) > max_cardinality:
+                logger.info(f"Index: {col} non indexée ({len(present)} valeurs)")
+                continue
+
+            categories = values.cat.categories
+            self.bitmaps[col] = {categories[code]: np.packbits(codes == code) for code in present}
+
+        # Toutes les lignes (bits de bourrage du dernier octet à 0)
+        self._all = np.packbits(np.ones(self.n_rows, dtype=bool))
+
+    def has(self, column: str) -> bool:
+        return column in self.bitmaps
+
+    def empty(self):
+        return np.zeros_like(self._all)
+
+    def value(self, column: str, value):
+        """Bitmap des lignes où column == value"""
+        bitmap = self.bitmaps[column].get(value)
+        return bitmap if bitmap is not None else self.empty()
+
+    def any_of(self, column: str, values):
+        """Bitmap des lignes où column est dans values (OU)"""
+        result = self.empty()
+        for value in values:
+            bitmap = self.bitmaps[column].get(value)
+            if bitmap is not None:
+                result = result | bitmap
+        return result
+
+    def negate(self, bitmap):
+        return ~bitmap & self._all
+
+    def predicate(self, name: str):
+        """Bitmap d'un prédicat nommé de table_specs, calculé une fois"""
+        bitmap = self._predicates.get(name)
+        if bitmap is None:
+            column, operator, values = PREDICATES[name]
+            if operator == "eq":
+                bitmap = self.value(column, values)
+            elif operator == "isin":
+                bitmap = self.any_of(column, values)
+            elif operator == "notin":
+                bitmap = self.negate(self.any_of(column, values))
+            else:
+                raise ValueError(f"Opérateur de prédicat inconnu: {operator}")
+            self._predicates[name] = bitmap
+        return bitmap
+
+    def can_evaluate(self, name: str) -> bool:
+        return self.has(PREDICATES[name][0])
+
+    def can_select(self, names=(), where=None) -> bool:
+        """select est-il possible par les seuls bitmaps (colonnes indexées) ?"""
+        return (all(self.can_evaluate(name) for name in names)
+                and all(self.has(column) for column in (where or {})))
+
+    def mask(self, bitmap):
+        """Bitmap -> masque booléen numpy de longueur n_rows"""
+        return np.unpackbits(bitmap, count=self.n_rows).astype(bool)
+
+    def select(self, *names, where=None):
+        """
+        Masque booléen des lignes vérifiant tous les prédicats nommés et
+        toutes les égalités where {colonne: valeur} (ET, un seul dépaquetage)
+        """
+        result = self._all
+        for name in names:
+            result = result & self.predicate(name)
+        for column, value in (where or {}).items():
+            result = result & self.value(column, value)
+        return self.mask(result)
+
+    def nbytes(self) -> int:
+        return sum(bitmap.nbytes for values in self.bitmaps.values() for bitmap in values.values())
+
+
+def build_frame_index(df):
+    """Construit l'index d'un DataFrame (None en cas d'échec)"""
+    try:
+        index = FrameIndex(df)
+        logger.info(f"🔎 Index de prédicats: {len(index.bitmaps)} colonnes, {index.nbytes() / 1024:.0f} KB")
+        return index
+    except Exception as e:
+        logger.warning(f"⚠️ Index de prédicats non construit: {e}")
+        return None
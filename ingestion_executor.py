@@ -0,0 +1,229 @@
+# ingestion_executor.py
+"""
+Exécuteur d'ingestion hors de la boucle asyncio
+===============================================
+
+Le parsing des fichiers sources (chardet, pandas, filtrage, cache) tourne
+dans un pool de processus : la boucle asyncio reste libre pour /health,
+le login ou le chat pendant qu'un gros fichier est traité.
+
+Un upload est enregistré comme job : l'endpoint retourne immédiatement un
+job_id, l'avancement (octets lus, lignes lues / conservées, temps écoulé)
+est publié par le processus de travail dans un dictionnaire partagé et
+exposé par /api/ingest-status/{job_id}. À la fin du parsing, le DataFrame
+est remis à l'application via le callback on_complete, exécuté sur la
+boucle asyncio.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import shutil
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from parse_cache import load_minimal_dataframe_cached
+
+logger = logging.getLogger(__name__)
+
+INGEST_TMP_DIR = Path("data/ingest_tmp")
+# Trois processus : J, J-1 et M-1 sont parsés en parallèle
+INGEST_MAX_WORKERS = 3
+# Téléchargements (I/O réseau) en parallèle
+FETCH_MAX_WORKERS = 3
+
+# Durée de conservation des jobs terminés (secondes)
+JOB_RETENTION_SECONDS = 3600
+
+# Jobs d'ingestion : job_id -> état
+ingestion_jobs = {}
+
+_executor = None
+_fetch_executor = None
+_manager = None
+_progress = None  # dict partagé entre processus : job_id -> avancement
+
+
+def _get_executor():
+    global _executor, _manager, _progress
+    if _executor is None:
+        _manager = multiprocessing.Manager()
+        _progress = _manager.dict()
+        _executor = ProcessPoolExecutor(max_workers=INGEST_MAX_WORKERS)
+        logger.info(f"Exécuteur d'ingestion démarré ({INGEST_MAX_WORKERS} processus)")
+    return _executor
+
+
+def _get_fetch_executor():
+    global _fetch_executor
+    if _fetch_executor is None:
+        _fetch_executor = ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS,
+                                             thread_name_prefix="fetch")
+    return _fetch_executor
+
+
+def shutdown_ingestion_executor():
+    """Arrête les pools de processus et de threads (à l'arrêt de l'application)"""
+    global _executor, _fetch_executor, _manager, _progress
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _manager.shutdown()
+        _executor = _manager = _progress = None
+    if _fetch_executor is not None:
+        _fetch_executor.shutdown(wait=False, cancel_futures=True)
+        _fetch_executor = None
+
+
+def _ingest_worker(job_id: str, source, filename: str, progress):
+    """
+    Exécuté dans un processus du pool.
+    source: chemin d'un fichier temporaire (str) ou contenu brut (bytes)
+    """
+    def report(bytes_read, rows_read, rows_kept):
+        progress[job_id] = {
+            "bytes_read": int(bytes_read),
+            "rows_read": int(rows_read),
+            "rows_kept": int(rows_kept),
+        }
+
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return load_minimal_dataframe_cached(f, filename, progress_callback=report)
+    return load_minimal_dataframe_cached(source, filename, progress_callback=report)
+
+
+def _spool_to_disk(source_file, path: Path) -> int:
+    """Copie le fichier uploadé (spoolé par Starlette) vers un fichier temporaire"""
+    source_file.seek(0)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(source_file, f, 1024 * 1024)
+    return path.stat().st_size
+
+
+def _purge_finished_jobs():
+    now = time.monotonic()
+    for job_id in list(ingestion_jobs):
+        finished = ingestion_jobs[job_id].get("finished")
+        if finished is not None and now - finished > JOB_RETENTION_SECONDS:
+            del ingestion_jobs[job_id]
+            if _progress is not None:
+                _progress.pop(job_id, None)
+
+
+async def submit_ingestion(source_file, filename: str, file_type: str, on_complete):
+    """
+    Enregistre un job d'ingestion et retourne son état initial sans attendre
+    le parsing.
+
+    source_file: objet fichier binaire (UploadFile.file), copié sur disque
+                 avant le retour de l'endpoint
+    on_complete: fonction (job, df_minimal, file_info) -> dict, appelée sur la
+                 boucle asyncio ; son retour devient le résultat du job
+    """
+    _purge_finished_jobs()
+    loop = asyncio.get_running_loop()
+
+    job_id = uuid.uuid4().hex
+    INGEST_TMP_DIR.mkdir(parents=True, exist_ok=True)
+    path = INGEST_TMP_DIR / f"{job_id}{Path(filename).suffix.lower()}"
+    file_size = await loop.run_in_executor(None, _spool_to_disk, source_file, path)
+
+    job = {
+        "job_id": job_id,
+        "file_type": file_type,
+        "filename": filename,
+        "file_size": file_size,
+        "status": "running",
+        "submitted_at": datetime.now().isoformat(),
+        "started": time.monotonic(),
+        "finished": None,
+        "result": None,
+        "error": None,
+    }
+    ingestion_jobs[job_id] = job
+
+    future = loop.run_in_executor(_get_executor(), _ingest_worker, job_id, str(path),
+                                  filename, _progress)
+    job["task"] = asyncio.create_task(_finalize(job, future, on_complete, path))
+    return job
+
+
+async def _finalize(job, future, on_complete, path: Path):
+    try:
+        df_minimal, file_info = await future
+        job["result"] = on_complete(job, df_minimal, file_info)
+        job["status"] = "done"
+        logger.info(f"Ingestion {job['job_id'][:8]} terminée: {job['filename']}")
+    except Exception as e:
+        job["status"] = "error"
+        job["error"] = str(e)
+        logger.error(f"Erreur ingestion {job['filename']}: {e}")
+    finally:
+        job["finished"] = time.monotonic()
+        path.unlink(missing_ok=True)
+
+
+async def ingest_in_pool(content: bytes, filename: str):
+    """Parse un contenu déjà en mémoire dans le pool et attend le résultat"""
+    loop = asyncio.get_running_loop()
+    job_id = uuid.uuid4().hex
+    executor = _get_executor()
+    try:
+        return await loop.run_in_executor(executor, _ingest_worker, job_id, content,
+                                          filename, _progress)
+    finally:
+        _progress.pop(job_id, None)
+
+
+async def fetch_and_ingest(fetch, filename: str):
+    """
+    Télécharge (fetch() dans le pool de threads) puis parse (pool de
+    processus) un fichier. Plusieurs appels concurrents se recouvrent.
+    Retourne (df_minimal, file_info, timings)
+    """
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+
+    content = await loop.run_in_executor(_get_fetch_executor(), fetch)
+    fetched = time.perf_counter()
+
+    df_minimal, file_info = await ingest_in_pool(content, filename)
+    del content
+    parsed = time.perf_counter()
+
+    timings = {
+        "fetch_seconds": round(fetched - started, 3),
+        "parse_seconds": round(parsed - fetched, 3),
+        "total_seconds": round(parsed - started, 3),
+    }
+    logger.info(f"{filename}: téléchargé en {timings['fetch_seconds']}s, "
+                f"parsé en {timings['parse_seconds']}s")
+    return df_minimal, file_info, timings
+
+
+def get_job_status(job_id: str):
+    """État public d'un job (None si inconnu)"""
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        return None
+
+    progress = dict(_progress.get(job_id, {})) if _progress is not None else {}
+    end = job["finished"] if job["finished"] is not None else time.monotonic()
+
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "file_type": job["file_type"],
+        "filename": job["filename"],
+        "file_size": job["file_size"],
+        "bytes_read": progress.get("bytes_read", job["file_size"] if job["status"] == "done" else 0),
+        "rows_read": progress.get("rows_read", 0),
+        "rows_kept": progress.get("rows_kept", 0),
+        "elapsed_seconds": round(end - job["started"], 2),
+        "submitted_at": job["submitted_at"],
+        "result": job["result"],
+        "error": job["error"],
+    }
@@ -0,0 +1,1146 @@
+# lcr_tables.py
+"""
+Tableaux d'analyse LCR
+======================
+
+Chaque fichier (j, jMinus1, mMinus1) est agrégé une seule fois en un cube :
+somme de LCR_Assiette Pondérée et LCR_ECO_IMPACT_LCR par combinaison des
+dimensions (catégorie, section, client, groupe métiers, sous-métier,
+produit, SI Remettant, commentaire, date d'arrêté) sur les lignes
+Top Conso = "O". Les agrégats des tableaux sont décrits dans table_specs
+et calculés par plan d'exécution sur ce cube, qui ne contient que les
+combinaisons présentes et reste petit devant le fichier d'origine. Seules
+les spécifications des tableaux demandés sont calculées (TABLE_DEPENDENCIES),
+les autres le seront à la première demande sur le même cube.
+Les fonctions create_* ne font plus que la mise en forme JSON. Chaque cube
+porte un index de prédicats (frame_index) : filtres des tableaux et sections
+du drill-down sont des ET / OU de bitmaps, évalués une fois par cube.
+
+Les cubes et agrégats de j, jMinus1 et mMinus1 sont indépendants : ils
+sont calculés en parallèle sur un pool de threads, qui partagent les
+DataFrames de session sans copie. Seuls les petits résultats agrégés sont
+ensuite combinés (variations J / J-1 / M-1).
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from compute_backend import get_compute_backend
+from file_ingestion import DIMENSION_COLUMNS, MEASURE_COLUMNS
+from frame_index import SECTION_COLUMN, build_frame_index
+from table_specs import (ASSIETTE, IMPACT, BILLION, DATE, SPEC_VERSION, TABLE_SPECS, aggregate_rows, compile_plan,
+                         execute_plan, predicate_values, spec_columns)
+from variations import COMPARISONS, PERIODS, period_variations, total_variations, variations_to_records
+
+logger = logging.getLogger(__name__)
+
+# Dimensions du cube (Top Conso sert de filtre, pas de dimension)
+CUBE_DIMENSIONS = [col for col in DIMENSION_COLUMNS if col != "Top Conso"]
+
+# Calcul des cubes par période en parallèle (un thread par fichier)
+ANALYSIS_PARALLEL = True
+ANALYSIS_MAX_WORKERS = 3
+
+_analysis_executor = ThreadPoolExecutor(max_workers=ANALYSIS_MAX_WORKERS, thread_name_prefix="lcr-analysis")
+
+
+# Cubes conservés par empreinte de fichier : un J corrigé ne recalcule que son cube
+CUBE_CACHE_SIZE = 6
+
+_cube_cache = OrderedDict()
+_cube_cache_lock = threading.Lock()
+
+
+def shutdown_analysis_executor():
+    """Arrête le pool de calcul des cubes (arrêt de l'application)"""
+    _analysis_executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ========================== CUBE D'AGRÉGATION ===========================
+
+
+def build_cube(df):
+    """
+    Agrège un DataFrame minimal en un cube, avec le moteur de calcul
+    sélectionné (compute_backend).
+    Retourne {"data": DataFrame (dimensions + sommes des mesures),
+              "index": FrameIndex de data (ou None),
+              "columns": colonnes du fichier source,
+              "total_assiette": total sans filtre (ou None),
+              "lock": verrou des agrégats (cube partagé entre threads)}
+    """
+    dimensions = [col for col in CUBE_DIMENSIONS if col in df.columns]
+    measures = [col for col in MEASURE_COLUMNS if col in df.columns]
+
+    if "Top Conso" in df.columns:
+        mask = (df["Top Conso"] == "O").to_numpy()
+    else:
+        mask = None
+
+    if dimensions and measures:
+        data = get_compute_backend().aggregate(df, mask, dimensions, measures)
+    else:
+        data = df.iloc[0:0][dimensions + measures]
+
+    total_assiette = float(df[ASSIETTE].sum()) if ASSIETTE in df.columns else None
+
+    return {
+        "data": data,
+        "index": build_frame_index(data),
+        "columns": list(df.columns),
+        "total_assiette": total_assiette,
+        "lock": threading.Lock(),
+    }
+
+
+def _aggregates(cube, spec_names=None):
+    """
+    Résultats du plan d'analyse sur le cube pour les spécifications demandées
+    (toutes par défaut). Seules les spécifications pas encore calculées pour
+    ce cube passent par le plan : les demandes suivantes réutilisent les agrégats.
+    Le cube est partagé (cache, jobs, flux, préchargement) : calcul sous son
+    verrou, et le dictionnaire retourné n'est plus jamais modifié (un nouveau
+    dictionnaire remplace l'ancien quand des agrégats s'ajoutent).
+    """
+    with cube["lock"]:
+        aggregates = cube.get("aggregates", {})
+        missing = [name for name in (TABLE_SPECS if spec_names is None else spec_names) if name not in aggregates]
+        if missing:
+            aggregates = cube["aggregates"] = {
+                **aggregates, **execute_plan(compile_plan(missing), cube["data"], cube["index"])}
+        return aggregates
+
+
+def _aggregate(cube, spec_name):
+    """Agrégat d'une seule spécification"""
+    return _aggregates(cube, [spec_name])[spec_name]
+
+
+def _build_period_cube(file_type, df, file_hash=None, spec_names=None):
+    """
+    Cube d'une période (depuis le cache si connu) et agrégats des
+    spécifications demandées (toutes par défaut)
+    """
+    key = (file_hash, SPEC_VERSION) if file_hash else None
+    cube = None
+    if key:
+        with _cube_cache_lock:
+            cube = _cube_cache.get(key)
+            if cube is not None:
+                _cube_cache.move_to_end(key)
+                logger.info(f"🧊 Cube {file_type}: repris du cache")
+
+    if cube is None:
+        started = time.perf_counter()
+        cube = build_cube(df)
+        logger.info(f"🧊 Cube {file_type}: {len(df)} lignes -> {len(cube['data'])} combinaisons "
+                    f"({time.perf_counter() - started:.2f}s)")
+
+        if key:
+            with _cube_cache_lock:
+                _cube_cache[key] = cube
+                while len(_cube_cache) > CUBE_CACHE_SIZE:
+                    _cube_cache.popitem(last=False)
+
+    _aggregates(cube, spec_names)
+    return cube
+
+
+def build_cubes(dataframes, parallel=None, file_hashes=None, spec_names=None):
+    """
+    Un cube par fichier : {file_type: cube}, agrégats déjà calculés
+    parallel: une période par thread (ANALYSIS_PARALLEL par défaut)
+    file_hashes: {file_type: SHA-256 du fichier}, réutilise les cubes déjà calculés
+    spec_names: spécifications à calculer d'avance (toutes par défaut, voir table_dependencies)
+    """
+    file_hashes = file_hashes or {}
+    parallel = ANALYSIS_PARALLEL if parallel is None else parallel
+
+    if not parallel or len(dataframes) < 2:
+        return {file_type: _build_period_cube(file_type, df, file_hashes.get(file_type), spec_names)
+                for file_type, df in dataframes.items()}
+
+    futures = {
+        file_type: _analysis_executor.submit(_build_period_cube, file_type, df,
+                                             file_hashes.get(file_type), spec_names)
+        for file_type, df in dataframes.items()
+    }
+    return {file_type: future.result() for file_type, future in futures.items()}
+
+
+def _missing_columns(cube, required):
+    return [col for col in required if col not in cube["columns"]]
+
+
+def _date_hierarchy(pivot, dates):
+    """
+    Découpe un TCD à deux niveaux (groupe, détail) x dates.
+    Retourne {groupe: ([(détail, {date: valeur})], {date: total du groupe})}
+    dans l'ordre du TCD
+    """
+    group_totals = pivot.groupby(level=0, observed=True).sum()
+    totals_by_group = {group: dict(zip(dates, values))
+                       for group, values in zip(group_totals.index, group_totals.to_numpy().tolist())}
+
+    hierarchy = {}
+    for (group, detail), values in zip(pivot.index, pivot.to_numpy().tolist()):
+        if group not in hierarchy:
+            hierarchy[group] = ([], totals_by_group[group])
+        hierarchy[group][0].append((detail, dict(zip(dates, values))))
+    return hierarchy
+
+
+# ========================== FONCTIONS BUFFER TABLE ===========================
+
+
+def create_buffer_table(cubes):
+    """
+    Crée le tableau BUFFER avec structure TCD Excel
+    Filtre: LCR_Catégorie = "1- Buffer"
+    Lignes: LCR_Template Section 1 + Libellé Client (hiérarchie)
+    Valeurs: D (Today), Variation D vs D-1, Variation D vs M-1
+    """
+    try:
+        logger.info("📊 Création du tableau BUFFER - Style TCD Excel avec variations")
+
+        # Vérification que nous avons les trois fichiers nécessaires
+        if not all(key in cubes for key in ['j', 'jMinus1', 'mMinus1']):
+            return {
+                "title": "BUFFER - Erreur",
+                "error": "Les trois fichiers (J, J-1, M-1) sont requis pour calculer les variations"
+            }
+
+        # Sommes par section / client, en milliards, par période
+        buffer_by_period = {}
+
+        for file_type, cube in cubes.items():
+            logger.info(f"📄 Traitement BUFFER TCD pour {file_type}")
+
+            # Vérification des colonnes requises
+            missing_cols = _missing_columns(cube, spec_columns("buffer"))
+
+            if missing_cols:
+                logger.warning(f"⚠️ Colonnes manquantes pour BUFFER {file_type}: {missing_cols}")
+                continue
+
+            buffer_by_period[file_type] = _aggregate(cube, "buffer")
+
+            if len(buffer_by_period[file_type]) == 0:
+                logger.warning(f"⚠️ Aucune donnée BUFFER pour {file_type}")
+
+        # Calculer les variations entre les périodes (clients du fichier J)
+        buffer_results_with_variations = calculate_buffer_variations(buffer_by_period)
+        logger.info(f"✅ BUFFER TCD: {len(buffer_results_with_variations['sections'])} sections")
+
+        return {
+            "title": "BUFFER - TCD Analysis with Variations",
+            "data": buffer_results_with_variations,
+            "metadata": {
+                "analysis_date": datetime.now().isoformat(),
+                "tcd_config": {
+                    "filters": {"lcr_categorie": predicate_values("buffer_category"), "top_conso": "O"},
+                    "rows": TABLE_SPECS["buffer"]["rows"],
+                    "values": ["D (Today) Bn €", "Variation D vs D-1", "Variation D vs M-1"]
+                }
+            }
+        }
+
+    except Exception as e:
+        logger.error(f"❌ Erreur création tableau BUFFER TCD: {e}")
+        return {
+            "title": "BUFFER - Erreur",
+            "error": str(e)
+        }
+
+def calculate_buffer_variations(buffer_by_period):
+    """
+    Calcule les variations pour le tableau BUFFER
+    buffer_by_period: {période: Series (section, client) -> Bn €}
+    Sans les trois périodes, le tableau J est retourné sans variations
+    """
+    with_variations = all(period in buffer_by_period for period in PERIODS)
+    variations = period_variations(buffer_by_period, how="left")
+
+    result_data = {"pivot_data": [], "sections": []}
+    values = variations[["value_j", "variation_daily", "variation_monthly"]].to_numpy().tolist()
+
+    section_group = None
+    for (section, client), (value_j, variation_daily, variation_monthly) in zip(variations.index, values):
+        if section_group is None or section_group["section"] != section:
+            section_group = {"section": section, "client_details": [], "section_total_j": 0.0}
+            if with_variations:
+                section_group["section_variation_daily"] = 0.0
+                section_group["section_variation_monthly"] = 0.0
+            section_group["is_section_group"] = True
+            result_data["pivot_data"].append(section_group)
+            result_data["sections"].append(section)
+
+        client_detail = {"client": client, "value_j": value_j}
+        section_group["section_total_j"] += value_j
+        if with_variations:
+            client_detail["variation_daily"] = variation_daily
+            client_detail["variation_monthly"] = variation_monthly
+            section_group["section_variation_daily"] += variation_daily
+            section_group["section_variation_monthly"] += variation_monthly
+        client_detail["is_detail"] = True
+        section_group["client_details"].append(client_detail)
+
+    return result_data
+
+
+# ========================== FONCTIONS SUMMARY TABLE ===========================
+
+
+def create_summary_table(cubes):
+    """
+    Crée le tableau de synthèse sans titre avec comparaison des deux fichiers
+    """
+    try:
+        logger.info("📊 Création du tableau de synthèse")
+
+        summary_results = {}
+
+        # Vérification que nous avons les deux fichiers
+        if "j" not in cubes or "jMinus1" not in cubes:
+            logger.warning("⚠️ Les deux fichiers sont requis pour le tableau de synthèse")
+            return {
+                "title": "Summary Table",
+                "error": "Les deux fichiers sont requis"
+            }
+
+        for file_type, cube in cubes.items():
+            logger.info(f"📄 Traitement synthèse pour {file_type}")
+
+            # Vérification des colonnes requises
+            missing_cols = _missing_columns(cube, spec_columns("summary"))
+
+            if missing_cols:
+                logger.warning(f"⚠️ Colonnes manquantes pour synthèse {file_type}: {missing_cols}")
+                continue
+
+            # Sommes par date, en milliards
+            by_date = _aggregate(cube, "summary")
+            if len(by_date) == 0:
+                logger.warning(f"⚠️ Aucune donnée pour synthèse {file_type}")
+                continue
+
+            summary_data = []
+            for date, row in by_date.iterrows():
+                sum_assiette = float(row[ASSIETTE])
+                sum_impact = float(row[IMPACT])
+
+                summary_data.append({
+                    "date": date,
+                    "sum_assiette": sum_assiette,
+                    "sum_impact": sum_impact,
+                    "sum_difference": sum_assiette - sum_impact,
+                    "file_type": file_type
+                })
+
+            summary_results[file_type] = summary_data
+            logger.info(f"✅ Synthèse {file_type}: {len(summary_data)} dates")
+
+        return {
+            "title": "",  # Pas de titre
+            "data": summary_results,
+            "metadata": {
+                "analysis_date": datetime.now().isoformat(),
+                "filters_applied": {
+                    "top_conso": "O"
+                }
+            }
+        }
+
+    except Exception as e:
+        logger.error(f"❌ Erreur création tableau synthèse: {e}")
+        return {
+            "title": "Summary Table - Erreur",
+            "error": str(e)
+        }
+
+
+# ========================== FONCTIONS CONSUMPTION / RESOURCES TABLES ===========================
+
+
+def _impact_by_groupe_table(cubes, label, spec_name):
+    """Tableaux CONSUMPTION et RESOURCES : impact LCR par groupe métiers filtré"""
+    results = {}
+    groupes_predicate, sous_metier_predicate, produit_predicate = TABLE_SPECS[spec_name]["filters"]
+
+    for file_type, cube in cubes.items():
+        logger.info(f"📄 Traitement {label} pour {file_type}")
+
+        # Vérification des colonnes requises
+        missing_cols = _missing_columns(cube, spec_columns(spec_name))
+
+        if missing_cols:
+            logger.warning(f"⚠️ Colonnes manquantes pour {label} {file_type}: {missing_cols}")
+            continue
+
+        # Groupement par LCR_ECO_GROUPE_METIERS
+        grouped = _aggregate(cube, spec_name)
+
+        if len(grouped) == 0:
+            logger.warning(f"⚠️ Aucune donnée {label} pour {file_type}")
+            continue
+
+        grouped_bn = (grouped / BILLION).round(3)
+
+        # Convertir en dictionnaire avec types Python natifs
+        results[file_type] = [
+            {
+                "LCR_ECO_GROUPE_METIERS": str(groupe),
+                "LCR_ECO_IMPACT_LCR": float(total),
+                "LCR_ECO_IMPACT_LCR_Bn": float(grouped_bn[groupe])
+            }
+            for groupe, total in grouped.items()
+        ]
+
+        logger.info(f"✅ {label} {file_type}: {len(grouped)} groupes")
+
+    return {
+        "title": label,
+        "data": results,
+        "metadata": {
+            "analysis_date": datetime.now().isoformat(),
+            "filters_applied": {
+                "top_conso": "O",
+                "groupe_metiers": predicate_values(groupes_predicate),
+                "excluded_sous_metier": predicate_values(sous_metier_predicate),
+                "excluded_produit": predicate_values(produit_predicate)
+            }
+        }
+    }
+
+
+def create_consumption_table(cubes):
+    """
+    Crée le tableau CONSUMPTION avec filtres spécifiques
+    """
+    try:
+        logger.info("📊 Création du tableau CONSUMPTION")
+        return _impact_by_groupe_table(cubes, "CONSUMPTION", "consumption")
+    except Exception as e:
+        logger.error(f"❌ Erreur création tableau CONSUMPTION: {e}")
+        return {
+            "title": "CONSUMPTION - Erreur",
+            "error": str(e)
+        }
+
+
+def create_resources_table(cubes):
+    """
+    Crée le tableau RESOURCES avec filtres spécifiques
+    """
+    try:
+        logger.info("📊 Création du tableau RESOURCES")
+        return _impact_by_groupe_table(cubes, "RESOURCES", "resources")
+    except Exception as e:
+        logger.error(f"❌ Erreur création tableau RESOURCES: {e}")
+        return {
+            "title": "RESOURCES - Erreur",
+            "error": str(e)
+        }
+
+
+# ========================== FONCTIONS CAPPAGE TABLE ===========================
+
+
+def create_cappage_table(cubes):
+    """
+    Crée le tableau CAPPAGE avec structure TCD Excel style
+    Filtre: SI Remettant = SHORT_LCR ou CAPREOS
+    Lignes: SI Remettant + Commentaire (hiérarchie)
+    Colonnes: Date d'arrêté
+    Valeurs: Somme LCR_Assiette Pondérée
+    """
+    try:
+        logger.info("📊 Création du tableau CAPPAGE - Style TCD Excel")
+
+        cappage_results = {}
+        allowed_si_remettant = predicate_values("cappage_si_remettant")
+
+        for file_type, cube in cubes.items():
+            logger.info(f"📄 Traitement CAPPAGE TCD pour {file_type}")
+
+            # Vérification des colonnes requises
+            missing_cols = _missing_columns(cube, spec_columns("cappage"))
+
+            if missing_cols:
+                logger.warning(f"⚠️ Colonnes manquantes pour CAPPAGE {file_type}: {missing_cols}")
+                continue
+
+            # TCD (SI Remettant, Commentaire) x dates des lignes filtrées
+            pivot = _aggregate(cube, "cappage")
+
+            if len(pivot) == 0:
+                logger.warning(f"⚠️ Aucune donnée CAPPAGE pour {file_type}")
+                cappage_results[file_type] = {
+                    "pivot_data": [],
+                    "dates": [],
+                    "si_remettant_groups": []
+                }
+                continue
+
+            # Dates présentes (colonnes du TCD), puis découpage hiérarchique
+            dates = list(pivot.columns)
+            hierarchy = _date_hierarchy(pivot, dates)
+
+            # Créer la structure TCD hiérarchique (ordre de allowed_si_remettant)
+            pivot_structure = []
+            for si_remettant in allowed_si_remettant:
+                if si_remettant not in hierarchy:
+                    continue
+
+                details, si_totals_by_date = hierarchy[si_remettant]
+                pivot_structure.append({
+                    "si_remettant": si_remettant,
+                    "commentaire_details": [
+                        {
+                            "commentaire": commentaire,
+                            "date_values": date_values,
+                            "is_detail": True,
+                            "total": sum(date_values.values())
+                        }
+                        for commentaire, date_values in details
+                    ],
+                    "si_totals_by_date": si_totals_by_date,
+                    "grand_total": sum(si_totals_by_date.values()),
+                    "is_si_group": True
+                })
+
+            cappage_results[file_type] = {
+                "pivot_data": pivot_structure,
+                "dates": dates,
+                "si_remettant_groups": allowed_si_remettant
+            }
+
+            logger.info(f"✅ CAPPAGE TCD {file_type}: {len(pivot_structure)} groupes SI, {len(dates)} dates")
+
+        return {
+            "title": "CAPPAGE & Short_LCR - TCD Analysis",
+            "data": cappage_results,
+            "metadata": {
+                "analysis_date": datetime.now().isoformat(),
+                "tcd_config": {
+                    "filters": {"si_remettant": allowed_si_remettant, "top_conso": "O"},
+                    "rows": TABLE_SPECS["cappage"]["rows"],
+                    "columns": [TABLE_SPECS["cappage"]["columns"]],
+                    "values": "Somme LCR_Assiette Pondérée (Bn €)"
+                }
+            }
+        }
+
+    except Exception as e:
+        logger.error(f"❌ Erreur création tableau CAPPAGE TCD: {e}")
+        return {
+            "title": "CAPPAGE & Short_LCR - Erreur",
+            "error": str(e)
+        }
+
+
+# ========================== FONCTIONS BUFFER & NCO TABLE ===========================
+
+
+def create_buffer_nco_table(cubes):
+    """
+    Crée les tableaux BUFFER & NCO avec structure TCD Excel style
+
+    Tableau 1 - BUFFER:
+    - Filtre: LCR_Catégorie = "1- Buffer"
+    - Lignes: LCR_Template Section 1 + Libellé Client (hiérarchie)
+    - Colonnes: Date d'arrêté
+    - Valeurs: Somme LCR_Assiette Pondérée
+
+    Tableau 2 - NCO:
+    - Pas de filtre
+    - Lignes: LCR_Catégorie
+    - Colonnes: Date d'arrêté
+    - Valeurs: Somme LCR_Assiette Pondérée
+    """
+    try:
+        logger.info("📊 Création des tableaux BUFFER & NCO - Style TCD Excel")
+
+        buffer_nco_results = {}
+
+        for file_type, cube in cubes.items():
+            logger.info(f"📄 Traitement BUFFER & NCO TCD pour {file_type}")
+
+            # Vérification des colonnes requises
+            missing_cols = _missing_columns(cube, spec_columns("buffer_nco_buffer", "buffer_nco_nco"))
+
+            if missing_cols:
+                logger.warning(f"⚠️ Colonnes manquantes pour BUFFER & NCO {file_type}: {missing_cols}")
+                continue
+
+            if len(cube["data"]) == 0:
+                logger.warning(f"⚠️ Aucune donnée BUFFER & NCO pour {file_type}")
+                continue
+
+            aggregates = _aggregates(cube, TABLE_DEPENDENCIES["buffer_nco"])
+            nco_pivot = aggregates["buffer_nco_nco"]
+
+            # Toutes les dates du fichier (colonnes des deux TCD)
+            dates = list(nco_pivot.columns)
+
+            # =============================================================================
+            # TABLEAU 1: BUFFER (avec filtre LCR_Catégorie = "1- Buffer")
+            # =============================================================================
+            buffer_pivot_data = _buffer_nco_sections(aggregates["buffer_nco_buffer"], dates)
+
+            # =============================================================================
+            # TABLEAU 2: NCO (pas de filtre, groupé par LCR_Catégorie)
+            # =============================================================================
+            nco_pivot_data = [
+                {
+                    "categorie": categorie,
+                    "date_values": dict(zip(dates, values))
+                }
+                for categorie, values in zip(nco_pivot.index, nco_pivot.to_numpy().tolist())
+            ]
+
+            buffer_nco_results[file_type] = {
+                "buffer_pivot_data": buffer_pivot_data,
+                "nco_pivot_data": nco_pivot_data,
+                "dates": dates
+            }
+
+            logger.info(f"✅ BUFFER & NCO TCD {file_type}: Buffer={len(buffer_pivot_data)} sections, NCO={len(nco_pivot_data)} catégories, {len(dates)} dates")
+
+        return {
+            "title": "BUFFER & NCO - TCD Analysis",
+            "data": buffer_nco_results,
+            "metadata": {
+                "analysis_date": datetime.now().isoformat(),
+                "tcd_config": {
+                    "buffer_table": {
+                        "filters": {"lcr_categorie": predicate_values("buffer_category"), "top_conso": "O"},
+                        "rows": TABLE_SPECS["buffer_nco_buffer"]["rows"],
+                        "columns": [TABLE_SPECS["buffer_nco_buffer"]["columns"]],
+                        "values": "Somme LCR_Assiette Pondérée (Bn €)"
+                    },
+                    "nco_table": {
+                        "filters": {"top_conso": "O"},
+                        "rows": TABLE_SPECS["buffer_nco_nco"]["rows"],
+                        "columns": [TABLE_SPECS["buffer_nco_nco"]["columns"]],
+                        "values": "Somme LCR_Assiette Pondérée (Bn €)"
+                    }
+                }
+            }
+        }
+
+    except Exception as e:
+        logger.error(f"❌ Erreur création tableaux BUFFER & NCO TCD: {e}")
+        return {
+            "title": "BUFFER & NCO - Erreur",
+            "error": str(e)
+        }
+
+
+def _buffer_nco_sections(pivot, dates):
+    """Groupes de section du TCD BUFFER (section > client, valeurs par date)"""
+    if len(pivot) == 0:
+        return []
+
+    return [
+        {
+            "section": section,
+            "client_details": [
+                {
+                    "client": client,
+                    "date_values": date_values,
+                    "is_detail": True
+                }
+                for client, date_values in details
+            ],
+            "section_totals_by_date": section_totals_by_date,
+            "is_section_group": True
+        }
+        for section, (details, section_totals_by_date) in _date_hierarchy(pivot, dates).items()
+    ]
+
+
+# ========================== FONCTIONS CONSUMPTION & RESOURCES TABLE ===========================
+
+
+def _groupe_rows_by_date(pivot, allowed_groupes, dates):
+    """Lignes {lcr_eco_groupe_metiers, dates} dans l'ordre de allowed_groupes"""
+    rows = dict(zip(pivot.index, pivot.to_numpy().tolist()))
+
+    return [
+        {
+            "lcr_eco_groupe_metiers": groupe,
+            "dates": dict(zip(dates, rows[groupe]))
+        }
+        for groupe in allowed_groupes
+        if groupe in rows
+    ]
+
+
+def create_consumption_resources_table(cubes):
+    """
+    Crée les tableaux CONSUMPTION & RESOURCES avec structure pivot par date
+    """
+    try:
+        logger.info("📊 Création des tableaux CONSUMPTION & RESOURCES")
+
+        consumption_resources_results = {}
+        allowed_groupes_cons = predicate_values("consumption_groupes")
+        excluded_sous_metier_cons = predicate_values("consumption_sous_metier")
+        allowed_groupes_res = predicate_values("resources_groupes")
+        excluded_sous_metier_res = predicate_values("resources_by_date_sous_metier")
+
+        for file_type, cube in cubes.items():
+            logger.info(f"📄 Traitement CONSUMPTION & RESOURCES pour {file_type}")
+
+            # Vérification des colonnes requises
+            missing_cols = _missing_columns(cube, spec_columns("consumption_by_date", "resources_by_date"))
+
+            if missing_cols:
+                logger.warning(f"⚠️ Colonnes manquantes pour CONSUMPTION & RESOURCES {file_type}: {missing_cols}")
+                continue
+
+            if len(cube["data"]) == 0:
+                logger.warning(f"⚠️ Aucune donnée CONSUMPTION & RESOURCES pour {file_type}")
+                continue
+
+            aggregates = _aggregates(cube, TABLE_DEPENDENCIES["consumption_resources"])
+            consumption_pivot = aggregates["consumption_by_date"]
+
+            # Toutes les dates du fichier
+            dates = list(consumption_pivot.columns)
+
+            consumption_data = _groupe_rows_by_date(consumption_pivot, allowed_groupes_cons, dates)
+            resources_data = _groupe_rows_by_date(aggregates["resources_by_date"], allowed_groupes_res, dates)
+
+            consumption_resources_results[file_type] = {
+                "consumption_data": consumption_data,
+                "resources_data": resources_data,
+                "dates": dates
+            }
+
+            logger.info(f"✅ CONSUMPTION & RESOURCES {file_type}: Consumption={len(consumption_data)} lignes, Resources={len(resources_data)} lignes, {len(dates)} dates")
+
+        return {
+            "title": "CONSUMPTION & RESOURCES",
+            "data": consumption_resources_results,
+            "metadata": {
+                "analysis_date": datetime.now().isoformat(),
+                "filters_applied": {
+                    "top_conso": "O",
+                    "consumption_filters": {
+                        "groupe_metiers": allowed_groupes_cons,
+                        "excluded_sous_metier": excluded_sous_metier_cons
+                    },
+                    "resources_filters": {
+                        "groupe_metiers": allowed_groupes_res,
+                        "excluded_sous_metier": excluded_sous_metier_res
+                    }
+                }
+            }
+        }
+
+    except Exception as e:
+        logger.error(f"❌ Erreur création tableaux CONSUMPTION & RESOURCES: {e}")
+        return {
+            "title": "CONSUMPTION & RESOURCES - Erreur",
+            "error": str(e)
+        }
+
+
+# ========================== FONCTIONS TOTAUX LCR_Assiette Pondérée ===========================
+
+
+def create_simple_totals_table(cubes):
+    """
+    Crée un tableau simple avec juste les totaux LCR_Assiette Pondérée par fichier
+    Pas de filtre, pas de ligne - juste 3 colonnes avec les totaux
+    """
+    try:
+        logger.info("📊 Création du tableau des totaux simples")
+
+        totals_results = {}
+
+        for file_type, cube in cubes.items():
+            # Total calculé à la construction du cube
+            if cube["total_assiette"] is None:
+                logger.warning(f"⚠️ Colonne LCR_Assiette Pondérée manquante pour {file_type}")
+                continue
+
+            total = cube["total_assiette"] / BILLION
+
+            totals_results[file_type] = total
+            logger.info(f"✅ Total {file_type}: {total:.3f} Bn €")
+
+        return {
+            "title": "Global LCR Totals",
+            "data": totals_results,
+            "metadata": {
+                "analysis_date": datetime.now().isoformat(),
+                "unit": "Bn €",
+                "note": "No filters applied - raw totals from uploaded files"
+            }
+        }
+
+    except Exception as e:
+        logger.error(f"❌ Erreur création tableau totaux: {e}")
+        return {
+            "title": "Global LCR Totals - Error",
+            "error": str(e)
+        }
+
+def create_si_remettant_bar(cubes):
+    """
+    Crée les données pour le graphique en barre horizontale des SI Remettant
+    Filtre: SI Remettant IN ('AJUST AJUSTGAP', 'AJUST SUMMIT', 'AJUST SUMMIT_TITRES')
+    """
+    try:
+        logger.info("📊 Création des données SI Remettant Bar")
+
+        si_results = {}
+        allowed_si = predicate_values("ajust_si_remettant")
+
+        for file_type, cube in cubes.items():
+            logger.info(f"📄 Traitement SI Remettant pour {file_type}")
+
+            if _missing_columns(cube, spec_columns("si_remettant")):
+                logger.warning(f"⚠️ Colonnes manquantes pour {file_type}")
+                continue
+
+            # Groupé par SI Remettant, en milliards
+            grouped = _aggregate(cube, "si_remettant")
+
+            if len(grouped) == 0:
+                continue
+
+            grouped = grouped.round(3)
+
+            si_results[file_type] = [
+                {
+                    "si_remettant": str(si_remettant),
+                    "value": float(value)
+                }
+                for si_remettant, value in grouped.items()
+            ]
+
+            logger.info(f"✅ SI Remettant {file_type}: {len(grouped)} valeurs")
+
+        return {
+            "title": "SI Remettant Distribution",
+            "data": si_results,
+            "metadata": {
+                "analysis_date": datetime.now().isoformat(),
+                "allowed_values": allowed_si,
+                "unit": "Bn €"
+            }
+        }
+
+    except Exception as e:
+        logger.error(f"❌ Erreur création SI Remettant bar: {e}")
+        return {
+            "title": "SI Remettant Distribution - Error",
+            "error": str(e)
+        }
+
+
+# ========================== FONCTIONS VARIATIONS J / J-1 / M-1 ===========================
+
+
+# Spécifications comparables d'une période à l'autre (lignes sans date d'arrêté)
+VARIATION_SPECS = [name for name, spec in TABLE_SPECS.items() if DATE not in spec["rows"]]
+
+
+def spec_variations(cubes, spec_name, how="outer"):
+    """
+    Variations J / J-1 / M-1 d'une spécification de TABLE_SPECS, alignée
+    sur ses lignes (pour un TCD par date : total de la ligne sur les dates)
+    """
+    by_period = {}
+    for file_type, cube in cubes.items():
+        if _missing_columns(cube, spec_columns(spec_name)):
+            continue
+        aggregate = _aggregate(cube, spec_name)
+        by_period[file_type] = aggregate.sum(axis=1) if aggregate.ndim == 2 else aggregate
+    return period_variations(by_period, how)
+
+
+def create_variations_table(cubes):
+    """
+    Crée le tableau VARIATIONS : pour chaque agrégat de TABLE_SPECS
+    comparable entre périodes, valeurs J / J-1 / M-1, variations absolues
+    et relatives, contributions à la variation du total
+    """
+    try:
+        logger.info("📊 Création du tableau VARIATIONS")
+
+        if not all(period in cubes for period in PERIODS):
+            return {
+                "title": "VARIATIONS - Erreur",
+                "error": "Les trois fichiers (J, J-1, M-1) sont requis pour calculer les variations"
+            }
+
+        variations_results = {}
+        for spec_name in VARIATION_SPECS:
+            spec = TABLE_SPECS[spec_name]
+            variations = spec_variations(cubes, spec_name)
+
+            variations_results[spec_name] = {
+                "keys": spec["rows"],
+                "unit": "Bn €" if spec["scale"] == BILLION else "€",
+                "rows": variations_to_records(variations, spec["rows"]),
+                "totals": total_variations(variations)
+            }
+
+            logger.info(f"✅ Variations {spec_name}: {len(variations)} lignes")
+
+        return {
+            "title": "VARIATIONS - D vs D-1 vs M-1",
+            "data": variations_results,
+            "metadata": {
+                "analysis_date": datetime.now().isoformat(),
+                "comparisons": COMPARISONS,
+                "definitions": {
+                    "variation": "D - reference",
+                    "variation_pct": "variation / |reference| (null if reference = 0)",
+                    "contribution": "variation / |reference total|"
+                }
+            }
+        }
+
+    except Exception as e:
+        logger.error(f"❌ Erreur création tableau VARIATIONS: {e}")
+        return {
+            "title": "VARIATIONS - Erreur",
+            "error": str(e)
+        }
+
+
+# ========================== TABLEAUX GÉNÉRIQUES (TABLE_SPECS) ===========================
+
+
+# Spécifications sans mise en forme dédiée, restituées telles quelles
+GENERIC_TABLES = [name for name, spec in TABLE_SPECS.items() if spec.get("render") == "generic"]
+
+
+def create_generic_table(cubes, spec_name):
+    """
+    Restitue une spécification de TABLE_SPECS sans mise en forme dédiée :
+    une ligne par combinaison de la hiérarchie, avec la valeur (somme simple)
+    ou les valeurs par colonne (TCD)
+    """
+    try:
+        spec = TABLE_SPECS[spec_name]
+        logger.info(f"📊 Création du tableau {spec_name}")
+
+        generic_results = {}
+
+        for file_type, cube in cubes.items():
+            missing_cols = _missing_columns(cube, spec_columns(spec_name))
+
+            if missing_cols:
+                logger.warning(f"⚠️ Colonnes manquantes pour {spec_name} {file_type}: {missing_cols}")
+                continue
+
+            aggregate = _aggregate(cube, spec_name)
+            rows = []
+            for keys, values in zip(aggregate.index, aggregate.to_numpy().tolist()):
+                keys = keys if isinstance(keys, tuple) else (keys,)
+                row = dict(zip(spec["rows"], (str(key) for key in keys)))
+                if spec["columns"]:
+                    row["values"] = dict(zip((str(col) for col in aggregate.columns), values))
+                else:
+                    row["value"] = values
+                rows.append(row)
+
+            generic_results[file_type] = {
+                "rows": rows,
+                "columns": [str(col) for col in aggregate.columns] if spec["columns"] else []
+            }
+
+        return {
+            "title": spec.get("title", spec_name),
+            "data": generic_results,
+            "metadata": {
+                "analysis_date": datetime.now().isoformat(),
+                "tcd_config": {
+                    "filters": {predicate: predicate_values(predicate) for predicate in spec["filters"]},
+                    "rows": spec["rows"],
+                    "columns": [spec["columns"]] if spec["columns"] else [],
+                    "values": spec["measure"]
+                }
+            }
+        }
+
+    except Exception as e:
+        logger.error(f"❌ Erreur création tableau {spec_name}: {e}")
+        return {
+            "title": f"{spec_name} - Erreur",
+            "error": str(e)
+        }
+
+
+# ========================== DÉPENDANCES DES TABLEAUX ===========================
+
+
+# Spécifications de TABLE_SPECS lues par chaque tableau (simple_totals : total du cube seulement)
+TABLE_DEPENDENCIES = {
+    "simple_totals": [],
+    "si_remettant": ["si_remettant"],
+    "buffer": ["buffer"],
+    "summary": ["summary"],
+    "consumption": ["consumption"],
+    "resources": ["resources"],
+    "cappage": ["cappage"],
+    "buffer_nco": ["buffer_nco_buffer", "buffer_nco_nco"],
+    "consumption_resources": ["consumption_by_date", "resources_by_date"],
+    "variations": VARIATION_SPECS,
+    **{name: [name] for name in GENERIC_TABLES},
+}
+
+
+def table_dependencies(table_names):
+    """Spécifications nécessaires à un ensemble de tableaux, dans l'ordre de TABLE_SPECS"""
+    needed = {spec_name for name in table_names for spec_name in TABLE_DEPENDENCIES[name]}
+    return [spec_name for spec_name in TABLE_SPECS if spec_name in needed]
+
+
+# ========================== ÉLAGAGE DES CLIENTS ET DRILL-DOWN ===========================
+
+
+# Clients détaillés par section dans la réponse d'analyse, les suivants sont regroupés
+# dans "others" et servis à la demande par /api/drilldown
+CLIENT_TOP_N = 10
+
+# Classement des clients : nom -> champ du détail client (valeur absolue)
+CLIENT_RANKINGS = {
+    "value": "value_j",
+    "variation_daily": "variation_daily",
+    "variation_monthly": "variation_monthly",
+}
+
+# Tableaux à détail client
+DRILLDOWN_TABLES = ["buffer", "buffer_nco"]
+
+
+def _client_rank(detail, rank_by):
+    if "date_values" in detail:  # BUFFER & NCO : total sur les dates, sans variations
+        return abs(sum(detail["date_values"].values()))
+    return abs(detail.get(CLIENT_RANKINGS[rank_by]) or 0.0)
+
+
+def rank_clients(client_details, rank_by="value"):
+    """Détails clients triés par importance décroissante (valeur absolue du champ rank_by)"""
+    if rank_by not in CLIENT_RANKINGS:
+        raise ValueError(f"Classement inconnu: {rank_by} (disponibles: {', '.join(CLIENT_RANKINGS)})")
+    return sorted(client_details, key=lambda detail: _client_rank(detail, rank_by), reverse=True)
+
+
+def others_detail(client_details):
+    """Ligne "Others" : somme des détails clients regroupés (None si aucun)"""
+    if not client_details:
+        return None
+
+    others = {"client": f"Others ({len(client_details)} clients)"}
+    if "date_values" in client_details[0]:
+        date_values = {}
+        for detail in client_details:
+            for date, value in detail["date_values"].items():
+                date_values[date] = date_values.get(date, 0.0) + value
+        others["date_values"] = date_values
+    else:
+        for key in ("value_j", "variation_daily", "variation_monthly"):
+            if key in client_details[0]:
+                others[key] = sum(detail.get(key) or 0.0 for detail in client_details)
+    others["client_count"] = len(client_details)
+    return others
+
+
+def _prune_section(section_group, top_n, rank_by):
+    ranked = rank_clients(section_group["client_details"], rank_by)
+    return {
+        **section_group,
+        "client_details": ranked[:top_n],
+        "client_count": len(ranked),
+        "others": others_detail(ranked[top_n:]),
+    }
+
+
+def prune_client_table(name, table, top_n=CLIENT_TOP_N, rank_by="value"):
+    """
+    Tableau BUFFER ou BUFFER & NCO réduit, par section, aux top_n clients
+    (classés par rank_by) et à une ligne "others" ; totaux de section inchangés.
+    Les autres tableaux (et les tableaux en erreur) sont retournés tels quels.
+    """
+    if name not in DRILLDOWN_TABLES or not isinstance(table.get("data"), dict):
+        return table
+
+    if name == "buffer":
+        data = {**table["data"],
+                "pivot_data": [_prune_section(group, top_n, rank_by) for group in table["data"]["pivot_data"]]}
+    else:
+        data = {
+            file_type: {**file_data,
+                        "buffer_pivot_data": [_prune_section(group, top_n, rank_by)
+                                              for group in file_data["buffer_pivot_data"]]}
+            for file_type, file_data in table["data"].items()
+        }
+    return {**table, "data": data, "client_pruning": {"top_n": top_n, "rank_by": rank_by}}
+
+
+def prune_client_tables(results, top_n=CLIENT_TOP_N, rank_by="value"):
+    """prune_client_table sur tous les tableaux d'un résultat d'analyse"""
+    return {name: prune_client_table(name, table, top_n, rank_by) for name, table in results.items()}
+
+
+def _section_aggregate(cube, spec_name, section, column_values=None):
+    """
+    Agrégat d'une spécification (section, client, ...) limité à une section :
+    lignes du cube sélectionnées par l'index (ET des prédicats de la
+    spécification et de la section), seule la section est agrégée.
+    Repli sur l'agrégat complet du cube si une colonne n'est pas indexée.
+    """
+    filters = TABLE_SPECS[spec_name]["filters"]
+    where = {SECTION_COLUMN: section}
+    index = cube["index"]
+    if index is None or not index.can_select(filters, where):
+        aggregate = _aggregate(cube, spec_name)
+        return aggregate[aggregate.index.get_level_values(0) == section]
+
+    with cube["lock"]:  # bitmaps de prédicats mis en cache dans l'index
+        mask = index.select(*filters, where=where)
+    return aggregate_rows(cube["data"][mask], spec_name, column_values)
+
+
+def drilldown_clients(cubes, table, section, file_type="j", rank_by="value"):
+    """
+    Tous les détails clients d'une section, classés par rank_by, recalculés
+    sur les lignes de la section dans les cubes (déjà en cache pour les
+    fichiers de session), sélectionnées par leur index.
+    Même forme que client_details du tableau (BUFFER : valeur J et variations,
+    BUFFER & NCO : valeurs par date du fichier file_type).
+    Lève ValueError si le tableau, la période ou la section est inconnu.
+    """
+    if table not in DRILLDOWN_TABLES:
+        raise ValueError(f"Tableau sans détail client: {table} (disponibles: {', '.join(DRILLDOWN_TABLES)})")
+
+    if table == "buffer":
+        by_period = {period: _section_aggregate(cube, "buffer", section)
+                     for period, cube in cubes.items()
+                     if not _missing_columns(cube, spec_columns("buffer"))}
+        groups = calculate_buffer_variations(by_period)["pivot_data"]
+    else:
+        if file_type not in cubes:
+            raise ValueError(f"Fichier inconnu: {file_type}")
+        cube = cubes[file_type]
+        if _missing_columns(cube, spec_columns("buffer_nco_buffer", "buffer_nco_nco")):
+            raise ValueError(f"Colonnes manquantes pour BUFFER & NCO {file_type}")
+        dates = list(_aggregate(cube, "buffer_nco_nco").columns)
+        groups = _buffer_nco_sections(_section_aggregate(cube, "buffer_nco_buffer", section, dates), dates)
+
+    if not groups:
+        raise ValueError(f"Section inconnue: {section}")
+    return rank_clients(groups[0]["client_details"], rank_by)
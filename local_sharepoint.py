@@ -0,0 +1,100 @@
+# local_sharepoint.py
+"""
+Remplaçant local de SharePointClient
+====================================
+
+Expose la même interface que SharePointClient (list_files_in_path,
+read_binary_file, save_dataframe_in_sharepoint) sur un dossier local qui
+reproduit l'arborescence SharePoint, ex:
+
+    <racine>/ALM_Metrics/sources/D_PA_202509150630.csv
+
+Permet d'exécuter et de mesurer tout le chargement par date sans accès
+réseau. get_file_metadata retourne la taille, la date de modification et
+un ETag dérivé de l'inode, comme le ferait SharePoint.
+"""
+
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class LocalSharePointClient:
+    """Client « SharePoint » adossé au système de fichiers local"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        if not self.root.is_dir():
+            raise ValueError(f"Racine SharePoint locale introuvable: {self.root}")
+
+    def _resolve(self, path: str) -> Path:
+        target = (self.root / path).resolve()
+        if self.root.resolve() not in target.parents and target != self.root.resolve():
+            raise ValueError(f"Chemin hors de la racine: {path}")
+        return target
+
+    def list_files_in_path(self, path: str):
+        folder = self._resolve(path)
+        if not folder.is_dir():
+            return []
+        return sorted(entry.name for entry in folder.iterdir() if entry.is_file())
+
+    def read_binary_file(self, path: str) -> bytes:
+        return self._resolve(path).read_bytes()
+
+    def get_file_metadata(self, path: str):
+        stat = self._resolve(path).stat()
+        return {
+            "size": stat.st_size,
+            "last_modified": datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc).isoformat(),
+            "etag": f"\"{stat.st_ino}-{stat.st_mtime_ns}-{stat.st_size}\"",
+        }
+
+    def save_dataframe_in_sharepoint(self, df, path: str, index: bool = False):
+        target = self._resolve(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.suffix.lower() in ('.xlsx', '.xlsm'):
+            df.to_excel(target, index=index)
+        else:
+            df.to_csv(target, index=index)
+        logger.info(f"SharePoint local: {path} enregistré")
+
+
+if __name__ == "__main__":
+    # Mesure hors ligne du chargement par date :
+    #   python local_sharepoint.py <racine> <AAAA-MM-JJ>
+    import asyncio
+    import sys
+    import time
+    from functools import partial
+
+    from ingestion_executor import fetch_and_ingest, shutdown_ingestion_executor
+    from sharepoint_index import SharePointListingIndex
+    from sharepoint_mirror import SharePointMirror, MirroredSharePointClient
+
+    logging.basicConfig(level=logging.INFO)
+    root, selected_date = sys.argv[1], sys.argv[2]
+
+    mirror = SharePointMirror()
+    client = MirroredSharePointClient(LocalSharePointClient(root), mirror)
+    index = SharePointListingIndex(lambda: client)
+
+    async def load(date_obj):
+        files, missing = index.resolve_analysis_files(date_obj)
+        if missing:
+            raise SystemExit(f"Fichiers manquants: {', '.join(missing)}")
+        started = time.perf_counter()
+        loaded = await asyncio.gather(*[
+            fetch_and_ingest(partial(client.read_binary_file, f"{index.base_path}/{filename}"), filename)
+            for filename in files.values()
+        ])
+        for (file_type, filename), (df_minimal, file_info, timings) in zip(files.items(), loaded):
+            print(f"{file_type:8} {filename}: {len(df_minimal)} lignes, cache {file_info.get('cache')}, {timings}")
+        print(f"Total: {time.perf_counter() - started:.2f}s")
+
+    try:
+        asyncio.run(load(datetime.strptime(selected_date, "%Y-%m-%d")))
+    finally:
+        shutdown_ingestion_executor()
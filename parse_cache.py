@@ -0,0 +1,168 @@
+# parse_cache.py
+"""
+Cache des fichiers sources déjà parsés
+======================================
+
+Le DataFrame minimal (après filtrage Top Conso et projection des colonnes)
+est stocké au format Arrow IPC sous data/parse_cache, indexé par le SHA-256
+du contenu brut du fichier. Un upload ou un chargement par date d'un fichier
+déjà vu est servi par une lecture memory-mappée au lieu d'un nouveau parsing.
+
+L'éviction est de type LRU sur la taille totale du cache (la date de
+modification des fichiers sert d'horodatage d'accès).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+from file_ingestion import load_minimal_dataframe
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow absent : le cache est désactivé
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path("data/parse_cache")
+CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2 Go
+
+# À incrémenter quand le format du DataFrame minimal change
+CACHE_SCHEMA_VERSION = 4
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+_cache_lock = threading.Lock()
+
+
+def compute_file_hash(source) -> str:
+    """SHA-256 du contenu (bytes ou objet fichier binaire, relu depuis le début)"""
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+
+    digest = hashlib.sha256()
+    start = source.tell()
+    for block in iter(lambda: source.read(HASH_BLOCK_SIZE), b""):
+        digest.update(block)
+    source.seek(start)
+    return digest.hexdigest()
+
+
+def _source_size(source) -> int:
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    start = source.tell()
+    size = source.seek(0, os.SEEK_END) - start
+    source.seek(start)
+    return size
+
+
+def _cache_path(file_hash: str) -> Path:
+    return CACHE_DIR / f"{file_hash}.v{CACHE_SCHEMA_VERSION}.arrow"
+
+
+def get_cached_dataframe(file_hash: str):
+    """Retourne (df_minimal, file_info) depuis le cache, ou None"""
+    if pa is None:
+        return None
+
+    path = _cache_path(file_hash)
+    if not path.exists():
+        return None
+
+    try:
+        source = pa.memory_map(str(path), "r")
+        table = pa.ipc.open_file(source).read_all()
+        metadata = table.schema.metadata or {}
+        file_info = json.loads(metadata.get(b"file_info", b"{}"))
+        df = table.to_pandas()
+
+        # Rafraîchir l'horodatage LRU
+        os.utime(path)
+        return df, file_info
+
+    except Exception as e:
+        logger.warning(f"Entrée de cache illisible {path.name}: {e}")
+        path.unlink(missing_ok=True)
+        return None
+
+
+def store_dataframe(file_hash: str, df, file_info: dict):
+    """Enregistre le DataFrame minimal dans le cache puis applique l'éviction"""
+    if pa is None:
+        return
+
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[b"file_info"] = json.dumps(file_info, default=str).encode("utf-8")
+        table = table.replace_schema_metadata(metadata)
+
+        # Écriture atomique : fichier temporaire puis renommage
+        path = _cache_path(file_hash)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with pa.OSFile(str(tmp_path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+    except Exception as e:
+        logger.warning(f"Impossible de mettre en cache {file_hash[:12]}: {e}")
+        return
+
+    evict_if_needed()
+
+
+def evict_if_needed(max_bytes: int = CACHE_MAX_BYTES):
+    """Supprime les entrées les moins récemment utilisées au-delà de max_bytes"""
+    with _cache_lock:
+        if not CACHE_DIR.exists():
+            return
+
+        entries = []
+        for path in CACHE_DIR.glob("*.arrow"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            logger.info(f"Cache parsing: éviction de {path.name}")
+
+
+def load_minimal_dataframe_cached(source, filename: str, progress_callback=None):
+    """
+    load_minimal_dataframe avec cache adressé par contenu.
+    file_info contient en plus file_hash et cache ("hit" / "miss").
+    """
+    file_hash = compute_file_hash(source)
+    file_size = _source_size(source)
+
+    cached = get_cached_dataframe(file_hash)
+    if cached is not None:
+        df_minimal, file_info = cached
+        file_info["cache"] = "hit"
+        if progress_callback:
+            progress_callback(file_info.get("file_size", 0), file_info.get("original_rows", 0),
+                              len(df_minimal))
+        logger.info(f"Cache parsing: {filename} servi depuis le cache ({file_hash[:12]})")
+        return df_minimal, file_info
+
+    df_minimal, file_info = load_minimal_dataframe(source, filename,
+                                                   progress_callback=progress_callback)
+    file_info["file_hash"] = file_hash
+    file_info["file_size"] = file_size
+    store_dataframe(file_hash, df_minimal, file_info)
+    file_info["cache"] = "miss"
+    return df_minimal, file_info
@@ -0,0 +1,136 @@
+# prefetch_scheduler.py
+"""
+Préchargement planifié des fichiers du jour
+===========================================
+
+Une tâche asyncio interroge périodiquement le dossier des fichiers sources.
+Dès qu'une nouvelle date complète (J, J-1, M-1) apparaît, les trois
+fichiers sont téléchargés et parsés (ce qui alimente le miroir SharePoint
+et le cache de parsing), puis l'analyse complète est exécutée et conservée.
+
+Le résultat est conservé dans le cache d'analyses (analysis_cache), indexé
+par les empreintes SHA-256 des trois fichiers : quand un utilisateur
+charge ensuite cette date, /api/analyze retrouve l'analyse pré-calculée
+au lieu de relancer les tableaux.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from functools import partial
+
+from analysis_cache import cached_analyses, get_cached_analysis, store_analysis
+from file_ingestion import align_categories
+from ingestion_executor import fetch_and_ingest
+
+logger = logging.getLogger(__name__)
+
+# Intervalle entre deux scrutations du dossier (secondes)
+PREFETCH_POLL_SECONDS = 600
+
+
+class PrefetchScheduler:
+    """
+    Scrute l'index SharePoint et pré-calcule l'analyse de la dernière date
+    complète.
+
+    index: SharePointListingIndex
+    client_factory: fonction retournant un client SharePoint
+    analyze: fonction (dataframes, file_hashes) -> résultats, exécutée dans un thread
+    """
+
+    def __init__(self, index, client_factory, analyze, poll_seconds: int = PREFETCH_POLL_SECONDS):
+        self.index = index
+        self.client_factory = client_factory
+        self.analyze = analyze
+        self.poll_seconds = poll_seconds
+        self.last_run = None
+        self.last_error = None
+        self.last_date = None
+        self._task = None
+        self._running = asyncio.Lock()
+
+    async def run_once(self):
+        """Pré-calcule la dernière date complète si elle ne l'est pas déjà"""
+        async with self._running:
+            return await self._prefetch_latest()
+
+    async def _prefetch_latest(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.index.refresh)
+        dates = await loop.run_in_executor(None, self.index.available_dates)
+        if not dates:
+            return None
+
+        selected_date = dates[-1]
+        if selected_date == self.last_date:
+            return None
+
+        date_obj = datetime.strptime(selected_date, "%Y-%m-%d")
+        files, missing = await loop.run_in_executor(
+            None, partial(self.index.resolve_analysis_files, date_obj, refresh_on_miss=False))
+        if missing:
+            return None
+
+        started = time.perf_counter()
+        client = self.client_factory()
+        loaded = await asyncio.gather(*[
+            fetch_and_ingest(partial(client.read_binary_file, f"{self.index.base_path}/{filename}"), filename)
+            for filename in files.values()
+        ])
+
+        dataframes = {}
+        file_hashes = {}
+        for file_type, (df_minimal, file_info, _) in zip(files, loaded):
+            dataframes[file_type] = df_minimal
+            file_hashes[file_type] = file_info.get("file_hash")
+        align_categories(list(dataframes.values()))
+
+        if get_cached_analysis(file_hashes) is None:
+            results = await loop.run_in_executor(None, self.analyze, dataframes, file_hashes)
+            store_analysis(file_hashes, results, "prefetch", date=selected_date, files=files)
+
+        self.last_date = selected_date
+        logger.info(f"🕒 Préchargement du {selected_date} terminé en {time.perf_counter() - started:.1f}s")
+        return selected_date
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"⚠️ Erreur préchargement: {e}")
+            self.last_run = datetime.now().isoformat()
+            await asyncio.sleep(self.poll_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Préchargement planifié toutes les {self.poll_seconds}s")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self):
+        return {
+            "running": self._task is not None,
+            "poll_seconds": self.poll_seconds,
+            "last_run": self.last_run,
+            "last_date": self.last_date,
+            "last_error": self.last_error,
+            "prefetched": [
+                {"date": entry["date"], "files": entry["files"], "computed_at": entry["computed_at"]}
+                for entry in cached_analyses("prefetch")
+            ],
+        }
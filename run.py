@@ -13,13 +13,11 @@ from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-import pandas as pd
 import uvicorn
 import logging
 from pathlib import Path
 from datetime import datetime
 import io
-import chardet
 from typing import Optional
 import psutil
 import os
@@ -28,7 +26,12 @@ import secrets
 
 from llm_connector import LLMConnector
 from report_generator import ReportGenerator
-from data_persistence import init_database, save_table_result, get_historical_data
+from data_persistence import init_database, save_table_results, get_historical_data
+from file_ingestion import CSV_EXTENSIONS, align_categories, arrete_date
+from lcr_tables import (build_cubes, create_buffer_table, create_summary_table, create_consumption_table,
+                        create_resources_table, create_cappage_table, create_buffer_nco_table,
+                        create_consumption_resources_table, create_simple_totals_table, create_si_remettant_bar)
+from parse_cache import load_minimal_dataframe_cached
 
 # Initialiser le connecteur LLM
 llm_connector = LLMConnector()
@@ -92,71 +95,6 @@ def get_current_user_from_session(session_token: Optional[str] = Cookie(None)):
         return None
     return active_sessions[session_token]
 
-def convert_file_content_to_dataframe(file_content: bytes, filename: str):
-    """
-    Convertit le contenu d'un fichier directement en DataFrame
-    Sans écriture sur disque
-    """
-    try:
-        extension = Path(filename).suffix.lower()
-        
-        # Excel - lecture directe depuis bytes
-        if extension in ['.xlsx', '.xls', '.xlsm', '.xlsb']:
-            df = pd.read_excel(io.BytesIO(file_content), engine='openpyxl')
-            df.columns = df.columns.astype(str).str.strip()
-            return df, {'format': extension, 'method': 'direct_excel'}
-        
-        # CSV/TSV/TXT - traitement en mémoire
-        elif extension in ['.csv', '.tsv', '.txt']:
-            # Détecter l'encodage
-            encoding = chardet.detect(file_content[:10000])['encoding'] or 'utf-8'
-            
-            # Décoder en string
-            text_content = file_content.decode(encoding)
-            
-            # Détecter le délimiteur
-            if extension == '.tsv':
-                delimiter = '\t'
-            else:
-                first_line = text_content.split('\n')[0]
-                if ';' in first_line:
-                    delimiter = ';'
-                elif '\t' in first_line:
-                    delimiter = '\t'
-                else:
-                    delimiter = ','
-            
-            # Lire directement depuis StringIO (en mémoire)
-            df = pd.read_csv(
-                io.StringIO(text_content),
-                delimiter=delimiter,
-                low_memory=False,
-                dtype=str,
-                na_filter=False
-            )
-            
-            # Nettoyer les colonnes
-            df.columns = df.columns.astype(str).str.strip()
-            
-            # Convertir les colonnes numériques
-            numeric_columns = ['Nominal Value', 'LCR_ECO_IMPACT_LCR']
-            for col in numeric_columns:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col].str.replace(',', '.'), errors='coerce')
-            
-            return df, {
-                'format': extension, 
-                'encoding': encoding, 
-                'delimiter': delimiter,
-                'method': 'memory_csv'
-            }
-        
-        else:
-            raise ValueError(f"Format non supporté: {extension}")
-            
-    except Exception as e:
-        raise ValueError(f"Erreur lecture fichier: {str(e)}")
-
 def cleanup_session_memory():
     """Nettoie la mémoire des DataFrames de session"""
     try:
@@ -313,38 +251,32 @@ async def upload_file(file: UploadFile = File(...),
                 detail=f"Format non supporté: {file_extension}"
             )
 
-        # Lire le contenu en mémoire
-        contents = await file.read()
-        file_size = len(contents)
+        # Les CSV sont lus en streaming depuis le fichier spoolé par Starlette,
+        # les autres formats sont lus en mémoire
+        if file_extension in CSV_EXTENSIONS:
+            source = file.file
+            source.seek(0, os.SEEK_END)
+            file_size = source.tell()
+            source.seek(0)
+        else:
+            source = await file.read()
+            file_size = len(source)
         
-        # TRAITEMENT DIRECT EN MÉMOIRE
+        # LECTURE + FILTRAGE TOP CONSO + PROJECTION (ou cache si déjà parsé)
         try:
-            df, file_info = convert_file_content_to_dataframe(contents, file.filename)
-            logger.info(f"Fichier traité en mémoire: {file_info}")
+            df_minimal, file_info = load_minimal_dataframe_cached(source, file.filename)
+            logger.info(f"Fichier traité: {file_info}")
             
         except Exception as e:
-            del contents
+            del source
             raise HTTPException(status_code=422, detail=f"Erreur lecture: {str(e)}")
         
-        # Sauvegarder les infos AVANT filtrage
-        original_rows = len(df)
-        original_columns = len(df.columns)
-
-        # Filtrer seulement les lignes nécessaires
-        df_filtered = df[df["Top Conso"] == "O"].copy() if "Top Conso" in df.columns else df.copy()
-
-        # OPTIMISATION MÉMOIRE - Ne garder que les colonnes utiles
-        available_cols = [col for col in required_cols if col in df_filtered.columns]
-        df_minimal = df_filtered[available_cols].copy()
-
-        # Optimiser les types de données
-        for col in df_minimal.select_dtypes(include=['float64']):
-            df_minimal[col] = pd.to_numeric(df_minimal[col], downcast='float')
+        # Infos du fichier AVANT filtrage
+        original_rows = file_info['original_rows']
+        original_columns = file_info['original_columns']
 
         # LIBÉRATION MÉMOIRE IMMÉDIATE
-        del df_filtered
-        del df
-        del contents
+        del source
         import gc
         gc.collect()
 
@@ -362,8 +294,12 @@ async def upload_file(file: UploadFile = File(...),
             "rows": len(df_minimal),
             "columns": len(df_minimal.columns),
             "upload_time": datetime.now().isoformat(),
+            "file_hash": file_info.get('file_hash'),
         }
 
+        # Catégories communes entre j, jMinus1 et mMinus1
+        align_categories([info["dataframe"] for info in file_session["files"].values()])
+
         # MONITORING FINAL
         memory_end = process.memory_info().rss / 1024 / 1024
         logger.info(f"Mémoire après upload {file_type}: {memory_end:.1f} MB (diff: +{memory_end-memory_start:.1f} MB)")
@@ -378,7 +314,8 @@ async def upload_file(file: UploadFile = File(...),
             "rows": original_rows,
             "columns": original_columns,
             "file_size": file_size,
-            "processing": "in_memory_optimized"
+            "processing": file_info['method'],
+            "cache": file_info.get('cache')
         }
         
     except HTTPException:
@@ -444,16 +381,17 @@ async def analyze_files(session_token: Optional[str] = Cookie(None)):
             dataframes[file_type] = df
             logger.info(f"{file_type}: {len(df)} lignes (depuis mémoire)")
 
-        # Nouvelles analyses
-        buffer_results = create_buffer_table(dataframes)
-        summary_results = create_summary_table(dataframes)  # NOUVEAU
-        consumption_results = create_consumption_table(dataframes)
-        resources_results = create_resources_table(dataframes)
-        cappage_results = create_cappage_table(dataframes)
-        buffer_nco_results = create_buffer_nco_table(dataframes)
-        consumption_resources_results = create_consumption_resources_table(dataframes)
-        simple_totals_results = create_simple_totals_table(dataframes) 
-        si_remettant_results = create_si_remettant_bar(dataframes)
+        # Nouvelles analyses, découpées dans un cube agrégé une fois par fichier
+        cubes = build_cubes(dataframes)
+        buffer_results = create_buffer_table(cubes)
+        summary_results = create_summary_table(cubes)  # NOUVEAU
+        consumption_results = create_consumption_table(cubes)
+        resources_results = create_resources_table(cubes)
+        cappage_results = create_cappage_table(cubes)
+        buffer_nco_results = create_buffer_nco_table(cubes)
+        consumption_resources_results = create_consumption_resources_table(cubes)
+        simple_totals_results = create_simple_totals_table(cubes) 
+        si_remettant_results = create_si_remettant_bar(cubes)
         
         logger.info("Analyses terminées (nouveaux tableaux)")
 
@@ -485,22 +423,20 @@ async def analyze_files(session_token: Optional[str] = Cookie(None)):
             # Extraire la date d'arrêté du fichier J
             analysis_date = None
             if "j" in file_session["files"]:
-                df_j = file_session["files"]["j"]["dataframe"]
-                if "Date d'arrêté" in df_j.columns:
-                    # Prendre la première date d'arrêté
-                    analysis_date = str(df_j["Date d'arrêté"].iloc[0])
+                # Date d'arrêté du fichier J (la plus récente, AAAA-MM-JJ)
+                analysis_date = arrete_date(file_session["files"]["j"]["dataframe"])
             
             if analysis_date:
-                # Sauvegarder uniquement les 5 tableaux concernés
-                save_table_result(analysis_date, "cappage", cappage_results)
-                save_table_result(analysis_date, "buffer_nco_buffer", 
-                                buffer_nco_results.get("data", {}).get("j", {}).get("buffer_pivot_data", []))
-                save_table_result(analysis_date, "buffer_nco_nco",
-                                buffer_nco_results.get("data", {}).get("j", {}).get("nco_pivot_data", []))
-                save_table_result(analysis_date, "consumption_resources_consumption",
-                                consumption_resources_results.get("data", {}).get("j", {}).get("consumption_data", []))
-                save_table_result(analysis_date, "consumption_resources_resources",
-                                consumption_resources_results.get("data", {}).get("j", {}).get("resources_data", []))
+                # Sauvegarder uniquement les 5 tableaux concernés (une seule transaction)
+                save_table_results(analysis_date, {
+                    "cappage": cappage_results,
+                    "buffer_nco_buffer": buffer_nco_results.get("data", {}).get("j", {}).get("buffer_pivot_data", []),
+                    "buffer_nco_nco": buffer_nco_results.get("data", {}).get("j", {}).get("nco_pivot_data", []),
+                    "consumption_resources_consumption":
+                        consumption_resources_results.get("data", {}).get("j", {}).get("consumption_data", []),
+                    "consumption_resources_resources":
+                        consumption_resources_results.get("data", {}).get("j", {}).get("resources_data", []),
+                })
                 
                 logger.info(f"✅ Historique sauvegardé pour {analysis_date}")
             else:
@@ -982,476 +918,9 @@ async def view_current_report(session_token: Optional[str] = Cookie(None)):
     
 
 
-# ========================== FONCTIONS BUFFER TABLE ===========================
+# ========================== FONCTIONS PROMPT CONSUMPTION & RESOURCES ===========================
 
 
-def create_buffer_table(dataframes):
-    """
-    Crée le tableau BUFFER avec structure TCD Excel
-    Filtre: LCR_Catégorie = "1- Buffer"
-    Lignes: LCR_Template Section 1 + Libellé Client (hiérarchie)
-    Valeurs: D (Today), Variation D vs D-1, Variation D vs M-1
-    """
-    try:
-        logger.info("📊 Création du tableau BUFFER - Style TCD Excel avec variations")
-        
-        # Vérification que nous avons les trois fichiers nécessaires
-        if not all(key in dataframes for key in ['j', 'jMinus1', 'mMinus1']):
-            return {
-                "title": "BUFFER - Erreur",
-                "error": "Les trois fichiers (J, J-1, M-1) sont requis pour calculer les variations"
-            }
-        
-        buffer_results = {}
-        
-        for file_type, df in dataframes.items():
-            logger.info(f"📄 Traitement BUFFER TCD pour {file_type}")
-            
-            # Vérification des colonnes requises
-            buffer_cols = ["Top Conso", "LCR_Catégorie", "LCR_Template Section 1", 
-                          "Libellé Client", "LCR_Assiette Pondérée"]
-            missing_cols = [col for col in buffer_cols if col not in df.columns]
-            
-            if missing_cols:
-                logger.warning(f"⚠️ Colonnes manquantes pour BUFFER {file_type}: {missing_cols}")
-                continue
-            
-            # Filtrage des données - TCD Style
-            df_filtered = df[df["Top Conso"] == "O"].copy()
-            df_filtered = df_filtered[df_filtered["LCR_Catégorie"] == "1- Buffer"].copy()
-            
-            logger.info(f"📋 Après filtrage BUFFER TCD: {len(df_filtered)} lignes")
-            
-            if len(df_filtered) == 0:
-                logger.warning(f"⚠️ Aucune donnée BUFFER pour {file_type}")
-                buffer_results[file_type] = {
-                    "pivot_data": [],
-                    "sections": []
-                }
-                continue
-            
-            # Préparation des données
-            df_filtered["LCR_Assiette Pondérée"] = pd.to_numeric(
-                df_filtered["LCR_Assiette Pondérée"], errors='coerce'
-            ).fillna(0)
-            
-            # Nettoyage des champs texte
-            df_filtered["LCR_Template Section 1"] = df_filtered["LCR_Template Section 1"].astype(str).str.strip()
-            df_filtered["Libellé Client"] = df_filtered["Libellé Client"].astype(str).str.strip()
-            
-            # Grouper les données pour créer la structure pivot
-            pivot_data = []
-            sections = sorted(df_filtered["LCR_Template Section 1"].unique())
-            
-            for section in sections:
-                section_data = df_filtered[df_filtered["LCR_Template Section 1"] == section]
-                clients = sorted(section_data["Libellé Client"].unique())
-                
-                # Calculer les totaux de section pour toutes les périodes
-                section_total_j = section_data["LCR_Assiette Pondérée"].sum() / 1_000_000_000
-                
-                # Données clients détaillées
-                client_details = []
-                
-                for client in clients:
-                    client_data = section_data[section_data["Libellé Client"] == client]
-                    value_j = client_data["LCR_Assiette Pondérée"].sum() / 1_000_000_000
-                    
-                    client_details.append({
-                        "client": client,
-                        "value_j": float(value_j),
-                        "is_detail": True
-                    })
-                
-                # Ajouter le groupe de section avec ses détails
-                pivot_data.append({
-                    "section": section,
-                    "client_details": client_details,
-                    "section_total_j": float(section_total_j),
-                    "is_section_group": True
-                })
-            
-            buffer_results[file_type] = {
-                "pivot_data": pivot_data,
-                "sections": sections
-            }
-            
-            logger.info(f"✅ BUFFER TCD {file_type}: {len(pivot_data)} sections")
-        
-        # Calculer les variations entre les périodes
-        if 'j' in buffer_results and 'jMinus1' in buffer_results and 'mMinus1' in buffer_results:
-            buffer_results_with_variations = calculate_buffer_variations(
-                buffer_results['j'], 
-                buffer_results['jMinus1'], 
-                buffer_results['mMinus1']
-            )
-        else:
-            buffer_results_with_variations = buffer_results.get('j', {"pivot_data": [], "sections": []})
-        
-        return {
-            "title": "BUFFER - TCD Analysis with Variations",
-            "data": buffer_results_with_variations,
-            "metadata": {
-                "analysis_date": datetime.now().isoformat(),
-                "tcd_config": {
-                    "filters": {"lcr_categorie": "1- Buffer", "top_conso": "O"},
-                    "rows": ["LCR_Template Section 1", "Libellé Client"],
-                    "values": ["D (Today) Bn €", "Variation D vs D-1", "Variation D vs M-1"]
-                }
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur création tableau BUFFER TCD: {e}")
-        return {
-            "title": "BUFFER - Erreur",
-            "error": str(e)
-        }
-
-def calculate_buffer_variations(data_j, data_j1, data_m1):
-    """
-    Calcule les variations pour le tableau BUFFER
-    """
-    try:
-        # Créer des mappings pour les recherches rapides
-        j1_map = {}
-        m1_map = {}
-        
-        # Mapper les données J-1
-        for section_group in data_j1.get("pivot_data", []):
-            section = section_group["section"]
-            for client_detail in section_group.get("client_details", []):
-                key = f"{section}|{client_detail['client']}"
-                j1_map[key] = client_detail["value_j"]
-        
-        # Mapper les données M-1
-        for section_group in data_m1.get("pivot_data", []):
-            section = section_group["section"]
-            for client_detail in section_group.get("client_details", []):
-                key = f"{section}|{client_detail['client']}"
-                m1_map[key] = client_detail["value_j"]
-        
-        # Calculer les variations pour les données J
-        result_data = {"pivot_data": [], "sections": data_j.get("sections", [])}
-        
-        for section_group in data_j.get("pivot_data", []):
-            section = section_group["section"]
-            
-            # Calculer les variations pour chaque client
-            client_details_with_variations = []
-            section_total_j = 0
-            section_total_j1 = 0
-            section_total_m1 = 0
-            
-            for client_detail in section_group.get("client_details", []):
-                client = client_detail["client"]
-                key = f"{section}|{client}"
-                
-                value_j = client_detail["value_j"]
-                value_j1 = j1_map.get(key, 0)
-                value_m1 = m1_map.get(key, 0)
-                
-                variation_daily = value_j - value_j1
-                variation_monthly = value_j - value_m1
-                
-                # Cumuler pour les totaux de section
-                section_total_j += value_j
-                section_total_j1 += value_j1
-                section_total_m1 += value_m1
-                
-                client_details_with_variations.append({
-                    "client": client,
-                    "value_j": float(value_j),
-                    "variation_daily": float(variation_daily),
-                    "variation_monthly": float(variation_monthly),
-                    "is_detail": True
-                })
-            
-            # Calculer les variations de section
-            section_variation_daily = section_total_j - section_total_j1
-            section_variation_monthly = section_total_j - section_total_m1
-            
-            result_data["pivot_data"].append({
-                "section": section,
-                "client_details": client_details_with_variations,
-                "section_total_j": float(section_total_j),
-                "section_variation_daily": float(section_variation_daily),
-                "section_variation_monthly": float(section_variation_monthly),
-                "is_section_group": True
-            })
-        
-        return result_data
-        
-    except Exception as e:
-        logger.error(f"Erreur calcul variations BUFFER: {e}")
-        return data_j
-    
-
-# ========================== FONCTIONS SUMMARY TABLE ===========================
-
-
-def create_summary_table(dataframes):
-    """
-    Crée le tableau de synthèse sans titre avec comparaison des deux fichiers
-    """
-    try:
-        logger.info("📊 Création du tableau de synthèse")
-        
-        summary_results = {}
-        
-        # Vérification que nous avons les deux fichiers
-        if "j" not in dataframes or "jMinus1" not in dataframes:
-            logger.warning("⚠️ Les deux fichiers sont requis pour le tableau de synthèse")
-            return {
-                "title": "Summary Table",
-                "error": "Les deux fichiers sont requis"
-            }
-        
-        for file_type, df in dataframes.items():
-            logger.info(f"📄 Traitement synthèse pour {file_type}")
-            
-            # Vérification des colonnes requises
-            summary_cols = ["Top Conso", "Date d'arrêté", "LCR_Assiette Pondérée", "LCR_ECO_IMPACT_LCR"]
-            missing_cols = [col for col in summary_cols if col not in df.columns]
-            
-            if missing_cols:
-                logger.warning(f"⚠️ Colonnes manquantes pour synthèse {file_type}: {missing_cols}")
-                continue
-            
-            # Filtrage Top Conso = "O"
-            df_filtered = df[df["Top Conso"] == "O"].copy()
-            
-            logger.info(f"📋 Après filtrage Top Conso: {len(df_filtered)} lignes")
-            
-            if len(df_filtered) == 0:
-                logger.warning(f"⚠️ Aucune donnée pour synthèse {file_type}")
-                continue
-            
-            # Préparation des données
-            df_filtered["LCR_Assiette Pondérée"] = pd.to_numeric(
-                df_filtered["LCR_Assiette Pondérée"], errors='coerce'
-            ).fillna(0)
-            
-            df_filtered["LCR_ECO_IMPACT_LCR"] = pd.to_numeric(
-                df_filtered["LCR_ECO_IMPACT_LCR"], errors='coerce'
-            ).fillna(0)
-            
-            # Nettoyage du champ date
-            df_filtered["Date d'arrêté"] = df_filtered["Date d'arrêté"].astype(str).str.strip()
-            
-            # Obtenir les dates uniques pour ce fichier
-            dates = sorted(df_filtered["Date d'arrêté"].unique())
-            
-            # Calculer les sommes par date
-            summary_data = []
-            
-            for date in dates:
-                date_data = df_filtered[df_filtered["Date d'arrêté"] == date]
-                
-                sum_assiette = float(date_data["LCR_Assiette Pondérée"].sum()) / 1_000_000_000
-                sum_impact = float(date_data["LCR_ECO_IMPACT_LCR"].sum()) / 1_000_000_000
-                sum_difference = sum_assiette - sum_impact
-                
-                summary_data.append({
-                    "date": date,
-                    "sum_assiette": sum_assiette,
-                    "sum_impact": sum_impact,
-                    "sum_difference": sum_difference,
-                    "file_type": file_type
-                })
-            
-            summary_results[file_type] = summary_data
-            logger.info(f"✅ Synthèse {file_type}: {len(summary_data)} dates")
-        
-        return {
-            "title": "",  # Pas de titre
-            "data": summary_results,
-            "metadata": {
-                "analysis_date": datetime.now().isoformat(),
-                "filters_applied": {
-                    "top_conso": "O"
-                }
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur création tableau synthèse: {e}")
-        return {
-            "title": "Summary Table - Erreur",
-            "error": str(e)
-        }
-    
-
-# ========================== FONCTIONS CONSUMPTION TABLE ===========================
-
-
-def create_consumption_table(dataframes):
-    """
-    Crée le tableau CONSUMPTION avec filtres spécifiques
-    """
-    try:
-        logger.info("📊 Création du tableau CONSUMPTION")
-        
-        consumption_results = {}
-        
-        for file_type, df in dataframes.items():
-            logger.info(f"📄 Traitement CONSUMPTION pour {file_type}")
-            
-            # Vérification des colonnes requises
-            consumption_cols = ["Top Conso", "LCR_ECO_GROUPE_METIERS", "Sous-Métier", 
-                              "Produit", "LCR_ECO_IMPACT_LCR"]
-            missing_cols = [col for col in consumption_cols if col not in df.columns]
-            
-            if missing_cols:
-                logger.warning(f"⚠️ Colonnes manquantes pour CONSUMPTION {file_type}: {missing_cols}")
-                continue
-            
-            # Filtrage des données
-            df_filtered = df[df["Top Conso"] == "O"].copy()
-            
-            # Filtres spécifiques CONSUMPTION
-            allowed_groupes = ["A&WM & Insurance", "CIB Financing", "CIB Markets", "GLOBAL TRADE", "Other Consumption"]
-            df_filtered = df_filtered[df_filtered["LCR_ECO_GROUPE_METIERS"].isin(allowed_groupes)].copy()
-            
-            excluded_sous_metier = ["GT TREASURY SOLUTIONS", "GT GROUP SERVICES"]
-            df_filtered = df_filtered[~df_filtered["Sous-Métier"].isin(excluded_sous_metier)].copy()
-            
-            excluded_produit = ["SIGHT DEPOSIT MIRROR", "SIGHT FINANCING MIRROR"]
-            df_filtered = df_filtered[~df_filtered["Produit"].isin(excluded_produit)].copy()
-            
-            logger.info(f"📋 Après filtrage CONSUMPTION: {len(df_filtered)} lignes")
-            
-            if len(df_filtered) == 0:
-                logger.warning(f"⚠️ Aucune donnée CONSUMPTION pour {file_type}")
-                continue
-            
-            # Préparation des données
-            df_filtered["LCR_ECO_IMPACT_LCR"] = pd.to_numeric(
-                df_filtered["LCR_ECO_IMPACT_LCR"], errors='coerce'
-            ).fillna(0)
-
-            # Groupement par LCR_ECO_GROUPE_METIERS
-            grouped = df_filtered.groupby("LCR_ECO_GROUPE_METIERS")["LCR_ECO_IMPACT_LCR"].sum().reset_index()
-            grouped["LCR_ECO_IMPACT_LCR_Bn"] = (grouped["LCR_ECO_IMPACT_LCR"] / 1_000_000_000).round(3)
-
-            # Convertir en dictionnaire avec types Python natifs
-            consumption_results[file_type] = [
-                {
-                    "LCR_ECO_GROUPE_METIERS": str(row["LCR_ECO_GROUPE_METIERS"]),
-                    "LCR_ECO_IMPACT_LCR": float(row["LCR_ECO_IMPACT_LCR"]),
-                    "LCR_ECO_IMPACT_LCR_Bn": float(row["LCR_ECO_IMPACT_LCR_Bn"])
-                }
-                for _, row in grouped.iterrows()
-            ]
-            logger.info(f"✅ CONSUMPTION {file_type}: {len(grouped)} groupes")
-        
-        return {
-            "title": "CONSUMPTION",
-            "data": consumption_results,
-            "metadata": {
-                "analysis_date": datetime.now().isoformat(),
-                "filters_applied": {
-                    "top_conso": "O",
-                    "groupe_metiers": allowed_groupes,
-                    "excluded_sous_metier": excluded_sous_metier,
-                    "excluded_produit": excluded_produit
-                }
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur création tableau CONSUMPTION: {e}")
-        return {
-            "title": "CONSUMPTION - Erreur",
-            "error": str(e)
-        }
-
-
-# ========================== FONCTIONS RESOURCES TABLE ===========================
-
-
-def create_resources_table(dataframes):
-    """
-    Crée le tableau RESOURCES avec filtres spécifiques
-    """
-    try:
-        logger.info("📊 Création du tableau RESOURCES")
-        
-        resources_results = {}
-        
-        for file_type, df in dataframes.items():
-            logger.info(f"📄 Traitement RESOURCES pour {file_type}")
-            
-            # Vérification des colonnes requises
-            resources_cols = ["Top Conso", "LCR_ECO_GROUPE_METIERS", "Sous-Métier", 
-                            "Produit", "LCR_ECO_IMPACT_LCR"]
-            missing_cols = [col for col in resources_cols if col not in df.columns]
-            
-            if missing_cols:
-                logger.warning(f"⚠️ Colonnes manquantes pour RESOURCES {file_type}: {missing_cols}")
-                continue
-            
-            # Filtrage des données
-            df_filtered = df[df["Top Conso"] == "O"].copy()
-            
-            # Filtres spécifiques RESOURCES
-            allowed_groupes = ["GLOBAL TRADE", "Other Contribution", "Treasury"]
-            df_filtered = df_filtered[df_filtered["LCR_ECO_GROUPE_METIERS"].isin(allowed_groupes)].copy()
-            
-            excluded_sous_metier = ["GT GROUP SERVICES", "GT COMMODITY", "GT TRADE FINANCE", "SYN GLOBAL TRADE"]
-            df_filtered = df_filtered[~df_filtered["Sous-Métier"].isin(excluded_sous_metier)].copy()
-            
-            excluded_produit = ["SIGHT DEPOSIT MIRROR", "SIGHT FINANCING MIRROR"]
-            df_filtered = df_filtered[~df_filtered["Produit"].isin(excluded_produit)].copy()
-            
-            logger.info(f"📋 Après filtrage RESOURCES: {len(df_filtered)} lignes")
-            
-            if len(df_filtered) == 0:
-                logger.warning(f"⚠️ Aucune donnée RESOURCES pour {file_type}")
-                continue
-            
-            # Préparation des données
-            df_filtered["LCR_ECO_IMPACT_LCR"] = pd.to_numeric(
-                df_filtered["LCR_ECO_IMPACT_LCR"], errors='coerce'
-            ).fillna(0)
-            
-            # Groupement par LCR_ECO_GROUPE_METIERS
-            grouped = df_filtered.groupby("LCR_ECO_GROUPE_METIERS")["LCR_ECO_IMPACT_LCR"].sum().reset_index()
-            grouped["LCR_ECO_IMPACT_LCR_Bn"] = (grouped["LCR_ECO_IMPACT_LCR"] / 1_000_000_000).round(3)
-            
-            # Convertir en dictionnaire avec types Python natifs
-            resources_results[file_type] = [
-                {
-                    "LCR_ECO_GROUPE_METIERS": str(row["LCR_ECO_GROUPE_METIERS"]),
-                    "LCR_ECO_IMPACT_LCR": float(row["LCR_ECO_IMPACT_LCR"]),
-                    "LCR_ECO_IMPACT_LCR_Bn": float(row["LCR_ECO_IMPACT_LCR_Bn"])
-                }
-                for _, row in grouped.iterrows()
-            ]
-            
-            logger.info(f"✅ RESOURCES {file_type}: {len(grouped)} groupes")
-        
-        return {
-            "title": "RESOURCES",
-            "data": resources_results,
-            "metadata": {
-                "analysis_date": datetime.now().isoformat(),
-                "filters_applied": {
-                    "top_conso": "O",
-                    "groupe_metiers": allowed_groupes,
-                    "excluded_sous_metier": excluded_sous_metier,
-                    "excluded_produit": excluded_produit
-                }
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur création tableau RESOURCES: {e}")
-        return {
-            "title": "RESOURCES - Erreur",
-            "error": str(e)
-        }
-    
 def prepare_consumption_resources_analysis_prompt(context_data):
     """
     Prépare le prompt d'analyse pour Consumption & Resources
@@ -1511,569 +980,6 @@ def prepare_consumption_resources_analysis_prompt(context_data):
     return "\n".join(prompt_parts)
 
 
-# ========================== FONCTIONS CAPPAGE TABLE ===========================
-
-
-def create_cappage_table(dataframes):
-    """
-    Crée le tableau CAPPAGE avec structure TCD Excel style
-    Filtre: SI Remettant = SHORT_LCR ou CAPREOS
-    Lignes: SI Remettant + Commentaire (hiérarchie)
-    Colonnes: Date d'arrêté
-    Valeurs: Somme LCR_Assiette Pondérée
-    """
-    try:
-        logger.info("📊 Création du tableau CAPPAGE - Style TCD Excel")
-        
-        cappage_results = {}
-        
-        for file_type, df in dataframes.items():
-            logger.info(f"📄 Traitement CAPPAGE TCD pour {file_type}")
-            
-            # Vérification des colonnes requises
-            cappage_cols = ["Top Conso", "SI Remettant", "Commentaire", 
-                           "Date d'arrêté", "LCR_Assiette Pondérée"]
-            missing_cols = [col for col in cappage_cols if col not in df.columns]
-            
-            if missing_cols:
-                logger.warning(f"⚠️ Colonnes manquantes pour CAPPAGE {file_type}: {missing_cols}")
-                continue
-            
-            # Filtrage des données - TCD Style
-            df_filtered = df[df["Top Conso"] == "O"].copy()
-            
-            # Filtre principal: SI Remettant
-            allowed_si_remettant = ["SHORT_LCR", "CAPREOS"]
-            df_filtered = df_filtered[df_filtered["SI Remettant"].isin(allowed_si_remettant)].copy()
-            
-            logger.info(f"📋 Après filtrage CAPPAGE TCD: {len(df_filtered)} lignes")
-            
-            if len(df_filtered) == 0:
-                logger.warning(f"⚠️ Aucune donnée CAPPAGE pour {file_type}")
-                cappage_results[file_type] = {
-                    "pivot_data": [],
-                    "dates": [],
-                    "si_remettant_groups": []
-                }
-                continue
-            
-            # Préparation des données pour le TCD
-            df_filtered["LCR_Assiette Pondérée"] = pd.to_numeric(
-                df_filtered["LCR_Assiette Pondérée"], errors='coerce'
-            ).fillna(0)
-            
-            # Nettoyage des champs texte
-            df_filtered["SI Remettant"] = df_filtered["SI Remettant"].astype(str).str.strip()
-            df_filtered["Commentaire"] = df_filtered["Commentaire"].astype(str).str.strip()
-            df_filtered["Date d'arrêté"] = df_filtered["Date d'arrêté"].astype(str).str.strip()
-            
-            # Récupérer toutes les dates uniques (colonnes du TCD)
-            dates = sorted(df_filtered["Date d'arrêté"].unique())
-            
-            # Créer la structure TCD hiérarchique
-            pivot_structure = []
-            
-            # Grouper par SI Remettant (niveau 1 de hiérarchie)
-            for si_remettant in allowed_si_remettant:
-                si_data = df_filtered[df_filtered["SI Remettant"] == si_remettant]
-                
-                if len(si_data) == 0:
-                    continue
-                
-                # Sous-groupes par Commentaire (niveau 2 de hiérarchie)
-                commentaires = sorted(si_data["Commentaire"].unique())
-                
-                # Données détaillées par commentaire
-                commentaire_details = []
-                si_totals_by_date = {}
-                
-                for commentaire in commentaires:
-                    commentaire_data = si_data[si_data["Commentaire"] == commentaire]
-                    
-                    # Calculer les valeurs par date pour ce commentaire
-                    date_values = {}
-                    for date in dates:
-                        date_total = commentaire_data[
-                            commentaire_data["Date d'arrêté"] == date
-                        ]["LCR_Assiette Pondérée"].sum()
-                        
-                        # Conversion en milliards
-                        date_values[date] = float(date_total) / 1_000_000_000
-                        
-                        # Cumuler pour les totaux SI Remettant
-                        if date not in si_totals_by_date:
-                            si_totals_by_date[date] = 0
-                        si_totals_by_date[date] += date_values[date]
-                    
-                    # Ajouter cette ligne de détail
-                    commentaire_details.append({
-                        "commentaire": commentaire,
-                        "date_values": date_values,
-                        "is_detail": True,
-                        "total": sum(date_values.values())
-                    })
-                
-                # Ajouter le groupe SI Remettant avec ses détails
-                pivot_structure.append({
-                    "si_remettant": si_remettant,
-                    "commentaire_details": commentaire_details,
-                    "si_totals_by_date": si_totals_by_date,
-                    "grand_total": sum(si_totals_by_date.values()),
-                    "is_si_group": True
-                })
-            
-            cappage_results[file_type] = {
-                "pivot_data": pivot_structure,
-                "dates": dates,
-                "si_remettant_groups": allowed_si_remettant
-            }
-            
-            logger.info(f"✅ CAPPAGE TCD {file_type}: {len(pivot_structure)} groupes SI, {len(dates)} dates")
-        
-        return {
-            "title": "CAPPAGE & Short_LCR - TCD Analysis",
-            "data": cappage_results,
-            "metadata": {
-                "analysis_date": datetime.now().isoformat(),
-                "tcd_config": {
-                    "filters": {"si_remettant": allowed_si_remettant, "top_conso": "O"},
-                    "rows": ["SI Remettant", "Commentaire"],
-                    "columns": ["Date d'arrêté"],
-                    "values": "Somme LCR_Assiette Pondérée (Bn €)"
-                }
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur création tableau CAPPAGE TCD: {e}")
-        return {
-            "title": "CAPPAGE & Short_LCR - Erreur",
-            "error": str(e)
-        }
-
-
-# ========================== FONCTIONS BUFFER & NCO TABLE ===========================
-
-
-def create_buffer_nco_table(dataframes):
-    """
-    Crée les tableaux BUFFER & NCO avec structure TCD Excel style
-    
-    Tableau 1 - BUFFER:
-    - Filtre: LCR_Catégorie = "1- Buffer"
-    - Lignes: LCR_Template Section 1 + Libellé Client (hiérarchie)
-    - Colonnes: Date d'arrêté
-    - Valeurs: Somme LCR_Assiette Pondérée
-    
-    Tableau 2 - NCO:
-    - Pas de filtre
-    - Lignes: LCR_Catégorie
-    - Colonnes: Date d'arrêté
-    - Valeurs: Somme LCR_Assiette Pondérée
-    """
-    try:
-        logger.info("📊 Création des tableaux BUFFER & NCO - Style TCD Excel")
-        
-        buffer_nco_results = {}
-        
-        for file_type, df in dataframes.items():
-            logger.info(f"📄 Traitement BUFFER & NCO TCD pour {file_type}")
-            
-            # Vérification des colonnes requises
-            buffer_nco_cols = ["Top Conso", "LCR_Catégorie", "LCR_Template Section 1", 
-                              "Libellé Client", "Date d'arrêté", "LCR_Assiette Pondérée"]
-            missing_cols = [col for col in buffer_nco_cols if col not in df.columns]
-            
-            if missing_cols:
-                logger.warning(f"⚠️ Colonnes manquantes pour BUFFER & NCO {file_type}: {missing_cols}")
-                continue
-            
-            # Filtrage Top Conso pour les deux tableaux
-            df_filtered = df[df["Top Conso"] == "O"].copy()
-            
-            logger.info(f"📋 Après filtrage Top Conso: {len(df_filtered)} lignes")
-            
-            if len(df_filtered) == 0:
-                logger.warning(f"⚠️ Aucune donnée BUFFER & NCO pour {file_type}")
-                continue
-            
-            # Préparation des données
-            df_filtered["LCR_Assiette Pondérée"] = pd.to_numeric(
-                df_filtered["LCR_Assiette Pondérée"], errors='coerce'
-            ).fillna(0)
-            
-            # Nettoyage des champs texte
-            df_filtered["LCR_Catégorie"] = df_filtered["LCR_Catégorie"].astype(str).str.strip()
-            df_filtered["LCR_Template Section 1"] = df_filtered["LCR_Template Section 1"].astype(str).str.strip()
-            df_filtered["Libellé Client"] = df_filtered["Libellé Client"].astype(str).str.strip()
-            df_filtered["Date d'arrêté"] = df_filtered["Date d'arrêté"].astype(str).str.strip()
-            
-            # Obtenir toutes les dates uniques
-            dates = sorted(df_filtered["Date d'arrêté"].unique())
-            
-            # =============================================================================
-            # TABLEAU 1: BUFFER (avec filtre LCR_Catégorie = "1- Buffer")
-            # =============================================================================
-            buffer_pivot_data = []
-            df_buffer = df_filtered[df_filtered["LCR_Catégorie"] == "1- Buffer"].copy()
-            
-            if len(df_buffer) > 0:
-                # Grouper par LCR_Template Section 1 (niveau 1 de hiérarchie)
-                sections = sorted(df_buffer["LCR_Template Section 1"].unique())
-                
-                for section in sections:
-                    section_data = df_buffer[df_buffer["LCR_Template Section 1"] == section]
-                    
-                    # Sous-groupes par Libellé Client (niveau 2 de hiérarchie)
-                    clients = sorted(section_data["Libellé Client"].unique())
-                    
-                    # Données détaillées par client
-                    client_details = []
-                    section_totals_by_date = {}
-                    
-                    for client in clients:
-                        client_data = section_data[section_data["Libellé Client"] == client]
-                        
-                        # Calculer les valeurs par date pour ce client
-                        date_values = {}
-                        for date in dates:
-                            date_total = client_data[
-                                client_data["Date d'arrêté"] == date
-                            ]["LCR_Assiette Pondérée"].sum()
-                            
-                            # Conversion en milliards
-                            date_values[date] = float(date_total) / 1_000_000_000
-                            
-                            # Cumuler pour les totaux de section
-                            if date not in section_totals_by_date:
-                                section_totals_by_date[date] = 0
-                            section_totals_by_date[date] += date_values[date]
-                        
-                        # Ajouter cette ligne de détail client
-                        client_details.append({
-                            "client": client,
-                            "date_values": date_values,
-                            "is_detail": True
-                        })
-                    
-                    # Ajouter le groupe Section avec ses détails
-                    buffer_pivot_data.append({
-                        "section": section,
-                        "client_details": client_details,
-                        "section_totals_by_date": section_totals_by_date,
-                        "is_section_group": True
-                    })
-            
-            # =============================================================================
-            # TABLEAU 2: NCO (pas de filtre, groupé par LCR_Catégorie)
-            # =============================================================================
-            nco_pivot_data = []
-            
-            # Grouper par LCR_Catégorie
-            categories = sorted(df_filtered["LCR_Catégorie"].unique())
-            
-            for categorie in categories:
-                categorie_data = df_filtered[df_filtered["LCR_Catégorie"] == categorie]
-                
-                # Calculer les valeurs par date pour cette catégorie
-                date_values = {}
-                for date in dates:
-                    date_total = categorie_data[
-                        categorie_data["Date d'arrêté"] == date
-                    ]["LCR_Assiette Pondérée"].sum()
-                    
-                    # Conversion en milliards
-                    date_values[date] = float(date_total) / 1_000_000_000
-                
-                # Ajouter cette catégorie
-                nco_pivot_data.append({
-                    "categorie": categorie,
-                    "date_values": date_values
-                })
-            
-            buffer_nco_results[file_type] = {
-                "buffer_pivot_data": buffer_pivot_data,
-                "nco_pivot_data": nco_pivot_data,
-                "dates": dates
-            }
-            
-            logger.info(f"✅ BUFFER & NCO TCD {file_type}: Buffer={len(buffer_pivot_data)} sections, NCO={len(nco_pivot_data)} catégories, {len(dates)} dates")
-        
-        return {
-            "title": "BUFFER & NCO - TCD Analysis",
-            "data": buffer_nco_results,
-            "metadata": {
-                "analysis_date": datetime.now().isoformat(),
-                "tcd_config": {
-                    "buffer_table": {
-                        "filters": {"lcr_categorie": "1- Buffer", "top_conso": "O"},
-                        "rows": ["LCR_Template Section 1", "Libellé Client"],
-                        "columns": ["Date d'arrêté"],
-                        "values": "Somme LCR_Assiette Pondérée (Bn €)"
-                    },
-                    "nco_table": {
-                        "filters": {"top_conso": "O"},
-                        "rows": ["LCR_Catégorie"],
-                        "columns": ["Date d'arrêté"],
-                        "values": "Somme LCR_Assiette Pondérée (Bn €)"
-                    }
-                }
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur création tableaux BUFFER & NCO TCD: {e}")
-        return {
-            "title": "BUFFER & NCO - Erreur",
-            "error": str(e)
-        }
-      
-
-# ========================== FONCTIONS CONSUMPTION & RESOURCES TABLE ===========================
-
-
-def create_consumption_resources_table(dataframes):
-    """
-    Crée les tableaux CONSUMPTION & RESOURCES avec structure pivot par date
-    """
-    try:
-        logger.info("📊 Création des tableaux CONSUMPTION & RESOURCES")
-        
-        consumption_resources_results = {}
-        
-        for file_type, df in dataframes.items():
-            logger.info(f"📄 Traitement CONSUMPTION & RESOURCES pour {file_type}")
-            
-            # Vérification des colonnes requises
-            cons_res_cols = ["Top Conso", "LCR_ECO_GROUPE_METIERS", "Sous-Métier", 
-                            "Date d'arrêté", "LCR_ECO_IMPACT_LCR"]
-            missing_cols = [col for col in cons_res_cols if col not in df.columns]
-            
-            if missing_cols:
-                logger.warning(f"⚠️ Colonnes manquantes pour CONSUMPTION & RESOURCES {file_type}: {missing_cols}")
-                continue
-            
-            # Filtrage Top Conso pour les deux tableaux
-            df_filtered = df[df["Top Conso"] == "O"].copy()
-            
-            logger.info(f"📋 Après filtrage Top Conso: {len(df_filtered)} lignes")
-            
-            if len(df_filtered) == 0:
-                logger.warning(f"⚠️ Aucune donnée CONSUMPTION & RESOURCES pour {file_type}")
-                continue
-            
-            # Préparation des données
-            df_filtered["LCR_ECO_IMPACT_LCR"] = pd.to_numeric(
-                df_filtered["LCR_ECO_IMPACT_LCR"], errors='coerce'
-            ).fillna(0)
-            
-            # Nettoyage des champs texte
-            df_filtered["LCR_ECO_GROUPE_METIERS"] = df_filtered["LCR_ECO_GROUPE_METIERS"].astype(str).str.strip()
-            df_filtered["Sous-Métier"] = df_filtered["Sous-Métier"].astype(str).str.strip()
-            df_filtered["Date d'arrêté"] = df_filtered["Date d'arrêté"].astype(str).str.strip()
-            
-            # Obtenir toutes les dates uniques
-            dates = sorted(df_filtered["Date d'arrêté"].unique())
-            
-            # TABLEAU 1: CONSUMPTION
-            consumption_data = []
-            allowed_groupes_cons = ["A&WM & Insurance", "CIB Financing", "CIB Markets", "GLOBAL TRADE", "Other Consumption"]
-            excluded_sous_metier_cons = ["GT TREASURY SOLUTIONS", "GT GROUP SERVICES"]
-            
-            df_consumption = df_filtered[df_filtered["LCR_ECO_GROUPE_METIERS"].isin(allowed_groupes_cons)].copy()
-            df_consumption = df_consumption[~df_consumption["Sous-Métier"].isin(excluded_sous_metier_cons)].copy()
-            
-            if len(df_consumption) > 0:
-                for groupe in allowed_groupes_cons:
-                    groupe_data = df_consumption[df_consumption["LCR_ECO_GROUPE_METIERS"] == groupe]
-                    
-                    if len(groupe_data) > 0:
-                        row_data = {
-                            "lcr_eco_groupe_metiers": groupe,
-                            "dates": {}
-                        }
-                        
-                        for date in dates:
-                            date_data = groupe_data[groupe_data["Date d'arrêté"] == date]
-                            total = float(date_data["LCR_ECO_IMPACT_LCR"].sum()) / 1_000_000_000
-                            row_data["dates"][date] = total
-                        
-                        consumption_data.append(row_data)
-            
-            # TABLEAU 2: RESOURCES
-            resources_data = []
-            allowed_groupes_res = ["GLOBAL TRADE", "Other Contribution", "Treasury"]
-            excluded_sous_metier_res = ["GT GROUP SERVICES", "GT COMMODITY", "GT TRADE FINANCE"]
-            
-            df_resources = df_filtered[df_filtered["LCR_ECO_GROUPE_METIERS"].isin(allowed_groupes_res)].copy()
-            df_resources = df_resources[~df_resources["Sous-Métier"].isin(excluded_sous_metier_res)].copy()
-            
-            if len(df_resources) > 0:
-                for groupe in allowed_groupes_res:
-                    groupe_data = df_resources[df_resources["LCR_ECO_GROUPE_METIERS"] == groupe]
-                    
-                    if len(groupe_data) > 0:
-                        row_data = {
-                            "lcr_eco_groupe_metiers": groupe,
-                            "dates": {}
-                        }
-                        
-                        for date in dates:
-                            date_data = groupe_data[groupe_data["Date d'arrêté"] == date]
-                            total = float(date_data["LCR_ECO_IMPACT_LCR"].sum()) / 1_000_000_000
-                            row_data["dates"][date] = total
-                        
-                        resources_data.append(row_data)
-            
-            consumption_resources_results[file_type] = {
-                "consumption_data": consumption_data,
-                "resources_data": resources_data,
-                "dates": dates
-            }
-            
-            logger.info(f"✅ CONSUMPTION & RESOURCES {file_type}: Consumption={len(consumption_data)} lignes, Resources={len(resources_data)} lignes, {len(dates)} dates")
-        
-        return {
-            "title": "CONSUMPTION & RESOURCES",
-            "data": consumption_resources_results,
-            "metadata": {
-                "analysis_date": datetime.now().isoformat(),
-                "filters_applied": {
-                    "top_conso": "O",
-                    "consumption_filters": {
-                        "groupe_metiers": allowed_groupes_cons,
-                        "excluded_sous_metier": excluded_sous_metier_cons
-                    },
-                    "resources_filters": {
-                        "groupe_metiers": allowed_groupes_res,
-                        "excluded_sous_metier": excluded_sous_metier_res
-                    }
-                }
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur création tableaux CONSUMPTION & RESOURCES: {e}")
-        return {
-            "title": "CONSUMPTION & RESOURCES - Erreur",
-            "error": str(e)
-        }
-
-
-# ========================== FONCTIONS TOTAUX LCR_Assiette Pondérée ===========================
-
-
-def create_simple_totals_table(dataframes):
-    """
-    Crée un tableau simple avec juste les totaux LCR_Assiette Pondérée par fichier
-    Pas de filtre, pas de ligne - juste 3 colonnes avec les totaux
-    """
-    try:
-        logger.info("📊 Création du tableau des totaux simples")
-        
-        totals_results = {}
-        
-        for file_type, df in dataframes.items():
-            logger.info(f"📄 Calcul total pour {file_type}")
-            
-            # Vérification colonne requise
-            if "LCR_Assiette Pondérée" not in df.columns:
-                logger.warning(f"⚠️ Colonne LCR_Assiette Pondérée manquante pour {file_type}")
-                continue
-            
-            # Conversion en numérique
-            df_copy = df.copy()
-            df_copy["LCR_Assiette Pondérée"] = pd.to_numeric(
-                df_copy["LCR_Assiette Pondérée"], errors='coerce'
-            ).fillna(0)
-            
-            # Calcul du total (en milliards)
-            total = float(df_copy["LCR_Assiette Pondérée"].sum()) / 1_000_000_000
-            
-            totals_results[file_type] = total
-            logger.info(f"✅ Total {file_type}: {total:.3f} Bn €")
-        
-        return {
-            "title": "Global LCR Totals",
-            "data": totals_results,
-            "metadata": {
-                "analysis_date": datetime.now().isoformat(),
-                "unit": "Bn €",
-                "note": "No filters applied - raw totals from uploaded files"
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur création tableau totaux: {e}")
-        return {
-            "title": "Global LCR Totals - Error",
-            "error": str(e)
-        }
-
-def create_si_remettant_bar(dataframes):
-    """
-    Crée les données pour le graphique en barre horizontale des SI Remettant
-    Filtre: SI Remettant IN ('AJUST AJUSTGAP', 'AJUST SUMMIT', 'AJUST SUMMIT_TITRES')
-    """
-    try:
-        logger.info("📊 Création des données SI Remettant Bar")
-        
-        si_results = {}
-        
-        for file_type, df in dataframes.items():
-            logger.info(f"📄 Traitement SI Remettant pour {file_type}")
-            
-            if "SI Remettant" not in df.columns or "LCR_Assiette Pondérée" not in df.columns:
-                logger.warning(f"⚠️ Colonnes manquantes pour {file_type}")
-                continue
-            
-            # Filtrage
-            df_filtered = df[df["Top Conso"] == "O"].copy()
-            allowed_si = ['AJUST AJUSTGAP', 'AJUST SUMMIT', 'AJUST SUMMIT_TITRES']
-            df_filtered = df_filtered[df_filtered["SI Remettant"].isin(allowed_si)].copy()
-            
-            logger.info(f"📋 Après filtrage SI Remettant: {len(df_filtered)} lignes")
-            
-            if len(df_filtered) == 0:
-                continue
-            
-            # Conversion numérique
-            df_filtered["LCR_Assiette Pondérée"] = pd.to_numeric(
-                df_filtered["LCR_Assiette Pondérée"], errors='coerce'
-            ).fillna(0)
-            
-            # Grouper par SI Remettant
-            grouped = df_filtered.groupby("SI Remettant")["LCR_Assiette Pondérée"].sum().reset_index()
-            grouped["LCR_Assiette_Bn"] = (grouped["LCR_Assiette Pondérée"] / 1_000_000_000).round(3)
-            
-            si_results[file_type] = [
-                {
-                    "si_remettant": str(row["SI Remettant"]),
-                    "value": float(row["LCR_Assiette_Bn"])
-                }
-                for _, row in grouped.iterrows()
-            ]
-            
-            logger.info(f"✅ SI Remettant {file_type}: {len(grouped)} valeurs")
-        
-        return {
-            "title": "SI Remettant Distribution",
-            "data": si_results,
-            "metadata": {
-                "analysis_date": datetime.now().isoformat(),
-                "allowed_values": allowed_si,
-                "unit": "Bn €"
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur création SI Remettant bar: {e}")
-        return {
-            "title": "SI Remettant Distribution - Error",
-            "error": str(e)
-        }
-    
-
 # ========================== FONCTIONS CONTEXTE CHATBOT ===========================
 
 
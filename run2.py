@@ -8,18 +8,20 @@ Application FastAPI utilisant un système de templates Jinja2
 pour séparer la logique métier de la présentation.
 """
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Cookie
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Cookie, Query
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-import pandas as pd
 import uvicorn
 import logging
 from pathlib import Path
 from datetime import datetime
 import io
-import chardet
+import time
+import asyncio
+from functools import partial
 from typing import Optional
 import psutil
 import os
@@ -29,11 +31,50 @@ import secrets
 from llm_connector import LLMConnector
 from report_generator import ReportGenerator
 from sharepoint_connector import SharePointClient
-from data_persistence import init_database, save_table_result, get_historical_data
+from data_persistence import (init_database, save_table_results, get_historical_data, close_database, get_series,
+                              get_table_series, HISTORY_FACT_LAYOUTS, GROUP_TOTAL)
+from file_ingestion import align_categories, arrete_date
+from compute_backend import set_compute_backend
+from lcr_tables import (build_cubes, create_buffer_table, create_summary_table, create_consumption_table,
+                        create_resources_table, create_cappage_table, create_buffer_nco_table,
+                        create_consumption_resources_table, create_simple_totals_table, create_si_remettant_bar,
+                        create_variations_table, create_generic_table, GENERIC_TABLES, table_dependencies,
+                        CLIENT_TOP_N, CLIENT_RANKINGS, DRILLDOWN_TABLES, prune_client_table, prune_client_tables,
+                        drilldown_clients, others_detail, shutdown_analysis_executor)
+from ingestion_executor import submit_ingestion, fetch_and_ingest, get_job_status, shutdown_ingestion_executor
+from sharepoint_index import SharePointListingIndex
+from sharepoint_mirror import SharePointMirror, MirroredSharePointClient
+from local_sharepoint import LocalSharePointClient
+from prefetch_scheduler import PrefetchScheduler
+from analysis_cache import analysis_etag, analysis_key, get_cached_analysis, store_analysis
+from analysis_jobs import submit_analysis, stream_job_events, shutdown_analysis_jobs
+from analysis_jobs import get_job_status as get_analysis_job_status
+from wire_format import FastJSONResponse, StreamAwareGZipMiddleware, dumps, encode_compact
 
 # Initialiser le connecteur LLM
 llm_connector = LLMConnector()
 
+# Moteur d'agrégation des cubes d'analyse : "pandas" (référence) ou "polars"
+ANALYSIS_BACKEND = "pandas"
+set_compute_backend(ANALYSIS_BACKEND)
+
+# Racine locale remplaçant SharePoint (tests / benchmarks hors ligne), None en production
+SHAREPOINT_LOCAL_ROOT = None
+
+# Miroir disque des fichiers sources déjà téléchargés
+sharepoint_mirror = SharePointMirror()
+
+def get_sharepoint_client():
+    """Client SharePoint (ou son remplaçant local) lisant à travers le miroir"""
+    if SHAREPOINT_LOCAL_ROOT:
+        client = LocalSharePointClient(SHAREPOINT_LOCAL_ROOT)
+    else:
+        client = SharePointClient()
+    return MirroredSharePointClient(client, sharepoint_mirror)
+
+# Index du dossier SharePoint des fichiers sources
+sharepoint_index = SharePointListingIndex(get_sharepoint_client)
+
 # Formats supportés
 SUPPORTED_EXTENSIONS = ['.xlsx', '.xls', '.xlsm', '.xlsb', '.csv', '.tsv', '.txt']
 
@@ -57,16 +98,28 @@ required_dirs = ["data", "templates", "static", "static/js", "static/css", "stat
 for directory in required_dirs:
     Path(directory).mkdir(exist_ok=True)
 
-required_cols = ["Top Conso", "LCR_Catégorie", "LCR_Template Section 1", "Libellé Client", 
-                "LCR_Assiette Pondérée", "LCR_ECO_GROUPE_METIERS", "Sous-Métier", "Produit", 
-                "LCR_ECO_IMPACT_LCR", "SI Remettant", "Commentaire", "Date d'arrêté"]
-
 # Création de l'application FastAPI
 app = FastAPI(title="Steering ALM Metrics", version="2.0.0")
 
 # Initialiser la base de données historique
 init_database()
 
+
+@app.on_event("startup")
+async def start_prefetch():
+    """Démarre le préchargement planifié des fichiers du jour"""
+    prefetch_scheduler.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_executors():
+    """Arrête le préchargement, les pools d'ingestion et d'analyse, les jobs d'analyse et l'historique"""
+    await prefetch_scheduler.stop()
+    shutdown_ingestion_executor()
+    shutdown_analysis_executor()
+    shutdown_analysis_jobs()
+    close_database()
+
 # Configuration CORS
 app.add_middleware(
     CORSMiddleware,
@@ -76,6 +129,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compression gzip des réponses (résultats d'analyse), sauf flux SSE / NDJSON
+app.add_middleware(StreamAwareGZipMiddleware)
+
 # Configuration des fichiers statiques et templates
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
@@ -94,71 +150,6 @@ def get_current_user_from_session(session_token: Optional[str] = Cookie(None)):
         return None
     return active_sessions[session_token]
 
-def convert_file_content_to_dataframe(file_content: bytes, filename: str):
-    """
-    Convertit le contenu d'un fichier directement en DataFrame
-    Sans écriture sur disque
-    """
-    try:
-        extension = Path(filename).suffix.lower()
-        
-        # Excel - lecture directe depuis bytes
-        if extension in ['.xlsx', '.xls', '.xlsm', '.xlsb']:
-            df = pd.read_excel(io.BytesIO(file_content), engine='openpyxl')
-            df.columns = df.columns.astype(str).str.strip()
-            return df, {'format': extension, 'method': 'direct_excel'}
-        
-        # CSV/TSV/TXT - traitement en mémoire
-        elif extension in ['.csv', '.tsv', '.txt']:
-            # Détecter l'encodage
-            encoding = chardet.detect(file_content[:10000])['encoding'] or 'utf-8'
-            
-            # Décoder en string
-            text_content = file_content.decode(encoding)
-            
-            # Détecter le délimiteur
-            if extension == '.tsv':
-                delimiter = '\t'
-            else:
-                first_line = text_content.split('\n')[0]
-                if ';' in first_line:
-                    delimiter = ';'
-                elif '\t' in first_line:
-                    delimiter = '\t'
-                else:
-                    delimiter = ','
-            
-            # Lire directement depuis StringIO (en mémoire)
-            df = pd.read_csv(
-                io.StringIO(text_content),
-                delimiter=delimiter,
-                low_memory=False,
-                dtype=str,
-                na_filter=False
-            )
-            
-            # Nettoyer les colonnes
-            df.columns = df.columns.astype(str).str.strip()
-            
-            # Convertir les colonnes numériques
-            numeric_columns = ['Nominal Value', 'LCR_ECO_IMPACT_LCR']
-            for col in numeric_columns:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col].str.replace(',', '.'), errors='coerce')
-            
-            return df, {
-                'format': extension, 
-                'encoding': encoding, 
-                'delimiter': delimiter,
-                'method': 'memory_csv'
-            }
-        
-        else:
-            raise ValueError(f"Format non supporté: {extension}")
-            
-    except Exception as e:
-        raise ValueError(f"Erreur lecture fichier: {str(e)}")
-
 def cleanup_session_memory():
     """Nettoie la mémoire des DataFrames de session"""
     try:
@@ -170,6 +161,7 @@ def cleanup_session_memory():
         
         # Nettoyage complet
         file_session["files"].clear()
+        file_session.pop("analysis", None)
         
         import gc
         gc.collect()
@@ -182,6 +174,331 @@ def cleanup_session_memory():
     except Exception as e:
         logger.warning(f"Erreur nettoyage mémoire: {e}")
 
+def store_session_file(file_type: str, filename: str, df_minimal, file_info: dict):
+    """Enregistre un DataFrame minimal en session et aligne les catégories"""
+    file_session.pop("analysis", None)  # tableaux calculés sur l'ancien fichier
+    file_session["files"][file_type] = {
+        "dataframe": df_minimal,  # DataFrame optimisé
+        "original_name": filename,
+        "file_format": file_info['format'],
+        "encoding": file_info.get('encoding'),
+        "delimiter": file_info.get('delimiter'),
+        "rows": len(df_minimal),
+        "columns": len(df_minimal.columns),
+        "upload_time": datetime.now().isoformat(),
+        "file_hash": file_info.get('file_hash'),
+    }
+
+    # Catégories communes entre j, jMinus1 et mMinus1
+    align_categories([info["dataframe"] for info in file_session["files"].values()])
+
+
+# Tableaux d'analyse, dans l'ordre de calcul (et d'envoi au navigateur)
+ANALYSIS_TABLES = {
+    "simple_totals": create_simple_totals_table,
+    "si_remettant": create_si_remettant_bar,
+    "buffer": create_buffer_table,
+    "summary": create_summary_table,
+    "consumption": create_consumption_table,
+    "resources": create_resources_table,
+    "cappage": create_cappage_table,
+    "buffer_nco": create_buffer_nco_table,
+    "consumption_resources": create_consumption_resources_table,
+    "variations": create_variations_table,
+}
+
+
+def analysis_table_names():
+    return list(ANALYSIS_TABLES) + GENERIC_TABLES
+
+
+def parse_table_selection(tables: Optional[str]):
+    """
+    Noms des tableaux demandés ("cappage,buffer_nco"), dans l'ordre de calcul,
+    tous si tables est vide. Lève HTTPException 400 pour un nom inconnu.
+    """
+    all_names = analysis_table_names()
+    if not tables:
+        return all_names
+
+    requested = {name.strip() for name in tables.split(",") if name.strip()}
+    unknown = sorted(requested.difference(all_names))
+    if unknown:
+        raise HTTPException(status_code=400,
+                            detail=f"Tableaux inconnus: {', '.join(unknown)} (disponibles: {', '.join(all_names)})")
+    return [name for name in all_names if name in requested]
+
+
+# Formats de réponse de l'analyse : JSON standard ou compact en colonnes (wire_format)
+RESPONSE_FORMATS = ("json", "compact")
+
+
+def check_response_format(response_format: Optional[str]) -> str:
+    response_format = response_format or "json"
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400,
+                            detail=f"Format inconnu: {response_format} (disponibles: {', '.join(RESPONSE_FORMATS)})")
+    return response_format
+
+
+# Taille maximale d'une page de /api/drilldown
+DRILLDOWN_MAX_LIMIT = 500
+
+
+def check_client_pruning(top_n: int, rank_by: str):
+    """Paramètres d'élagage des clients (top_n = 0 : tous les clients) ; HTTPException 400 si invalides"""
+    if top_n < 0:
+        raise HTTPException(status_code=400, detail="top_n doit être positif ou nul")
+    if rank_by not in CLIENT_RANKINGS:
+        raise HTTPException(status_code=400,
+                            detail=f"Classement inconnu: {rank_by} (disponibles: {', '.join(CLIENT_RANKINGS)})")
+
+
+def iter_analysis_tables(dataframes, file_hashes=None, names=None):
+    """
+    Calcule les neuf tableaux d'analyse (plus les tableaux génériques de
+    TABLE_SPECS) sur les DataFrames j, jMinus1, mMinus1 et les produit un à
+    un : (nom, tableau)
+    file_hashes: {file_type: SHA-256}, pour reprendre les cubes déjà calculés
+    names: tableaux à calculer (tous par défaut), seuls leurs agrégats sont évalués
+    """
+    names = analysis_table_names() if names is None else names
+    # Un seul passage d'agrégation par fichier, les tableaux sont découpés dans le cube
+    cubes = build_cubes(dataframes, file_hashes=file_hashes, spec_names=table_dependencies(names))
+    for name, create_table in ANALYSIS_TABLES.items():
+        if name in names:
+            yield name, create_table(cubes)
+    for name in GENERIC_TABLES:
+        if name in names:
+            yield name, create_generic_table(cubes, name)
+
+
+def run_full_analysis(dataframes, file_hashes=None):
+    """Exécute tous les tableaux d'analyse : {nom: tableau}"""
+    return dict(iter_analysis_tables(dataframes, file_hashes))
+
+def save_analysis_history(df_j, results):
+    """Sauvegarde dans l'historique les 5 tableaux suivis, à la date d'arrêté du fichier J"""
+    try:
+        # Date d'arrêté du fichier J (la plus récente, AAAA-MM-JJ)
+        analysis_date = arrete_date(df_j)
+        
+        if analysis_date:
+            buffer_nco_results = results["buffer_nco"]
+            consumption_resources_results = results["consumption_resources"]
+            
+            # Sauvegarder uniquement les 5 tableaux concernés (une seule transaction)
+            save_table_results(analysis_date, {
+                "cappage": results["cappage"],
+                "buffer_nco_buffer": buffer_nco_results.get("data", {}).get("j", {}).get("buffer_pivot_data", []),
+                "buffer_nco_nco": buffer_nco_results.get("data", {}).get("j", {}).get("nco_pivot_data", []),
+                "consumption_resources_consumption":
+                    consumption_resources_results.get("data", {}).get("j", {}).get("consumption_data", []),
+                "consumption_resources_resources":
+                    consumption_resources_results.get("data", {}).get("j", {}).get("resources_data", []),
+            })
+            
+            logger.info(f"✅ Historique sauvegardé pour {analysis_date}")
+        else:
+            logger.warning("⚠️ Impossible de trouver la date d'arrêté")
+            
+    except Exception as e:
+        logger.warning(f"⚠️ Erreur sauvegarde historique: {e}")
+
+def analyze_and_save(dataframes, file_hashes=None):
+    """Analyse complète + historique (utilisé par le préchargement planifié)"""
+    results = run_full_analysis(dataframes, file_hashes=file_hashes)
+    save_analysis_history(dataframes["j"], results)
+    return results
+
+def session_analysis_inputs():
+    """
+    DataFrames et empreintes des trois fichiers de session
+    Lève HTTPException 400 si un fichier manque
+    """
+    # Vérification de la présence des TROIS fichiers
+    if len(file_session.get("files", {})) < 3:
+        raise HTTPException(status_code=400, detail="Les trois fichiers sont requis")
+
+    if "j" not in file_session["files"] or "jMinus1" not in file_session["files"] or "mMinus1" not in file_session["files"]:
+        raise HTTPException(status_code=400, detail="Fichiers manquants")
+
+    # Récupérer les DataFrames directement depuis la session
+    dataframes = {}
+    for file_type, file_info in file_session["files"].items():
+        df = file_info["dataframe"]
+        dataframes[file_type] = df
+        logger.info(f"{file_type}: {len(df)} lignes (depuis mémoire)")
+
+    file_hashes = {file_type: info.get("file_hash") for file_type, info in file_session["files"].items()}
+    return dataframes, file_hashes
+
+
+def session_analysis_current(file_hashes):
+    """Les fichiers de session sont-ils toujours ceux de file_hashes (même clé d'analyse) ?"""
+    session_hashes = {file_type: info.get("file_hash") for file_type, info in file_session.get("files", {}).items()}
+    return analysis_key(file_hashes) == analysis_key(session_hashes)
+
+
+def session_analysis_tables(file_hashes):
+    """
+    Tableaux déjà calculés pour les fichiers de session : {nom: tableau}.
+    Vidé quand un fichier change (store_session_file, nettoyage mémoire) ;
+    un dictionnaire détaché (non conservé) si file_hashes ne sont plus ceux
+    de la session.
+    """
+    if not session_analysis_current(file_hashes):
+        return {}
+    key = analysis_key(file_hashes)
+    session_analysis = file_session.get("analysis")
+    if session_analysis is None or session_analysis["key"] != key:
+        session_analysis = file_session["analysis"] = {"key": key, "tables": {}}
+    return session_analysis["tables"]
+
+
+def publish_analysis(dataframes, results, save_history: bool):
+    """Contexte du chatbot et historique (nouvelles analyses complètes seulement)"""
+    # SAUVEGARDER LE CONTEXTE CHATBOT (échantillons de lignes ajoutés au premier usage, chatbot_sample_data)
+    chatbot_session["context_data"] = {
+        **results,
+        "analysis_timestamp": datetime.now().isoformat(),
+        "raw_dataframes_info": {
+            file_type: {
+                "shape": [len(df), len(df.columns)],
+                "columns": df.columns.tolist(),
+                "file_info": file_session["files"][file_type]
+            }
+            for file_type, df in dataframes.items()
+        }
+    }
+
+    # ========= SAUVEGARDE HISTORIQUE =========
+    if save_history:  # sinon déjà sauvegardé (analyse précédente ou préchargement)
+        save_analysis_history(dataframes["j"], results)
+    # =========================================
+
+
+def chatbot_sample_data(raw_dataframes_info):
+    """
+    Complète raw_dataframes_info du contexte chatbot avec les 3 premières
+    lignes de chaque fichier, à la première utilisation du chatbot plutôt
+    qu'à chaque analyse
+    """
+    for info in raw_dataframes_info.values():
+        if "sample_data" not in info:
+            df = info["file_info"].get("dataframe")
+            info["sample_data"] = df.head(3).to_dict('records') if df is not None and len(df) > 0 else []
+    return raw_dataframes_info
+
+
+def iter_session_tables(dataframes, file_hashes, names, cached=None):
+    """
+    Tableaux demandés, dans l'ordre de calcul : (nom, tableau).
+    Repris de l'analyse en cache (cached) ou des tableaux de session ; seuls
+    les manquants sont calculés (cubes et agrégats repris pour les fichiers
+    inchangés) et conservés en session.
+    """
+    if cached is not None:
+        for name in names:
+            yield name, cached["results"][name]
+        return
+
+    session_tables = session_analysis_tables(file_hashes)
+    missing = [name for name in names if name not in session_tables]
+    computed = iter_analysis_tables(dataframes, file_hashes, missing)
+    for name in names:
+        if name not in session_tables:
+            session_tables.update([next(computed)])
+        yield name, session_tables[name]
+
+    if missing:
+        logger.info(f"Analyses terminées (nouveaux tableaux: {', '.join(missing)})")
+
+
+def finish_session_analysis(dataframes, file_hashes, cached=None):
+    """
+    Après iter_session_tables : dès que tous les tableaux sont disponibles,
+    l'analyse complète est conservée (analysis_cache) et historisée ; le
+    contexte du chatbot reprend tous les tableaux calculés. Rien n'est
+    conservé ni publié si les fichiers de session ont changé entre-temps.
+    Retourne l'entrée du cache d'analyse, ou None si l'analyse est partielle.
+    """
+    if not session_analysis_current(file_hashes):
+        logger.warning("⚠️ Fichiers de session modifiés pendant l'analyse : résultats non publiés")
+        return cached
+
+    new_analysis = False
+    if cached is None:
+        session_tables = session_analysis_tables(file_hashes)
+        all_names = analysis_table_names()
+        if all(name in session_tables for name in all_names):
+            cached = store_analysis(file_hashes, {name: session_tables[name] for name in all_names}, "analyze")
+            new_analysis = True
+
+    publish_analysis(dataframes, cached["results"] if cached else dict(session_analysis_tables(file_hashes)),
+                     new_analysis)
+    return cached
+
+
+def drilldown_section(dataframes, file_hashes, table, section, file_type, rank_by):
+    """Détails clients classés d'une section (voir drilldown_clients), sur les cubes des fichiers de session"""
+    cubes = build_cubes(dataframes, file_hashes=file_hashes, spec_names=table_dependencies([table]))
+    return drilldown_clients(cubes, table, section, file_type, rank_by)
+
+
+def analysis_response_etag(file_hashes, names, top_n: int, rank_by: str, response_format: str):
+    """ETag d'une réponse d'analyse : fichiers, sélection de tableaux, élagage des clients et format"""
+    key = analysis_key(file_hashes)
+    if key is None:
+        return None
+    if len(names) < len(analysis_table_names()):
+        key += tuple(names)
+    if top_n:
+        key += ("top", str(top_n), rank_by)
+    if response_format == "compact":
+        key += ("compact",)
+    return analysis_etag(key)
+
+
+def iter_ndjson_analysis(dataframes, file_hashes, names, response_format, top_n, rank_by):
+    """
+    Enregistrements NDJSON de l'analyse (une ligne JSON chacun) : started,
+    un enregistrement table par tableau dès qu'il est calculé, dans l'ordre
+    de calcul, puis done (ou failed)
+    """
+    def record(payload):
+        return dumps(payload) + b"\n"
+
+    yield record({"type": "started", "tables": names})
+    try:
+        cached = get_cached_analysis(file_hashes)
+        for name, table in iter_session_tables(dataframes, file_hashes, names, cached):
+            if top_n:
+                table = prune_client_table(name, table, top_n, rank_by)
+            yield record({
+                "type": "table",
+                "name": name,
+                "table": encode_compact(table) if response_format == "compact" else table
+            })
+
+        finish_session_analysis(dataframes, file_hashes, cached)
+        yield record({
+            "type": "done",
+            "success": True,
+            "context_ready": True,
+            "cached": cached is not None,
+            "prefetched": bool(cached and cached["source"] == "prefetch"),
+            "etag": analysis_response_etag(file_hashes, names, top_n, rank_by, response_format)
+        })
+
+    except Exception as e:
+        logger.error(f"Erreur analyse (flux NDJSON): {e}")
+        yield record({"type": "failed", "error": str(e)})
+
+
+# Préchargement planifié de la dernière date complète
+prefetch_scheduler = PrefetchScheduler(sharepoint_index, get_sharepoint_client, analyze_and_save)
+
 
 # ========================== ENDPOINTS EXPORT ===========================  
 
@@ -342,6 +659,32 @@ async def logout(request: Request):
 # =========================== ENDPOINTS FICHIERS ===========================
 
 
+def on_upload_ingested(job: dict, df_minimal, file_info: dict) -> dict:
+    """Callback de fin d'ingestion : stockage en session, retourne le résultat du job"""
+    logger.info(f"Fichier traité: {file_info}")
+    logger.info(f"DataFrame optimisé: {df_minimal.memory_usage(deep=True).sum() / 1024 / 1024:.1f} MB")
+    logger.info(f"Shape finale: {df_minimal.shape}")
+
+    store_session_file(job["file_type"], job["filename"], df_minimal, file_info)
+
+    process = psutil.Process(os.getpid())
+    logger.info(f"Mémoire après upload {job['file_type']}: {process.memory_info().rss / 1024 / 1024:.1f} MB")
+
+    return {
+        "success": True,
+        "message": f"Fichier {job['file_type']} traité en mémoire ({file_info['format']})",
+        "filename": job["filename"],
+        "format": file_info['format'],
+        "encoding": file_info.get('encoding'),
+        "delimiter": file_info.get('delimiter'),
+        "rows": file_info['original_rows'],
+        "columns": file_info['original_columns'],
+        "file_size": job["file_size"],
+        "processing": file_info['method'],
+        "cache": file_info.get('cache')
+    }
+
+
 @app.post("/api/upload")
 async def upload_file(file: UploadFile = File(...), 
                      file_type: str = Form(...),
@@ -352,11 +695,6 @@ async def upload_file(file: UploadFile = File(...),
     
     log_activity(current_user["username"], "FILE_UPLOAD", f"Uploaded {file.filename} as {file_type}")
     try:
-        # MONITORING INITIAL
-        process = psutil.Process(os.getpid())
-        memory_start = process.memory_info().rss / 1024 / 1024
-        logger.info(f"Mémoire avant upload {file_type}: {memory_start:.1f} MB")
-
         logger.info(f"Upload reçu: {file.filename}, type: {file_type}")
         
         # Validation du fichier
@@ -371,72 +709,17 @@ async def upload_file(file: UploadFile = File(...),
                 detail=f"Format non supporté: {file_extension}"
             )
 
-        # Lire le contenu en mémoire
-        contents = await file.read()
-        file_size = len(contents)
-        
-        # TRAITEMENT DIRECT EN MÉMOIRE
-        try:
-            df, file_info = convert_file_content_to_dataframe(contents, file.filename)
-            logger.info(f"Fichier traité en mémoire: {file_info}")
-            
-        except Exception as e:
-            del contents
-            raise HTTPException(status_code=422, detail=f"Erreur lecture: {str(e)}")
-        
-        # Sauvegarder les infos AVANT filtrage
-        original_rows = len(df)
-        original_columns = len(df.columns)
-
-        # Filtrer seulement les lignes nécessaires
-        df_filtered = df[df["Top Conso"] == "O"].copy() if "Top Conso" in df.columns else df.copy()
-
-        # OPTIMISATION MÉMOIRE - Ne garder que les colonnes utiles
-        available_cols = [col for col in required_cols if col in df_filtered.columns]
-        df_minimal = df_filtered[available_cols].copy()
-
-        # Optimiser les types de données
-        for col in df_minimal.select_dtypes(include=['float64']):
-            df_minimal[col] = pd.to_numeric(df_minimal[col], downcast='float')
-
-        # LIBÉRATION MÉMOIRE IMMÉDIATE
-        del df_filtered
-        del df
-        del contents
-        import gc
-        gc.collect()
-
-        # Diagnostic mémoire
-        logger.info(f"DataFrame optimisé: {df_minimal.memory_usage(deep=True).sum() / 1024 / 1024:.1f} MB")
-        logger.info(f"Shape finale: {df_minimal.shape}")
-
-        # Stocker le DataFrame optimisé
-        file_session["files"][file_type] = {
-            "dataframe": df_minimal,  # DataFrame optimisé
-            "original_name": file.filename,
-            "file_format": file_info['format'],
-            "encoding": file_info.get('encoding'),
-            "delimiter": file_info.get('delimiter'),
-            "rows": len(df_minimal),
-            "columns": len(df_minimal.columns),
-            "upload_time": datetime.now().isoformat(),
-        }
-
-        # MONITORING FINAL
-        memory_end = process.memory_info().rss / 1024 / 1024
-        logger.info(f"Mémoire après upload {file_type}: {memory_end:.1f} MB (diff: +{memory_end-memory_start:.1f} MB)")
+        # Le parsing (filtrage Top Conso + projection, ou cache) tourne dans le
+        # pool d'ingestion ; l'avancement est suivi via /api/ingest-status
+        job = await submit_ingestion(file.file, file.filename, file_type, on_upload_ingested)
         
         return {
             "success": True,
-            "message": f"Fichier {file_type} traité en mémoire ({file_info['format']})",
+            "job_id": job["job_id"],
+            "status": job["status"],
             "filename": file.filename,
-            "format": file_info['format'],
-            "encoding": file_info.get('encoding'),
-            "delimiter": file_info.get('delimiter'),
-            "rows": original_rows,
-            "columns": original_columns,
-            "file_size": file_size,
-            "processing": "in_memory_optimized"
+            "file_size": job["file_size"],
+            "message": f"Fichier {file_type} en cours de traitement"
         }
         
     except HTTPException:
@@ -444,7 +727,19 @@ async def upload_file(file: UploadFile = File(...),
     except Exception as e:
         logger.error(f"Erreur upload: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
-    
+
+
+@app.get("/api/ingest-status/{job_id}")
+async def ingest_status(job_id: str, session_token: Optional[str] = Cookie(None)):
+    current_user = get_current_user_from_session(session_token)
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    status = get_job_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job inconnu")
+    return status
+
 @app.post("/api/load-files-by-date")
 async def load_files_by_date(request: Request, session_token: Optional[str] = Cookie(None)):
     current_user = get_current_user_from_session(session_token)
@@ -461,110 +756,53 @@ async def load_files_by_date(request: Request, session_token: Optional[str] = Co
         log_activity(current_user["username"], "FILE_LOAD_DATE", f"Loading files for date {selected_date}")
         
         # Conversion de la date sélectionnée
-        from datetime import datetime, timedelta
         date_obj = datetime.strptime(selected_date, "%Y-%m-%d")
         
-        # Calcul des dates pour les fichiers
-        j_minus_1_date = date_obj  # Le fichier J-1 porte la date sélectionnée
-        j_date = date_obj + timedelta(days=1)  # Le fichier J porte la date+1
-        
-        # NOUVEAU : Calcul de la date M-1 (même jour du mois précédent)
-        # Si on est le 15/09, M-1 sera le 15/08
-        if date_obj.month == 1:
-            m_minus_1_date = date_obj.replace(year=date_obj.year - 1, month=12)
-        else:
-            # Gérer les cas où le jour n'existe pas dans le mois précédent (ex: 31/03 -> 28/02)
-            try:
-                m_minus_1_date = date_obj.replace(month=date_obj.month - 1)
-            except ValueError:
-                # Si le jour n'existe pas dans le mois précédent, prendre le dernier jour du mois
-                import calendar
-                target_month = date_obj.month - 1 if date_obj.month > 1 else 12
-                target_year = date_obj.year if date_obj.month > 1 else date_obj.year - 1
-                last_day = calendar.monthrange(target_year, target_month)[1]
-                m_minus_1_date = date_obj.replace(year=target_year, month=target_month, day=last_day)
-
-        # Format des noms de fichiers
-        j_minus_1_date_str = j_minus_1_date.strftime("%Y%m%d")
-        j_date_str = j_date.strftime("%Y%m%d")
-        m_minus_1_date_str = m_minus_1_date.strftime("%Y%m%d")
-        
-        # Connexion SharePoint
-        sharepoint_client = SharePointClient()
-        base_path = "ALM_Metrics/sources"
-        
-        # Lister tous les fichiers du dossier
-        all_files = sharepoint_client.list_files_in_path(base_path)
-        
-        # Rechercher les fichiers correspondants
-        j_file = None
-        j_minus_1_file = None
-        m_minus_1_file = None
-
-        for filename in all_files:
-            if filename.startswith(f"D_PA_{j_minus_1_date_str}") and filename.endswith('.csv'):
-                j_minus_1_file = filename
-            elif filename.startswith(f"D_PA_{j_date_str}") and filename.endswith('.csv'):
-                j_file = filename
-            elif filename.startswith(f"M_PA_{m_minus_1_date_str}") and filename.endswith('.csv'):
-                m_minus_1_file = filename
-        
-        if not j_file or not j_minus_1_file or not m_minus_1_file:
-            missing = []
-            if not j_minus_1_file:
-                missing.append(f"D_PA_{j_minus_1_date_str}xxxx.csv (for J-1 data)")
-            if not j_file:
-                missing.append(f"D_PA_{j_date_str}xxxx.csv (for J data)")
-            if not m_minus_1_file:
-                missing.append(f"M_PA_{m_minus_1_date_str}xxxx.csv (for M-1 data)")
+        # Résolution J / J-1 / M-1 par l'index du dossier SharePoint
+        files, missing = await asyncio.get_running_loop().run_in_executor(
+            None, sharepoint_index.resolve_analysis_files, date_obj)
+        if missing:
             raise HTTPException(status_code=404, detail=f"Files not found: {', '.join(missing)}")
         
-        # Charger les TROIS fichiers
+        j_file = files["j"]
+        j_minus_1_file = files["jMinus1"]
+        m_minus_1_file = files["mMinus1"]
+        sharepoint_client = get_sharepoint_client()
+        base_path = sharepoint_index.base_path
+        
+        # Charger les TROIS fichiers en parallèle (téléchargement + parsing)
+        started = time.perf_counter()
+        file_types = [("j", j_file), ("jMinus1", j_minus_1_file), ("mMinus1", m_minus_1_file)]
+        loaded = await asyncio.gather(*[
+            fetch_and_ingest(partial(sharepoint_client.read_binary_file, f"{base_path}/{filename}"), filename)
+            for _, filename in file_types
+        ])
+        elapsed = time.perf_counter() - started
+        
+        # Stocker en session une fois les trois fichiers chargés
         results = {}
-        for file_type, filename in [("j", j_file), ("jMinus1", j_minus_1_file), ("mMinus1", m_minus_1_file)]:
-            file_path = f"{base_path}/{filename}"
-            
-            # Lire le fichier depuis SharePoint
-            binary_content = sharepoint_client.read_binary_file(file_path)
-            
-            # Convertir en DataFrame
-            df, file_info = convert_file_content_to_dataframe(binary_content, filename)
-            
-            # Filtrer et optimiser comme dans l'ancien upload
-            original_rows = len(df)
-            df_filtered = df[df["Top Conso"] == "O"].copy() if "Top Conso" in df.columns else df.copy()
-            
-            available_cols = [col for col in required_cols if col in df_filtered.columns]
-            df_minimal = df_filtered[available_cols].copy()
-            
-            # Optimiser les types
-            for col in df_minimal.select_dtypes(include=['float64']):
-                df_minimal[col] = pd.to_numeric(df_minimal[col], downcast='float')
-            
-            # Stocker en session
-            file_session["files"][file_type] = {
-                "dataframe": df_minimal,
-                "original_name": filename,
-                "file_format": file_info['format'],
-                "rows": len(df_minimal),
-                "columns": len(df_minimal.columns),
-                "upload_time": datetime.now().isoformat(),
-            }
+        for (file_type, filename), (df_minimal, file_info, timings) in zip(file_types, loaded):
+            store_session_file(file_type, filename, df_minimal, file_info)
             
             results[file_type] = {
                 "filename": filename,
-                "rows": original_rows,
-                "columns": len(df.columns),
-                "filtered_rows": len(df_minimal)
+                "rows": file_info['original_rows'],
+                "columns": file_info['original_columns'],
+                "filtered_rows": len(df_minimal),
+                "cache": file_info.get('cache'),
+                "timings": timings
             }
         
+        logger.info(f"Fichiers du {selected_date} chargés en {elapsed:.2f}s")
+        
         return {
             "success": True,
             "message": f"Files loaded for {selected_date}",
             "files": results,
             "j_file": j_file,
             "j_minus_1_file": j_minus_1_file,
-            "m_minus_1_file": m_minus_1_file
+            "m_minus_1_file": m_minus_1_file,
+            "elapsed_seconds": round(elapsed, 3)
         }
         
     except HTTPException:
@@ -573,6 +811,65 @@ async def load_files_by_date(request: Request, session_token: Optional[str] = Co
         logger.error(f"Error loading files by date: {e}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
        
+@app.get("/api/available-dates")
+async def available_dates(refresh: bool = False, session_token: Optional[str] = Cookie(None)):
+    """Dates pour lesquelles les fichiers J, J-1 et M-1 sont disponibles"""
+    current_user = get_current_user_from_session(session_token)
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    try:
+        loop = asyncio.get_running_loop()
+        if refresh:
+            await loop.run_in_executor(None, sharepoint_index.refresh)
+        dates = await loop.run_in_executor(None, sharepoint_index.available_dates)
+        return {
+            "success": True,
+            "dates": dates,
+            "index": sharepoint_index.status()
+        }
+    except Exception as e:
+        logger.error(f"Error listing available dates: {e}")
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+@app.post("/api/sharepoint-index/refresh")
+async def refresh_sharepoint_index(session_token: Optional[str] = Cookie(None)):
+    current_user = get_current_user_from_session(session_token)
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, sharepoint_index.refresh)
+        return {"success": True, "index": sharepoint_index.status()}
+    except Exception as e:
+        logger.error(f"Error refreshing SharePoint index: {e}")
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+@app.get("/api/prefetch-status")
+async def prefetch_status(session_token: Optional[str] = Cookie(None)):
+    current_user = get_current_user_from_session(session_token)
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return prefetch_scheduler.status()
+
+
+@app.post("/api/prefetch/run")
+async def run_prefetch(session_token: Optional[str] = Cookie(None)):
+    """Déclenche immédiatement une scrutation / pré-analyse"""
+    current_user = get_current_user_from_session(session_token)
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    try:
+        prefetched_date = await prefetch_scheduler.run_once()
+        return {"success": True, "prefetched_date": prefetched_date, "status": prefetch_scheduler.status()}
+    except Exception as e:
+        logger.error(f"Erreur préchargement: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
+
+
 @app.post("/api/cleanup-memory")
 async def cleanup_memory_endpoint(session_token: Optional[str] = Cookie(None)):
     """Endpoint pour nettoyer la mémoire manuellement"""
@@ -605,7 +902,19 @@ async def cleanup_memory_endpoint(session_token: Optional[str] = Cookie(None)):
 
 
 @app.post("/api/analyze")
-async def analyze_files(session_token: Optional[str] = Cookie(None)):
+async def analyze_files(request: Request, tables: Optional[str] = None,
+                        response_format: Optional[str] = Query(None, alias="format"),
+                        top_n: int = CLIENT_TOP_N, rank_by: str = "value",
+                        session_token: Optional[str] = Cookie(None)):
+    """
+    Analyse des trois fichiers de session.
+    tables: sélection de tableaux séparés par des virgules (tous par défaut) ;
+    seuls les tableaux demandés et leurs agrégats sont calculés, les tableaux
+    déjà calculés pour ces fichiers sont repris.
+    format: "json" (défaut) ou "compact" (colonnes et libellés partagés, wire_format)
+    top_n, rank_by: clients détaillés par section des tableaux BUFFER et BUFFER & NCO,
+    les suivants regroupés dans "others" (voir /api/drilldown) ; top_n=0 pour tous
+    """
     # Vérifier l'authentification
     current_user = get_current_user_from_session(session_token)
     if not current_user:
@@ -615,104 +924,44 @@ async def analyze_files(session_token: Optional[str] = Cookie(None)):
     log_activity(current_user["username"], "ANALYSIS", "Started LCR analysis")
     try:
         logger.info("Début de l'analyse depuis DataFrames en mémoire")
-        
-        # Vérification de la présence des TROIS fichiers
-        if len(file_session.get("files", {})) < 3:
-            raise HTTPException(status_code=400, detail="Les trois fichiers sont requis")
-        
-        if "j" not in file_session["files"] or "jMinus1" not in file_session["files"] or "mMinus1" not in file_session["files"]:
-            raise HTTPException(status_code=400, detail="Fichiers manquants")
-        
-        # Récupérer les DataFrames directement depuis la session
-        dataframes = {}
-        for file_type, file_info in file_session["files"].items():
-            df = file_info["dataframe"]
-            dataframes[file_type] = df
-            logger.info(f"{file_type}: {len(df)} lignes (depuis mémoire)")
-
-        # Nouvelles analyses
-        buffer_results = create_buffer_table(dataframes)
-        summary_results = create_summary_table(dataframes)  # NOUVEAU
-        consumption_results = create_consumption_table(dataframes)
-        resources_results = create_resources_table(dataframes)
-        cappage_results = create_cappage_table(dataframes)
-        buffer_nco_results = create_buffer_nco_table(dataframes)
-        consumption_resources_results = create_consumption_resources_table(dataframes)
-        simple_totals_results = create_simple_totals_table(dataframes) 
-        si_remettant_results = create_si_remettant_bar(dataframes)
-        
-        logger.info("Analyses terminées (nouveaux tableaux)")
-
-        # SAUVEGARDER LE CONTEXTE CHATBOT
-        chatbot_session["context_data"] = {
-            "buffer": buffer_results,
-            "summary": summary_results,  
-            "consumption": consumption_results,
-            "resources": resources_results,
-            "cappage": cappage_results,
-            "buffer_nco": buffer_nco_results,
-            "consumption_resources": consumption_resources_results,
-            "simple_totals": simple_totals_results, 
-            "si_remettant": si_remettant_results,
-            "analysis_timestamp": datetime.now().isoformat(),
-            "raw_dataframes_info": {
-                file_type: {
-                    "shape": [len(df), len(df.columns)],
-                    "columns": df.columns.tolist(),
-                    "sample_data": df.head(3).to_dict('records') if len(df) > 0 else [],
-                    "file_info": file_session["files"][file_type]
-                }
-                for file_type, df in dataframes.items()
-            }
-        }
-
-        # ========= SAUVEGARDE HISTORIQUE =========
-        try:
-            # Extraire la date d'arrêté du fichier J
-            analysis_date = None
-            if "j" in file_session["files"]:
-                df_j = file_session["files"]["j"]["dataframe"]
-                if "Date d'arrêté" in df_j.columns:
-                    # Prendre la première date d'arrêté
-                    analysis_date = str(df_j["Date d'arrêté"].iloc[0])
-            
-            if analysis_date:
-                # Sauvegarder uniquement les 5 tableaux concernés
-                save_table_result(analysis_date, "cappage", cappage_results)
-                save_table_result(analysis_date, "buffer_nco_buffer", 
-                                buffer_nco_results.get("data", {}).get("j", {}).get("buffer_pivot_data", []))
-                save_table_result(analysis_date, "buffer_nco_nco",
-                                buffer_nco_results.get("data", {}).get("j", {}).get("nco_pivot_data", []))
-                save_table_result(analysis_date, "consumption_resources_consumption",
-                                consumption_resources_results.get("data", {}).get("j", {}).get("consumption_data", []))
-                save_table_result(analysis_date, "consumption_resources_resources",
-                                consumption_resources_results.get("data", {}).get("j", {}).get("resources_data", []))
-                
-                logger.info(f"✅ Historique sauvegardé pour {analysis_date}")
-            else:
-                logger.warning("⚠️ Impossible de trouver la date d'arrêté")
-                
-        except Exception as e:
-            logger.warning(f"⚠️ Erreur sauvegarde historique: {e}")
-        # =========================================     
-
-        return {
+        names = parse_table_selection(tables)
+        response_format = check_response_format(response_format)
+        check_client_pruning(top_n, rank_by)
+        dataframes, file_hashes = session_analysis_inputs()
+
+        # Analyse déjà calculée (clic répété, préchargement) si les fichiers sont les mêmes
+        cached = get_cached_analysis(file_hashes)
+        from_cache = cached is not None
+        if from_cache:
+            logger.info(f"Analyse servie depuis le cache ({cached['source']}, {cached['computed_at']})")
+
+        results = dict(iter_session_tables(dataframes, file_hashes, names, cached))
+        cached = finish_session_analysis(dataframes, file_hashes, cached)
+        etag = analysis_response_etag(file_hashes, names, top_n, rank_by, response_format)
+
+        # Réponse élaguée, le cache, l'historique et le chatbot gardent tous les clients
+        if top_n:
+            results = prune_client_tables(results, top_n, rank_by)
+
+        # Résultat identique à celui déjà reçu par le navigateur
+        if etag and request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+
+        content = {
             "success": True,
             "message": "Analyses terminées avec nouveaux tableaux",
             "timestamp": datetime.now().isoformat(),
-            "context_ready": True,  
-            "results": {
-                "buffer": buffer_results,
-                "summary": summary_results,  # NOUVEAU
-                "consumption": consumption_results,
-                "resources": resources_results,
-                "cappage": cappage_results,
-                "buffer_nco": buffer_nco_results,
-                "consumption_resources": consumption_resources_results,
-                "simple_totals": simple_totals_results,
-                "si_remettant": si_remettant_results
-            }
+            "context_ready": True,
+            "prefetched": from_cache and cached["source"] == "prefetch",
+            "cached": from_cache,
+            "tables": names,
+            "results": results
         }
+        headers = {"ETag": etag} if etag else None
+
+        if response_format == "compact":
+            return FastJSONResponse(content={**content, "results": encode_compact(results)}, headers=headers)
+        return JSONResponse(content=jsonable_encoder(content), headers=headers)
         
     except HTTPException:
         raise
@@ -720,50 +969,272 @@ async def analyze_files(session_token: Optional[str] = Cookie(None)):
         logger.error(f"Erreur analyse: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur d'analyse: {str(e)}")
 
-@app.get("/api/analyze-historical/{table_name}")
-async def get_table_historical(table_name: str, days_back: int = 10, session_token: Optional[str] = Cookie(None)):
-    """Récupère l'historique d'un tableau spécifique"""
+@app.post("/api/analyze-stream")
+async def analyze_files_stream(tables: Optional[str] = None,
+                               response_format: Optional[str] = Query(None, alias="format"),
+                               top_n: int = CLIENT_TOP_N, rank_by: str = "value",
+                               session_token: Optional[str] = Cookie(None)):
+    """
+    Variante en flux de /api/analyze (mêmes paramètres) : réponse NDJSON
+    dont chaque ligne est envoyée dès que le tableau correspondant est calculé
+    (voir iter_ndjson_analysis)
+    """
     current_user = get_current_user_from_session(session_token)
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    
+
+    log_activity(current_user["username"], "ANALYSIS", "Started LCR analysis (NDJSON stream)")
+    names = parse_table_selection(tables)
+    response_format = check_response_format(response_format)
+    check_client_pruning(top_n, rank_by)
+    dataframes, file_hashes = session_analysis_inputs()
+
+    # Générateur synchrone : exécuté hors de la boucle asyncio par StreamingResponse
+    return StreamingResponse(
+        iter_ndjson_analysis(dataframes, file_hashes, names, response_format, top_n, rank_by),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/api/analyze-jobs")
+async def submit_analysis_job(session_token: Optional[str] = Cookie(None)):
+    """
+    Lance l'analyse en tâche de fond et retourne immédiatement un job_id.
+    Les tableaux sont diffusés au fil de l'eau par /api/analyze-jobs/{job_id}/events
+    """
+    current_user = get_current_user_from_session(session_token)
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    log_activity(current_user["username"], "ANALYSIS", "Started LCR analysis (background job)")
     try:
-        # Récupérer l'historique depuis la DB
-        historical_data = get_historical_data(table_name, days_back)
-        
-        if not historical_data:
+        dataframes, file_hashes = session_analysis_inputs()
+
+        cached = get_cached_analysis(file_hashes)
+        if cached:
+            logger.info(f"Analyse servie depuis le cache ({cached['source']}, {cached['computed_at']})")
+            run_tables = cached["results"].items
+        else:
+            run_tables = partial(iter_analysis_tables, dataframes, file_hashes)
+
+        def on_complete(job, results):
+            # Fichiers remplacés pendant le calcul : ni cache, ni chatbot, ni historique
+            if not session_analysis_current(file_hashes):
+                logger.warning(f"⚠️ Analyse {job['job_id'][:8]}: fichiers de session modifiés, résultats non publiés")
+                return {
+                    "success": True,
+                    "context_ready": False,
+                    "stale": True,
+                    "cached": cached is not None,
+                    "etag": cached["etag"] if cached else None,
+                }
+
+            entry = cached or store_analysis(file_hashes, results, "analyze")
+            publish_analysis(dataframes, results, save_history=cached is None)
             return {
-                "success": False,
-                "message": f"Aucun historique trouvé pour {table_name}"
+                "success": True,
+                "context_ready": True,
+                "cached": cached is not None,
+                "prefetched": bool(cached and cached["source"] == "prefetch"),
+                "etag": entry["etag"] if entry else None,
             }
-        
-        # Transformer en format utilisable par le frontend
-        dates = [item[0] for item in historical_data]
-        data_by_date = {item[0]: item[1] for item in historical_data}
-        
+
+        job = submit_analysis(run_tables, analysis_table_names(), on_complete)
         return {
             "success": True,
-            "table_name": table_name,
-            "dates": dates,
-            "data_by_date": data_by_date,
-            "total_days": len(dates)
+            "job_id": job["job_id"],
+            "tables": job["tables"],
+            "cached": cached is not None,
+            "events_url": f"/api/analyze-jobs/{job['job_id']}/events",
         }
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Erreur récupération historique {table_name}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-    
-@app.post("/api/analyze-consumption-resources")
-async def analyze_consumption_resources(request: Request, session_token: Optional[str] = Cookie(None)):
-    """
-    Génère une analyse IA des données Consumption & Resources
-    """
-    # Vérifier l'authentification
+        logger.error(f"Erreur lancement analyse: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur d'analyse: {str(e)}")
+
+
+@app.get("/api/analyze-jobs/{job_id}")
+async def analysis_job_status(job_id: str, session_token: Optional[str] = Cookie(None)):
     current_user = get_current_user_from_session(session_token)
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    try:
+
+    status = get_analysis_job_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job d'analyse inconnu")
+    return status
+
+
+@app.get("/api/analyze-jobs/{job_id}/events")
+async def analysis_job_events(job_id: str, request: Request,
+                              response_format: Optional[str] = Query(None, alias="format"),
+                              top_n: int = CLIENT_TOP_N, rank_by: str = "value",
+                              session_token: Optional[str] = Cookie(None)):
+    """
+    Flux Server-Sent Events : started, table (un par tableau terminé), done / failed
+    format: "compact" pour les tableaux au format compact (wire_format)
+    top_n, rank_by: élagage des clients, comme /api/analyze
+    """
+    current_user = get_current_user_from_session(session_token)
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    if get_analysis_job_status(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job d'analyse inconnu")
+    compact = check_response_format(response_format) == "compact"
+    check_client_pruning(top_n, rank_by)
+    prepare_table = partial(prune_client_table, top_n=top_n, rank_by=rank_by) if top_n else None
+
+    return StreamingResponse(
+        stream_job_events(job_id, request.headers.get("last-event-id"), compact, prepare_table),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/drilldown/{table}/{section:path}")
+async def drilldown(table: str, section: str, file_type: str = "j", offset: int = 0, limit: int = 50,
+                    rank_by: str = "value", session_token: Optional[str] = Cookie(None)):
+    """
+    Détails clients d'une section des tableaux BUFFER / BUFFER & NCO, par page,
+    dans l'ordre de l'élagage de /api/analyze (offset=top_n : clients regroupés
+    dans "others"). Calculé sur les cubes en cache des fichiers de session.
+    """
+    current_user = get_current_user_from_session(session_token)
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    if table not in DRILLDOWN_TABLES:
+        raise HTTPException(status_code=404, detail=f"Tableau sans détail client: {table}")
+    if offset < 0 or not 1 <= limit <= DRILLDOWN_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"offset >= 0 et 1 <= limit <= {DRILLDOWN_MAX_LIMIT} requis")
+    check_client_pruning(0, rank_by)
+
+    try:
+        dataframes, file_hashes = session_analysis_inputs()
+        if file_type not in dataframes:
+            raise HTTPException(status_code=400, detail=f"Fichier inconnu: {file_type}")
+
+        # Cubes (recalculés si absents du cache) hors de la boucle d'événements
+        try:
+            clients = await asyncio.get_running_loop().run_in_executor(
+                None, drilldown_section, dataframes, file_hashes, table, section, file_type, rank_by)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+
+        return {
+            "table": table,
+            "section": section,
+            "file_type": file_type,
+            "rank_by": rank_by,
+            "total": len(clients),
+            "offset": offset,
+            "limit": limit,
+            "clients": clients[offset:offset + limit],
+            "others": others_detail(clients[offset + limit:]),
+            "has_more": offset + limit < len(clients)
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur drill-down {table}/{section}: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur drill-down: {str(e)}")
+
+
+@app.get("/api/analyze-historical/{table_name}")
+async def get_table_historical(table_name: str, days_back: int = 10, session_token: Optional[str] = Cookie(None)):
+    """Récupère l'historique d'un tableau spécifique"""
+    current_user = get_current_user_from_session(session_token)
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    try:
+        # Récupérer l'historique depuis la DB
+        historical_data = get_historical_data(table_name, days_back)
+        
+        if not historical_data:
+            return {
+                "success": False,
+                "message": f"Aucun historique trouvé pour {table_name}"
+            }
+        
+        # Transformer en format utilisable par le frontend
+        dates = [item[0] for item in historical_data]
+        data_by_date = {item[0]: item[1] for item in historical_data}
+        
+        return {
+            "success": True,
+            "table_name": table_name,
+            "dates": dates,
+            "data_by_date": data_by_date,
+            "total_days": len(dates)
+        }
+        
+    except Exception as e:
+        logger.error(f"Erreur récupération historique {table_name}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+@app.get("/api/history/series/{table_name}")
+async def get_history_series(table_name: str, dimension_1: Optional[str] = None, dimension_2: Optional[str] = None,
+                             days_back: int = 60, session_token: Optional[str] = Cookie(None)):
+    """
+    Séries historiques lues dans la table de faits (sans relire les blobs JSON),
+    un point par date d'analyse (dates) à la date de colonne la plus récente
+    de ce fichier J (value_dates) :
+    - dimension_1 et dimension_2 : une ligne (ex. un client d'une section)
+    - dimension_1 seule : total du groupe (ex. "CIB Markets" en consommation)
+    - aucune : totaux de tous les groupes du tableau
+    """
+    current_user = get_current_user_from_session(session_token)
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    if table_name not in HISTORY_FACT_LAYOUTS:
+        raise HTTPException(status_code=404, detail=f"Pas de séries pour {table_name}")
+    if days_back < 1:
+        raise HTTPException(status_code=400, detail="days_back doit être positif")
+
+    measure = HISTORY_FACT_LAYOUTS[table_name]["measure"]
+    if dimension_1 is None:
+        points, series = get_table_series(table_name, days_back)
+        dates = [date for date, _ in points]
+        return {
+            "success": bool(points),
+            "table_name": table_name,
+            "measure": measure,
+            "dates": dates,
+            "value_dates": [value_date for _, value_date in points],
+            "series": {label: [values.get(date) for date in dates] for label, values in series.items()}
+        }
+
+    points = get_series(table_name, dimension_1, dimension_2 or GROUP_TOTAL, days_back)
+    return {
+        "success": bool(points),
+        "table_name": table_name,
+        "measure": measure,
+        "dimension_1": dimension_1,
+        "dimension_2": dimension_2,
+        "dates": [date for date, _, _ in points],
+        "value_dates": [value_date for _, value_date, _ in points],
+        "values": [value for _, _, value in points]
+    }
+
+
+@app.post("/api/analyze-consumption-resources")
+async def analyze_consumption_resources(request: Request, session_token: Optional[str] = Cookie(None)):
+    """
+    Génère une analyse IA des données Consumption & Resources
+    """
+    # Vérifier l'authentification
+    current_user = get_current_user_from_session(session_token)
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    try:
         data = await request.json()
         context_data = data.get("context_data", {})
         
@@ -1168,476 +1639,9 @@ async def view_current_report(session_token: Optional[str] = Cookie(None)):
     
 
 
-# ========================== FONCTIONS BUFFER TABLE ===========================
-
-
-def create_buffer_table(dataframes):
-    """
-    Crée le tableau BUFFER avec structure TCD Excel
-    Filtre: LCR_Catégorie = "1- Buffer"
-    Lignes: LCR_Template Section 1 + Libellé Client (hiérarchie)
-    Valeurs: D (Today), Variation D vs D-1, Variation D vs M-1
-    """
-    try:
-        logger.info("📊 Création du tableau BUFFER - Style TCD Excel avec variations")
-        
-        # Vérification que nous avons les trois fichiers nécessaires
-        if not all(key in dataframes for key in ['j', 'jMinus1', 'mMinus1']):
-            return {
-                "title": "BUFFER - Erreur",
-                "error": "Les trois fichiers (J, J-1, M-1) sont requis pour calculer les variations"
-            }
-        
-        buffer_results = {}
-        
-        for file_type, df in dataframes.items():
-            logger.info(f"📄 Traitement BUFFER TCD pour {file_type}")
-            
-            # Vérification des colonnes requises
-            buffer_cols = ["Top Conso", "LCR_Catégorie", "LCR_Template Section 1", 
-                          "Libellé Client", "LCR_Assiette Pondérée"]
-            missing_cols = [col for col in buffer_cols if col not in df.columns]
-            
-            if missing_cols:
-                logger.warning(f"⚠️ Colonnes manquantes pour BUFFER {file_type}: {missing_cols}")
-                continue
-            
-            # Filtrage des données - TCD Style
-            df_filtered = df[df["Top Conso"] == "O"].copy()
-            df_filtered = df_filtered[df_filtered["LCR_Catégorie"] == "1- Buffer"].copy()
-            
-            logger.info(f"📋 Après filtrage BUFFER TCD: {len(df_filtered)} lignes")
-            
-            if len(df_filtered) == 0:
-                logger.warning(f"⚠️ Aucune donnée BUFFER pour {file_type}")
-                buffer_results[file_type] = {
-                    "pivot_data": [],
-                    "sections": []
-                }
-                continue
-            
-            # Préparation des données
-            df_filtered["LCR_Assiette Pondérée"] = pd.to_numeric(
-                df_filtered["LCR_Assiette Pondérée"], errors='coerce'
-            ).fillna(0)
-            
-            # Nettoyage des champs texte
-            df_filtered["LCR_Template Section 1"] = df_filtered["LCR_Template Section 1"].astype(str).str.strip()
-            df_filtered["Libellé Client"] = df_filtered["Libellé Client"].astype(str).str.strip()
-            
-            # Grouper les données pour créer la structure pivot
-            pivot_data = []
-            sections = sorted(df_filtered["LCR_Template Section 1"].unique())
-            
-            for section in sections:
-                section_data = df_filtered[df_filtered["LCR_Template Section 1"] == section]
-                clients = sorted(section_data["Libellé Client"].unique())
-                
-                # Calculer les totaux de section pour toutes les périodes
-                section_total_j = section_data["LCR_Assiette Pondérée"].sum() / 1_000_000_000
-                
-                # Données clients détaillées
-                client_details = []
-                
-                for client in clients:
-                    client_data = section_data[section_data["Libellé Client"] == client]
-                    value_j = client_data["LCR_Assiette Pondérée"].sum() / 1_000_000_000
-                    
-                    client_details.append({
-                        "client": client,
-                        "value_j": float(value_j),
-                        "is_detail": True
-                    })
-                
-                # Ajouter le groupe de section avec ses détails
-                pivot_data.append({
-                    "section": section,
-                    "client_details": client_details,
-                    "section_total_j": float(section_total_j),
-                    "is_section_group": True
-                })
-            
-            buffer_results[file_type] = {
-                "pivot_data": pivot_data,
-                "sections": sections
-            }
-            
-            logger.info(f"✅ BUFFER TCD {file_type}: {len(pivot_data)} sections")
-        
-        # Calculer les variations entre les périodes
-        if 'j' in buffer_results and 'jMinus1' in buffer_results and 'mMinus1' in buffer_results:
-            buffer_results_with_variations = calculate_buffer_variations(
-                buffer_results['j'], 
-                buffer_results['jMinus1'], 
-                buffer_results['mMinus1']
-            )
-        else:
-            buffer_results_with_variations = buffer_results.get('j', {"pivot_data": [], "sections": []})
-        
-        return {
-            "title": "BUFFER - TCD Analysis with Variations",
-            "data": buffer_results_with_variations,
-            "metadata": {
-                "analysis_date": datetime.now().isoformat(),
-                "tcd_config": {
-                    "filters": {"lcr_categorie": "1- Buffer", "top_conso": "O"},
-                    "rows": ["LCR_Template Section 1", "Libellé Client"],
-                    "values": ["D (Today) Bn €", "Variation D vs D-1", "Variation D vs M-1"]
-                }
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur création tableau BUFFER TCD: {e}")
-        return {
-            "title": "BUFFER - Erreur",
-            "error": str(e)
-        }
-
-def calculate_buffer_variations(data_j, data_j1, data_m1):
-    """
-    Calcule les variations pour le tableau BUFFER
-    """
-    try:
-        # Créer des mappings pour les recherches rapides
-        j1_map = {}
-        m1_map = {}
-        
-        # Mapper les données J-1
-        for section_group in data_j1.get("pivot_data", []):
-            section = section_group["section"]
-            for client_detail in section_group.get("client_details", []):
-                key = f"{section}|{client_detail['client']}"
-                j1_map[key] = client_detail["value_j"]
-        
-        # Mapper les données M-1
-        for section_group in data_m1.get("pivot_data", []):
-            section = section_group["section"]
-            for client_detail in section_group.get("client_details", []):
-                key = f"{section}|{client_detail['client']}"
-                m1_map[key] = client_detail["value_j"]
-        
-        # Calculer les variations pour les données J
-        result_data = {"pivot_data": [], "sections": data_j.get("sections", [])}
-        
-        for section_group in data_j.get("pivot_data", []):
-            section = section_group["section"]
-            
-            # Calculer les variations pour chaque client
-            client_details_with_variations = []
-            section_total_j = 0
-            section_total_j1 = 0
-            section_total_m1 = 0
-            
-            for client_detail in section_group.get("client_details", []):
-                client = client_detail["client"]
-                key = f"{section}|{client}"
-                
-                value_j = client_detail["value_j"]
-                value_j1 = j1_map.get(key, 0)
-                value_m1 = m1_map.get(key, 0)
-                
-                variation_daily = value_j - value_j1
-                variation_monthly = value_j - value_m1
-                
-                # Cumuler pour les totaux de section
-                section_total_j += value_j
-                section_total_j1 += value_j1
-                section_total_m1 += value_m1
-                
-                client_details_with_variations.append({
-                    "client": client,
-                    "value_j": float(value_j),
-                    "variation_daily": float(variation_daily),
-                    "variation_monthly": float(variation_monthly),
-                    "is_detail": True
-                })
-            
-            # Calculer les variations de section
-            section_variation_daily = section_total_j - section_total_j1
-            section_variation_monthly = section_total_j - section_total_m1
-            
-            result_data["pivot_data"].append({
-                "section": section,
-                "client_details": client_details_with_variations,
-                "section_total_j": float(section_total_j),
-                "section_variation_daily": float(section_variation_daily),
-                "section_variation_monthly": float(section_variation_monthly),
-                "is_section_group": True
-            })
-        
-        return result_data
-        
-    except Exception as e:
-        logger.error(f"Erreur calcul variations BUFFER: {e}")
-        return data_j
-    
-
-# ========================== FONCTIONS SUMMARY TABLE ===========================
-
-
-def create_summary_table(dataframes):
-    """
-    Crée le tableau de synthèse sans titre avec comparaison des deux fichiers
-    """
-    try:
-        logger.info("📊 Création du tableau de synthèse")
-        
-        summary_results = {}
-        
-        # Vérification que nous avons les deux fichiers
-        if "j" not in dataframes or "jMinus1" not in dataframes:
-            logger.warning("⚠️ Les deux fichiers sont requis pour le tableau de synthèse")
-            return {
-                "title": "Summary Table",
-                "error": "Les deux fichiers sont requis"
-            }
-        
-        for file_type, df in dataframes.items():
-            logger.info(f"📄 Traitement synthèse pour {file_type}")
-            
-            # Vérification des colonnes requises
-            summary_cols = ["Top Conso", "Date d'arrêté", "LCR_Assiette Pondérée", "LCR_ECO_IMPACT_LCR"]
-            missing_cols = [col for col in summary_cols if col not in df.columns]
-            
-            if missing_cols:
-                logger.warning(f"⚠️ Colonnes manquantes pour synthèse {file_type}: {missing_cols}")
-                continue
-            
-            # Filtrage Top Conso = "O"
-            df_filtered = df[df["Top Conso"] == "O"].copy()
-            
-            logger.info(f"📋 Après filtrage Top Conso: {len(df_filtered)} lignes")
-            
-            if len(df_filtered) == 0:
-                logger.warning(f"⚠️ Aucune donnée pour synthèse {file_type}")
-                continue
-            
-            # Préparation des données
-            df_filtered["LCR_Assiette Pondérée"] = pd.to_numeric(
-                df_filtered["LCR_Assiette Pondérée"], errors='coerce'
-            ).fillna(0)
-            
-            df_filtered["LCR_ECO_IMPACT_LCR"] = pd.to_numeric(
-                df_filtered["LCR_ECO_IMPACT_LCR"], errors='coerce'
-            ).fillna(0)
-            
-            # Nettoyage du champ date
-            df_filtered["Date d'arrêté"] = df_filtered["Date d'arrêté"].astype(str).str.strip()
-            
-            # Obtenir les dates uniques pour ce fichier
-            dates = sorted(df_filtered["Date d'arrêté"].unique())
-            
-            # Calculer les sommes par date
-            summary_data = []
-            
-            for date in dates:
-                date_data = df_filtered[df_filtered["Date d'arrêté"] == date]
-                
-                sum_assiette = float(date_data["LCR_Assiette Pondérée"].sum()) / 1_000_000_000
-                sum_impact = float(date_data["LCR_ECO_IMPACT_LCR"].sum()) / 1_000_000_000
-                sum_difference = sum_assiette - sum_impact
-                
-                summary_data.append({
-                    "date": date,
-                    "sum_assiette": sum_assiette,
-                    "sum_impact": sum_impact,
-                    "sum_difference": sum_difference,
-                    "file_type": file_type
-                })
-            
-            summary_results[file_type] = summary_data
-            logger.info(f"✅ Synthèse {file_type}: {len(summary_data)} dates")
-        
-        return {
-            "title": "",  # Pas de titre
-            "data": summary_results,
-            "metadata": {
-                "analysis_date": datetime.now().isoformat(),
-                "filters_applied": {
-                    "top_conso": "O"
-                }
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur création tableau synthèse: {e}")
-        return {
-            "title": "Summary Table - Erreur",
-            "error": str(e)
-        }
-    
-
-# ========================== FONCTIONS CONSUMPTION TABLE ===========================
-
-
-def create_consumption_table(dataframes):
-    """
-    Crée le tableau CONSUMPTION avec filtres spécifiques
-    """
-    try:
-        logger.info("📊 Création du tableau CONSUMPTION")
-        
-        consumption_results = {}
-        
-        for file_type, df in dataframes.items():
-            logger.info(f"📄 Traitement CONSUMPTION pour {file_type}")
-            
-            # Vérification des colonnes requises
-            consumption_cols = ["Top Conso", "LCR_ECO_GROUPE_METIERS", "Sous-Métier", 
-                              "Produit", "LCR_ECO_IMPACT_LCR"]
-            missing_cols = [col for col in consumption_cols if col not in df.columns]
-            
-            if missing_cols:
-                logger.warning(f"⚠️ Colonnes manquantes pour CONSUMPTION {file_type}: {missing_cols}")
-                continue
-            
-            # Filtrage des données
-            df_filtered = df[df["Top Conso"] == "O"].copy()
-            
-            # Filtres spécifiques CONSUMPTION
-            allowed_groupes = ["A&WM & Insurance", "CIB Financing", "CIB Markets", "GLOBAL TRADE", "Other Consumption"]
-            df_filtered = df_filtered[df_filtered["LCR_ECO_GROUPE_METIERS"].isin(allowed_groupes)].copy()
-            
-            excluded_sous_metier = ["GT TREASURY SOLUTIONS", "GT GROUP SERVICES"]
-            df_filtered = df_filtered[~df_filtered["Sous-Métier"].isin(excluded_sous_metier)].copy()
-            
-            excluded_produit = ["SIGHT DEPOSIT MIRROR", "SIGHT FINANCING MIRROR"]
-            df_filtered = df_filtered[~df_filtered["Produit"].isin(excluded_produit)].copy()
-            
-            logger.info(f"📋 Après filtrage CONSUMPTION: {len(df_filtered)} lignes")
-            
-            if len(df_filtered) == 0:
-                logger.warning(f"⚠️ Aucune donnée CONSUMPTION pour {file_type}")
-                continue
-            
-            # Préparation des données
-            df_filtered["LCR_ECO_IMPACT_LCR"] = pd.to_numeric(
-                df_filtered["LCR_ECO_IMPACT_LCR"], errors='coerce'
-            ).fillna(0)
-
-            # Groupement par LCR_ECO_GROUPE_METIERS
-            grouped = df_filtered.groupby("LCR_ECO_GROUPE_METIERS")["LCR_ECO_IMPACT_LCR"].sum().reset_index()
-            grouped["LCR_ECO_IMPACT_LCR_Bn"] = (grouped["LCR_ECO_IMPACT_LCR"] / 1_000_000_000).round(3)
-
-            # Convertir en dictionnaire avec types Python natifs
-            consumption_results[file_type] = [
-                {
-                    "LCR_ECO_GROUPE_METIERS": str(row["LCR_ECO_GROUPE_METIERS"]),
-                    "LCR_ECO_IMPACT_LCR": float(row["LCR_ECO_IMPACT_LCR"]),
-                    "LCR_ECO_IMPACT_LCR_Bn": float(row["LCR_ECO_IMPACT_LCR_Bn"])
-                }
-                for _, row in grouped.iterrows()
-            ]
-            logger.info(f"✅ CONSUMPTION {file_type}: {len(grouped)} groupes")
-        
-        return {
-            "title": "CONSUMPTION",
-            "data": consumption_results,
-            "metadata": {
-                "analysis_date": datetime.now().isoformat(),
-                "filters_applied": {
-                    "top_conso": "O",
-                    "groupe_metiers": allowed_groupes,
-                    "excluded_sous_metier": excluded_sous_metier,
-                    "excluded_produit": excluded_produit
-                }
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur création tableau CONSUMPTION: {e}")
-        return {
-            "title": "CONSUMPTION - Erreur",
-            "error": str(e)
-        }
-
-
-# ========================== FONCTIONS RESOURCES TABLE ===========================
+# ========================== FONCTIONS PROMPT CONSUMPTION & RESOURCES ===========================
 
 
-def create_resources_table(dataframes):
-    """
-    Crée le tableau RESOURCES avec filtres spécifiques
-    """
-    try:
-        logger.info("📊 Création du tableau RESOURCES")
-        
-        resources_results = {}
-        
-        for file_type, df in dataframes.items():
-            logger.info(f"📄 Traitement RESOURCES pour {file_type}")
-            
-            # Vérification des colonnes requises
-            resources_cols = ["Top Conso", "LCR_ECO_GROUPE_METIERS", "Sous-Métier", 
-                            "Produit", "LCR_ECO_IMPACT_LCR"]
-            missing_cols = [col for col in resources_cols if col not in df.columns]
-            
-            if missing_cols:
-                logger.warning(f"⚠️ Colonnes manquantes pour RESOURCES {file_type}: {missing_cols}")
-                continue
-            
-            # Filtrage des données
-            df_filtered = df[df["Top Conso"] == "O"].copy()
-            
-            # Filtres spécifiques RESOURCES
-            allowed_groupes = ["GLOBAL TRADE", "Other Contribution", "Treasury"]
-            df_filtered = df_filtered[df_filtered["LCR_ECO_GROUPE_METIERS"].isin(allowed_groupes)].copy()
-            
-            excluded_sous_metier = ["GT GROUP SERVICES", "GT COMMODITY", "GT TRADE FINANCE", "SYN GLOBAL TRADE"]
-            df_filtered = df_filtered[~df_filtered["Sous-Métier"].isin(excluded_sous_metier)].copy()
-            
-            excluded_produit = ["SIGHT DEPOSIT MIRROR", "SIGHT FINANCING MIRROR"]
-            df_filtered = df_filtered[~df_filtered["Produit"].isin(excluded_produit)].copy()
-            
-            logger.info(f"📋 Après filtrage RESOURCES: {len(df_filtered)} lignes")
-            
-            if len(df_filtered) == 0:
-                logger.warning(f"⚠️ Aucune donnée RESOURCES pour {file_type}")
-                continue
-            
-            # Préparation des données
-            df_filtered["LCR_ECO_IMPACT_LCR"] = pd.to_numeric(
-                df_filtered["LCR_ECO_IMPACT_LCR"], errors='coerce'
-            ).fillna(0)
-            
-            # Groupement par LCR_ECO_GROUPE_METIERS
-            grouped = df_filtered.groupby("LCR_ECO_GROUPE_METIERS")["LCR_ECO_IMPACT_LCR"].sum().reset_index()
-            grouped["LCR_ECO_IMPACT_LCR_Bn"] = (grouped["LCR_ECO_IMPACT_LCR"] / 1_000_000_000).round(3)
-            
-            # Convertir en dictionnaire avec types Python natifs
-            resources_results[file_type] = [
-                {
-                    "LCR_ECO_GROUPE_METIERS": str(row["LCR_ECO_GROUPE_METIERS"]),
-                    "LCR_ECO_IMPACT_LCR": float(row["LCR_ECO_IMPACT_LCR"]),
-                    "LCR_ECO_IMPACT_LCR_Bn": float(row["LCR_ECO_IMPACT_LCR_Bn"])
-                }
-                for _, row in grouped.iterrows()
-            ]
-            
-            logger.info(f"✅ RESOURCES {file_type}: {len(grouped)} groupes")
-        
-        return {
-            "title": "RESOURCES",
-            "data": resources_results,
-            "metadata": {
-                "analysis_date": datetime.now().isoformat(),
-                "filters_applied": {
-                    "top_conso": "O",
-                    "groupe_metiers": allowed_groupes,
-                    "excluded_sous_metier": excluded_sous_metier,
-                    "excluded_produit": excluded_produit
-                }
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur création tableau RESOURCES: {e}")
-        return {
-            "title": "RESOURCES - Erreur",
-            "error": str(e)
-        }
-    
 def prepare_consumption_resources_analysis_prompt(context_data):
     """
     Prépare le prompt d'analyse pour Consumption & Resources
@@ -1697,569 +1701,6 @@ def prepare_consumption_resources_analysis_prompt(context_data):
     return "\n".join(prompt_parts)
 
 
-# ========================== FONCTIONS CAPPAGE TABLE ===========================
-
-
-def create_cappage_table(dataframes):
-    """
-    Crée le tableau CAPPAGE avec structure TCD Excel style
-    Filtre: SI Remettant = SHORT_LCR ou CAPREOS
-    Lignes: SI Remettant + Commentaire (hiérarchie)
-    Colonnes: Date d'arrêté
-    Valeurs: Somme LCR_Assiette Pondérée
-    """
-    try:
-        logger.info("📊 Création du tableau CAPPAGE - Style TCD Excel")
-        
-        cappage_results = {}
-        
-        for file_type, df in dataframes.items():
-            logger.info(f"📄 Traitement CAPPAGE TCD pour {file_type}")
-            
-            # Vérification des colonnes requises
-            cappage_cols = ["Top Conso", "SI Remettant", "Commentaire", 
-                           "Date d'arrêté", "LCR_Assiette Pondérée"]
-            missing_cols = [col for col in cappage_cols if col not in df.columns]
-            
-            if missing_cols:
-                logger.warning(f"⚠️ Colonnes manquantes pour CAPPAGE {file_type}: {missing_cols}")
-                continue
-            
-            # Filtrage des données - TCD Style
-            df_filtered = df[df["Top Conso"] == "O"].copy()
-            
-            # Filtre principal: SI Remettant
-            allowed_si_remettant = ["SHORT_LCR", "CAPREOS"]
-            df_filtered = df_filtered[df_filtered["SI Remettant"].isin(allowed_si_remettant)].copy()
-            
-            logger.info(f"📋 Après filtrage CAPPAGE TCD: {len(df_filtered)} lignes")
-            
-            if len(df_filtered) == 0:
-                logger.warning(f"⚠️ Aucune donnée CAPPAGE pour {file_type}")
-                cappage_results[file_type] = {
-                    "pivot_data": [],
-                    "dates": [],
-                    "si_remettant_groups": []
-                }
-                continue
-            
-            # Préparation des données pour le TCD
-            df_filtered["LCR_Assiette Pondérée"] = pd.to_numeric(
-                df_filtered["LCR_Assiette Pondérée"], errors='coerce'
-            ).fillna(0)
-            
-            # Nettoyage des champs texte
-            df_filtered["SI Remettant"] = df_filtered["SI Remettant"].astype(str).str.strip()
-            df_filtered["Commentaire"] = df_filtered["Commentaire"].astype(str).str.strip()
-            df_filtered["Date d'arrêté"] = df_filtered["Date d'arrêté"].astype(str).str.strip()
-            
-            # Récupérer toutes les dates uniques (colonnes du TCD)
-            dates = sorted(df_filtered["Date d'arrêté"].unique())
-            
-            # Créer la structure TCD hiérarchique
-            pivot_structure = []
-            
-            # Grouper par SI Remettant (niveau 1 de hiérarchie)
-            for si_remettant in allowed_si_remettant:
-                si_data = df_filtered[df_filtered["SI Remettant"] == si_remettant]
-                
-                if len(si_data) == 0:
-                    continue
-                
-                # Sous-groupes par Commentaire (niveau 2 de hiérarchie)
-                commentaires = sorted(si_data["Commentaire"].unique())
-                
-                # Données détaillées par commentaire
-                commentaire_details = []
-                si_totals_by_date = {}
-                
-                for commentaire in commentaires:
-                    commentaire_data = si_data[si_data["Commentaire"] == commentaire]
-                    
-                    # Calculer les valeurs par date pour ce commentaire
-                    date_values = {}
-                    for date in dates:
-                        date_total = commentaire_data[
-                            commentaire_data["Date d'arrêté"] == date
-                        ]["LCR_Assiette Pondérée"].sum()
-                        
-                        # Conversion en milliards
-                        date_values[date] = float(date_total) / 1_000_000_000
-                        
-                        # Cumuler pour les totaux SI Remettant
-                        if date not in si_totals_by_date:
-                            si_totals_by_date[date] = 0
-                        si_totals_by_date[date] += date_values[date]
-                    
-                    # Ajouter cette ligne de détail
-                    commentaire_details.append({
-                        "commentaire": commentaire,
-                        "date_values": date_values,
-                        "is_detail": True,
-                        "total": sum(date_values.values())
-                    })
-                
-                # Ajouter le groupe SI Remettant avec ses détails
-                pivot_structure.append({
-                    "si_remettant": si_remettant,
-                    "commentaire_details": commentaire_details,
-                    "si_totals_by_date": si_totals_by_date,
-                    "grand_total": sum(si_totals_by_date.values()),
-                    "is_si_group": True
-                })
-            
-            cappage_results[file_type] = {
-                "pivot_data": pivot_structure,
-                "dates": dates,
-                "si_remettant_groups": allowed_si_remettant
-            }
-            
-            logger.info(f"✅ CAPPAGE TCD {file_type}: {len(pivot_structure)} groupes SI, {len(dates)} dates")
-        
-        return {
-            "title": "CAPPAGE & Short_LCR - TCD Analysis",
-            "data": cappage_results,
-            "metadata": {
-                "analysis_date": datetime.now().isoformat(),
-                "tcd_config": {
-                    "filters": {"si_remettant": allowed_si_remettant, "top_conso": "O"},
-                    "rows": ["SI Remettant", "Commentaire"],
-                    "columns": ["Date d'arrêté"],
-                    "values": "Somme LCR_Assiette Pondérée (Bn €)"
-                }
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur création tableau CAPPAGE TCD: {e}")
-        return {
-            "title": "CAPPAGE & Short_LCR - Erreur",
-            "error": str(e)
-        }
-
-
-# ========================== FONCTIONS BUFFER & NCO TABLE ===========================
-
-
-def create_buffer_nco_table(dataframes):
-    """
-    Crée les tableaux BUFFER & NCO avec structure TCD Excel style
-    
-    Tableau 1 - BUFFER:
-    - Filtre: LCR_Catégorie = "1- Buffer"
-    - Lignes: LCR_Template Section 1 + Libellé Client (hiérarchie)
-    - Colonnes: Date d'arrêté
-    - Valeurs: Somme LCR_Assiette Pondérée
-    
-    Tableau 2 - NCO:
-    - Pas de filtre
-    - Lignes: LCR_Catégorie
-    - Colonnes: Date d'arrêté
-    - Valeurs: Somme LCR_Assiette Pondérée
-    """
-    try:
-        logger.info("📊 Création des tableaux BUFFER & NCO - Style TCD Excel")
-        
-        buffer_nco_results = {}
-        
-        for file_type, df in dataframes.items():
-            logger.info(f"📄 Traitement BUFFER & NCO TCD pour {file_type}")
-            
-            # Vérification des colonnes requises
-            buffer_nco_cols = ["Top Conso", "LCR_Catégorie", "LCR_Template Section 1", 
-                              "Libellé Client", "Date d'arrêté", "LCR_Assiette Pondérée"]
-            missing_cols = [col for col in buffer_nco_cols if col not in df.columns]
-            
-            if missing_cols:
-                logger.warning(f"⚠️ Colonnes manquantes pour BUFFER & NCO {file_type}: {missing_cols}")
-                continue
-            
-            # Filtrage Top Conso pour les deux tableaux
-            df_filtered = df[df["Top Conso"] == "O"].copy()
-            
-            logger.info(f"📋 Après filtrage Top Conso: {len(df_filtered)} lignes")
-            
-            if len(df_filtered) == 0:
-                logger.warning(f"⚠️ Aucune donnée BUFFER & NCO pour {file_type}")
-                continue
-            
-            # Préparation des données
-            df_filtered["LCR_Assiette Pondérée"] = pd.to_numeric(
-                df_filtered["LCR_Assiette Pondérée"], errors='coerce'
-            ).fillna(0)
-            
-            # Nettoyage des champs texte
-            df_filtered["LCR_Catégorie"] = df_filtered["LCR_Catégorie"].astype(str).str.strip()
-            df_filtered["LCR_Template Section 1"] = df_filtered["LCR_Template Section 1"].astype(str).str.strip()
-            df_filtered["Libellé Client"] = df_filtered["Libellé Client"].astype(str).str.strip()
-            df_filtered["Date d'arrêté"] = df_filtered["Date d'arrêté"].astype(str).str.strip()
-            
-            # Obtenir toutes les dates uniques
-            dates = sorted(df_filtered["Date d'arrêté"].unique())
-            
-            # =============================================================================
-            # TABLEAU 1: BUFFER (avec filtre LCR_Catégorie = "1- Buffer")
-            # =============================================================================
-            buffer_pivot_data = []
-            df_buffer = df_filtered[df_filtered["LCR_Catégorie"] == "1- Buffer"].copy()
-            
-            if len(df_buffer) > 0:
-                # Grouper par LCR_Template Section 1 (niveau 1 de hiérarchie)
-                sections = sorted(df_buffer["LCR_Template Section 1"].unique())
-                
-                for section in sections:
-                    section_data = df_buffer[df_buffer["LCR_Template Section 1"] == section]
-                    
-                    # Sous-groupes par Libellé Client (niveau 2 de hiérarchie)
-                    clients = sorted(section_data["Libellé Client"].unique())
-                    
-                    # Données détaillées par client
-                    client_details = []
-                    section_totals_by_date = {}
-                    
-                    for client in clients:
-                        client_data = section_data[section_data["Libellé Client"] == client]
-                        
-                        # Calculer les valeurs par date pour ce client
-                        date_values = {}
-                        for date in dates:
-                            date_total = client_data[
-                                client_data["Date d'arrêté"] == date
-                            ]["LCR_Assiette Pondérée"].sum()
-                            
-                            # Conversion en milliards
-                            date_values[date] = float(date_total) / 1_000_000_000
-                            
-                            # Cumuler pour les totaux de section
-                            if date not in section_totals_by_date:
-                                section_totals_by_date[date] = 0
-                            section_totals_by_date[date] += date_values[date]
-                        
-                        # Ajouter cette ligne de détail client
-                        client_details.append({
-                            "client": client,
-                            "date_values": date_values,
-                            "is_detail": True
-                        })
-                    
-                    # Ajouter le groupe Section avec ses détails
-                    buffer_pivot_data.append({
-                        "section": section,
-                        "client_details": client_details,
-                        "section_totals_by_date": section_totals_by_date,
-                        "is_section_group": True
-                    })
-            
-            # =============================================================================
-            # TABLEAU 2: NCO (pas de filtre, groupé par LCR_Catégorie)
-            # =============================================================================
-            nco_pivot_data = []
-            
-            # Grouper par LCR_Catégorie
-            categories = sorted(df_filtered["LCR_Catégorie"].unique())
-            
-            for categorie in categories:
-                categorie_data = df_filtered[df_filtered["LCR_Catégorie"] == categorie]
-                
-                # Calculer les valeurs par date pour cette catégorie
-                date_values = {}
-                for date in dates:
-                    date_total = categorie_data[
-                        categorie_data["Date d'arrêté"] == date
-                    ]["LCR_Assiette Pondérée"].sum()
-                    
-                    # Conversion en milliards
-                    date_values[date] = float(date_total) / 1_000_000_000
-                
-                # Ajouter cette catégorie
-                nco_pivot_data.append({
-                    "categorie": categorie,
-                    "date_values": date_values
-                })
-            
-            buffer_nco_results[file_type] = {
-                "buffer_pivot_data": buffer_pivot_data,
-                "nco_pivot_data": nco_pivot_data,
-                "dates": dates
-            }
-            
-            logger.info(f"✅ BUFFER & NCO TCD {file_type}: Buffer={len(buffer_pivot_data)} sections, NCO={len(nco_pivot_data)} catégories, {len(dates)} dates")
-        
-        return {
-            "title": "BUFFER & NCO - TCD Analysis",
-            "data": buffer_nco_results,
-            "metadata": {
-                "analysis_date": datetime.now().isoformat(),
-                "tcd_config": {
-                    "buffer_table": {
-                        "filters": {"lcr_categorie": "1- Buffer", "top_conso": "O"},
-                        "rows": ["LCR_Template Section 1", "Libellé Client"],
-                        "columns": ["Date d'arrêté"],
-                        "values": "Somme LCR_Assiette Pondérée (Bn €)"
-                    },
-                    "nco_table": {
-                        "filters": {"top_conso": "O"},
-                        "rows": ["LCR_Catégorie"],
-                        "columns": ["Date d'arrêté"],
-                        "values": "Somme LCR_Assiette Pondérée (Bn €)"
-                    }
-                }
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur création tableaux BUFFER & NCO TCD: {e}")
-        return {
-            "title": "BUFFER & NCO - Erreur",
-            "error": str(e)
-        }
-      
-
-# ========================== FONCTIONS CONSUMPTION & RESOURCES TABLE ===========================
-
-
-def create_consumption_resources_table(dataframes):
-    """
-    Crée les tableaux CONSUMPTION & RESOURCES avec structure pivot par date
-    """
-    try:
-        logger.info("📊 Création des tableaux CONSUMPTION & RESOURCES")
-        
-        consumption_resources_results = {}
-        
-        for file_type, df in dataframes.items():
-            logger.info(f"📄 Traitement CONSUMPTION & RESOURCES pour {file_type}")
-            
-            # Vérification des colonnes requises
-            cons_res_cols = ["Top Conso", "LCR_ECO_GROUPE_METIERS", "Sous-Métier", 
-                            "Date d'arrêté", "LCR_ECO_IMPACT_LCR"]
-            missing_cols = [col for col in cons_res_cols if col not in df.columns]
-            
-            if missing_cols:
-                logger.warning(f"⚠️ Colonnes manquantes pour CONSUMPTION & RESOURCES {file_type}: {missing_cols}")
-                continue
-            
-            # Filtrage Top Conso pour les deux tableaux
-            df_filtered = df[df["Top Conso"] == "O"].copy()
-            
-            logger.info(f"📋 Après filtrage Top Conso: {len(df_filtered)} lignes")
-            
-            if len(df_filtered) == 0:
-                logger.warning(f"⚠️ Aucune donnée CONSUMPTION & RESOURCES pour {file_type}")
-                continue
-            
-            # Préparation des données
-            df_filtered["LCR_ECO_IMPACT_LCR"] = pd.to_numeric(
-                df_filtered["LCR_ECO_IMPACT_LCR"], errors='coerce'
-            ).fillna(0)
-            
-            # Nettoyage des champs texte
-            df_filtered["LCR_ECO_GROUPE_METIERS"] = df_filtered["LCR_ECO_GROUPE_METIERS"].astype(str).str.strip()
-            df_filtered["Sous-Métier"] = df_filtered["Sous-Métier"].astype(str).str.strip()
-            df_filtered["Date d'arrêté"] = df_filtered["Date d'arrêté"].astype(str).str.strip()
-            
-            # Obtenir toutes les dates uniques
-            dates = sorted(df_filtered["Date d'arrêté"].unique())
-            
-            # TABLEAU 1: CONSUMPTION
-            consumption_data = []
-            allowed_groupes_cons = ["A&WM & Insurance", "CIB Financing", "CIB Markets", "GLOBAL TRADE", "Other Consumption"]
-            excluded_sous_metier_cons = ["GT TREASURY SOLUTIONS", "GT GROUP SERVICES"]
-            
-            df_consumption = df_filtered[df_filtered["LCR_ECO_GROUPE_METIERS"].isin(allowed_groupes_cons)].copy()
-            df_consumption = df_consumption[~df_consumption["Sous-Métier"].isin(excluded_sous_metier_cons)].copy()
-            
-            if len(df_consumption) > 0:
-                for groupe in allowed_groupes_cons:
-                    groupe_data = df_consumption[df_consumption["LCR_ECO_GROUPE_METIERS"] == groupe]
-                    
-                    if len(groupe_data) > 0:
-                        row_data = {
-                            "lcr_eco_groupe_metiers": groupe,
-                            "dates": {}
-                        }
-                        
-                        for date in dates:
-                            date_data = groupe_data[groupe_data["Date d'arrêté"] == date]
-                            total = float(date_data["LCR_ECO_IMPACT_LCR"].sum()) / 1_000_000_000
-                            row_data["dates"][date] = total
-                        
-                        consumption_data.append(row_data)
-            
-            # TABLEAU 2: RESOURCES
-            resources_data = []
-            allowed_groupes_res = ["GLOBAL TRADE", "Other Contribution", "Treasury"]
-            excluded_sous_metier_res = ["GT GROUP SERVICES", "GT COMMODITY", "GT TRADE FINANCE"]
-            
-            df_resources = df_filtered[df_filtered["LCR_ECO_GROUPE_METIERS"].isin(allowed_groupes_res)].copy()
-            df_resources = df_resources[~df_resources["Sous-Métier"].isin(excluded_sous_metier_res)].copy()
-            
-            if len(df_resources) > 0:
-                for groupe in allowed_groupes_res:
-                    groupe_data = df_resources[df_resources["LCR_ECO_GROUPE_METIERS"] == groupe]
-                    
-                    if len(groupe_data) > 0:
-                        row_data = {
-                            "lcr_eco_groupe_metiers": groupe,
-                            "dates": {}
-                        }
-                        
-                        for date in dates:
-                            date_data = groupe_data[groupe_data["Date d'arrêté"] == date]
-                            total = float(date_data["LCR_ECO_IMPACT_LCR"].sum()) / 1_000_000_000
-                            row_data["dates"][date] = total
-                        
-                        resources_data.append(row_data)
-            
-            consumption_resources_results[file_type] = {
-                "consumption_data": consumption_data,
-                "resources_data": resources_data,
-                "dates": dates
-            }
-            
-            logger.info(f"✅ CONSUMPTION & RESOURCES {file_type}: Consumption={len(consumption_data)} lignes, Resources={len(resources_data)} lignes, {len(dates)} dates")
-        
-        return {
-            "title": "CONSUMPTION & RESOURCES",
-            "data": consumption_resources_results,
-            "metadata": {
-                "analysis_date": datetime.now().isoformat(),
-                "filters_applied": {
-                    "top_conso": "O",
-                    "consumption_filters": {
-                        "groupe_metiers": allowed_groupes_cons,
-                        "excluded_sous_metier": excluded_sous_metier_cons
-                    },
-                    "resources_filters": {
-                        "groupe_metiers": allowed_groupes_res,
-                        "excluded_sous_metier": excluded_sous_metier_res
-                    }
-                }
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur création tableaux CONSUMPTION & RESOURCES: {e}")
-        return {
-            "title": "CONSUMPTION & RESOURCES - Erreur",
-            "error": str(e)
-        }
-    
-
-# ========================== FONCTIONS TOTAUX LCR_Assiette Pondérée ===========================
-
-
-def create_simple_totals_table(dataframes):
-    """
-    Crée un tableau simple avec juste les totaux LCR_Assiette Pondérée par fichier
-    Pas de filtre, pas de ligne - juste 3 colonnes avec les totaux
-    """
-    try:
-        logger.info("📊 Création du tableau des totaux simples")
-        
-        totals_results = {}
-        
-        for file_type, df in dataframes.items():
-            logger.info(f"📄 Calcul total pour {file_type}")
-            
-            # Vérification colonne requise
-            if "LCR_Assiette Pondérée" not in df.columns:
-                logger.warning(f"⚠️ Colonne LCR_Assiette Pondérée manquante pour {file_type}")
-                continue
-            
-            # Conversion en numérique
-            df_copy = df.copy()
-            df_copy["LCR_Assiette Pondérée"] = pd.to_numeric(
-                df_copy["LCR_Assiette Pondérée"], errors='coerce'
-            ).fillna(0)
-            
-            # Calcul du total (en milliards)
-            total = float(df_copy["LCR_Assiette Pondérée"].sum()) / 1_000_000_000
-            
-            totals_results[file_type] = total
-            logger.info(f"✅ Total {file_type}: {total:.3f} Bn €")
-        
-        return {
-            "title": "Global LCR Totals",
-            "data": totals_results,
-            "metadata": {
-                "analysis_date": datetime.now().isoformat(),
-                "unit": "Bn €",
-                "note": "No filters applied - raw totals from uploaded files"
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur création tableau totaux: {e}")
-        return {
-            "title": "Global LCR Totals - Error",
-            "error": str(e)
-        }
-
-def create_si_remettant_bar(dataframes):
-    """
-    Crée les données pour le graphique en barre horizontale des SI Remettant
-    Filtre: SI Remettant IN ('AJUST AJUSTGAP', 'AJUST SUMMIT', 'AJUST SUMMIT_TITRES')
-    """
-    try:
-        logger.info("📊 Création des données SI Remettant Bar")
-        
-        si_results = {}
-        
-        for file_type, df in dataframes.items():
-            logger.info(f"📄 Traitement SI Remettant pour {file_type}")
-            
-            if "SI Remettant" not in df.columns or "LCR_Assiette Pondérée" not in df.columns:
-                logger.warning(f"⚠️ Colonnes manquantes pour {file_type}")
-                continue
-            
-            # Filtrage
-            df_filtered = df[df["Top Conso"] == "O"].copy()
-            allowed_si = ['AJUST AJUSTGAP', 'AJUST SUMMIT', 'AJUST SUMMIT_TITRES']
-            df_filtered = df_filtered[df_filtered["SI Remettant"].isin(allowed_si)].copy()
-            
-            logger.info(f"📋 Après filtrage SI Remettant: {len(df_filtered)} lignes")
-            
-            if len(df_filtered) == 0:
-                continue
-            
-            # Conversion numérique
-            df_filtered["LCR_Assiette Pondérée"] = pd.to_numeric(
-                df_filtered["LCR_Assiette Pondérée"], errors='coerce'
-            ).fillna(0)
-            
-            # Grouper par SI Remettant
-            grouped = df_filtered.groupby("SI Remettant")["LCR_Assiette Pondérée"].sum().reset_index()
-            grouped["LCR_Assiette_Bn"] = (grouped["LCR_Assiette Pondérée"] / 1_000_000_000).round(3)
-            
-            si_results[file_type] = [
-                {
-                    "si_remettant": str(row["SI Remettant"]),
-                    "value": float(row["LCR_Assiette_Bn"])
-                }
-                for _, row in grouped.iterrows()
-            ]
-            
-            logger.info(f"✅ SI Remettant {file_type}: {len(grouped)} valeurs")
-        
-        return {
-            "title": "SI Remettant Distribution",
-            "data": si_results,
-            "metadata": {
-                "analysis_date": datetime.now().isoformat(),
-                "allowed_values": allowed_si,
-                "unit": "Bn €"
-            }
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur création SI Remettant bar: {e}")
-        return {
-            "title": "SI Remettant Distribution - Error",
-            "error": str(e)
-        }
-    
-
 # ========================== FONCTIONS CONTEXTE CHATBOT ===========================
 
 
@@ -2475,9 +1916,36 @@ def prepare_analysis_context() -> str:
                                     group_name = res_item.get("lcr_eco_groupe_metiers", "N/A")
                                     context_parts.append(f"- {group_name}")
         
+        # Variations D vs D-1 vs M-1 (all comparable tables)
+        variations = data.get("variations")
+        if variations and isinstance(variations, dict) and not variations.get("error"):
+            context_parts.append("\n=== VARIATIONS D vs D-1 vs M-1 ===")
+            context_parts.append("Per table: totals, then the largest daily moves (variation, % vs reference)")
+
+            var_data = variations.get("data")
+            if var_data and isinstance(var_data, dict):
+                for table_name, table_var in var_data.items():
+                    if not isinstance(table_var, dict):
+                        continue
+                    totals = table_var.get("totals", {})
+                    unit = table_var.get("unit", "")
+                    context_parts.append(
+                        f"\n{table_name}: D={totals.get('value_j', 0):.3f} {unit}, "
+                        f"daily={totals.get('variation_daily', 0):+.3f}, monthly={totals.get('variation_monthly', 0):+.3f}"
+                    )
+                    rows = table_var.get("rows", [])
+                    keys = table_var.get("keys", [])
+                    top_rows = sorted(rows, key=lambda row: abs(row.get("variation_daily") or 0), reverse=True)[:3]
+                    for row in top_rows:
+                        label = " / ".join(str(row.get(key, "")) for key in keys)
+                        pct = row.get("variation_daily_pct")
+                        pct_text = f" ({pct:+.1%})" if pct is not None else ""
+                        context_parts.append(f"- {label}: daily {row.get('variation_daily', 0):+.3f}{pct_text}")
+
         # Source files information
         raw_df_info = data.get("raw_dataframes_info")
         if raw_df_info and isinstance(raw_df_info, dict):
+            chatbot_sample_data(raw_df_info)
             context_parts.append("\n=== SOURCE FILES INFORMATION ===")
             for file_type, info in raw_df_info.items():
                 if isinstance(info, dict):
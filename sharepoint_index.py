@@ -0,0 +1,164 @@
+# sharepoint_index.py
+"""
+Index du dossier SharePoint des fichiers sources
+================================================
+
+Le listing de ALM_Metrics/sources est conservé en mémoire sous forme
+d'index (préfixe de flux, date métier) -> nom de fichier, avec une durée
+de validité. Résoudre les fichiers d'une date devient une lecture de
+dictionnaire ; SharePoint n'est relisté qu'à l'expiration du TTL ou sur
+rafraîchissement explicite.
+
+Les noms de fichiers suivent le format {PREFIXE}_{AAAAMMJJ}xxxx.csv,
+ex: D_PA_202509150630.csv (quotidien), M_PA_20250815xxxx.csv (mensuel).
+"""
+
+import calendar
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+SOURCES_PATH = "ALM_Metrics/sources"
+DAILY_PREFIX = "D_PA"
+MONTHLY_PREFIX = "M_PA"
+
+# Durée de validité du listing (secondes)
+LISTING_TTL_SECONDS = 300
+# Âge minimal du listing avant un rafraîchissement déclenché par un fichier manquant
+MISS_REFRESH_MIN_AGE_SECONDS = 30
+
+SOURCE_FILE_PATTERN = re.compile(r"^([A-Z]+_PA)_(\d{8}).*\.csv$")
+
+
+def compute_source_dates(date_obj: datetime):
+    """
+    Dates des trois fichiers d'une analyse pour la date sélectionnée.
+    Retourne (j_minus_1_date, j_date, m_minus_1_date) au format AAAAMMJJ :
+    - J-1 porte la date sélectionnée
+    - J porte la date + 1
+    - M-1 porte le même jour du mois précédent (dernier jour du mois si
+      ce jour n'existe pas, ex: 31/03 -> 28/02)
+    """
+    j_minus_1_date = date_obj
+    j_date = date_obj + timedelta(days=1)
+
+    target_month = date_obj.month - 1 if date_obj.month > 1 else 12
+    target_year = date_obj.year if date_obj.month > 1 else date_obj.year - 1
+    last_day = calendar.monthrange(target_year, target_month)[1]
+    m_minus_1_date = date_obj.replace(year=target_year, month=target_month,
+                                      day=min(date_obj.day, last_day))
+
+    return (j_minus_1_date.strftime("%Y%m%d"),
+            j_date.strftime("%Y%m%d"),
+            m_minus_1_date.strftime("%Y%m%d"))
+
+
+class SharePointListingIndex:
+    """Listing indexé d'un dossier SharePoint, rafraîchi par TTL"""
+
+    def __init__(self, client_factory, base_path: str = SOURCES_PATH,
+                 ttl_seconds: int = LISTING_TTL_SECONDS):
+        self.client_factory = client_factory
+        self.base_path = base_path
+        self.ttl_seconds = ttl_seconds
+        self._index = {}  # (prefixe, date AAAAMMJJ) -> nom de fichier
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    def _build_index(self, filenames):
+        index = {}
+        for filename in filenames:
+            match = SOURCE_FILE_PATTERN.match(filename)
+            if not match:
+                continue
+            key = (match.group(1), match.group(2))
+            # Plusieurs extractions le même jour : on garde la plus récente
+            if key not in index or filename > index[key]:
+                index[key] = filename
+        return index
+
+    def refresh(self):
+        """Relit le dossier SharePoint et reconstruit l'index"""
+        with self._lock:
+            started = time.perf_counter()
+            filenames = self.client_factory().list_files_in_path(self.base_path)
+            self._index = self._build_index(filenames)
+            self._refreshed_at = time.monotonic()
+            logger.info(f"Index SharePoint: {len(self._index)} fichiers indexés "
+                        f"sur {len(filenames)} en {time.perf_counter() - started:.2f}s")
+
+    def age_seconds(self) -> float:
+        if self._refreshed_at is None:
+            return float("inf")
+        return time.monotonic() - self._refreshed_at
+
+    def is_stale(self) -> bool:
+        return self.age_seconds() > self.ttl_seconds
+
+    def ensure_fresh(self):
+        if self.is_stale():
+            self.refresh()
+
+    def resolve(self, prefix: str, date_str: str):
+        """Nom du fichier pour (préfixe, date AAAAMMJJ), ou None"""
+        self.ensure_fresh()
+        return self._index.get((prefix, date_str))
+
+    def resolve_analysis_files(self, date_obj: datetime, refresh_on_miss: bool = True):
+        """
+        Fichiers J, J-1 et M-1 pour la date sélectionnée.
+        Retourne (files, missing) : files = {"j", "jMinus1", "mMinus1"} -> nom
+        (None si absent), missing = motifs des fichiers introuvables.
+        refresh_on_miss: si un fichier manque, relister une fois (les fichiers
+        du jour ont pu arriver depuis le dernier listing)
+        """
+        j_minus_1_date_str, j_date_str, m_minus_1_date_str = compute_source_dates(date_obj)
+        wanted = [
+            ("jMinus1", DAILY_PREFIX, j_minus_1_date_str, "J-1 data"),
+            ("j", DAILY_PREFIX, j_date_str, "J data"),
+            ("mMinus1", MONTHLY_PREFIX, m_minus_1_date_str, "M-1 data"),
+        ]
+
+        files = {}
+        missing = []
+        for file_type, prefix, date_str, label in wanted:
+            files[file_type] = self.resolve(prefix, date_str)
+            if files[file_type] is None:
+                missing.append(f"{prefix}_{date_str}xxxx.csv (for {label})")
+
+        if missing and refresh_on_miss and self.age_seconds() > MISS_REFRESH_MIN_AGE_SECONDS:
+            self.refresh()
+            return self.resolve_analysis_files(date_obj, refresh_on_miss=False)
+        return files, missing
+
+    def available_dates(self):
+        """
+        Dates sélectionnables (format AAAA-MM-JJ, triées) : celles pour
+        lesquelles les trois fichiers J, J-1 et M-1 sont présents
+        """
+        self.ensure_fresh()
+        index = self._index
+
+        dates = []
+        for prefix, date_str in index:
+            if prefix != DAILY_PREFIX:
+                continue
+            date_obj = datetime.strptime(date_str, "%Y%m%d")
+            j_minus_1_date_str, j_date_str, m_minus_1_date_str = compute_source_dates(date_obj)
+            if ((DAILY_PREFIX, j_date_str) in index
+                    and (MONTHLY_PREFIX, m_minus_1_date_str) in index):
+                dates.append(date_obj.strftime("%Y-%m-%d"))
+        return sorted(dates)
+
+    def status(self):
+        age = None if self._refreshed_at is None else round(self.age_seconds(), 1)
+        return {
+            "base_path": self.base_path,
+            "indexed_files": len(self._index),
+            "age_seconds": age,
+            "ttl_seconds": self.ttl_seconds,
+        }
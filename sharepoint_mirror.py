@@ -0,0 +1,177 @@
+# sharepoint_mirror.py
+"""
+Miroir local des fichiers sources SharePoint
+============================================
+
+Chaque fichier lu depuis ALM_Metrics/sources est conservé sous
+data/sharepoint_mirror avec ses métadonnées distantes (taille, date de
+modification, ETag). À la lecture suivante, les métadonnées SharePoint
+sont comparées à celles du miroir : un fichier inchangé est servi depuis
+le disque local au lieu d'être retéléchargé.
+
+Si le client ne fournit pas de métadonnées (pas de get_file_metadata),
+la copie locale est considérée valide : les extractions D_PA / M_PA sont
+horodatées dans leur nom et ne sont pas réécrites.
+
+L'éviction est de type LRU sur la taille totale du miroir (la date de
+modification des fichiers sert d'horodatage d'accès).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MIRROR_DIR = Path("data/sharepoint_mirror")
+MIRROR_MAX_BYTES = 5 * 1024 * 1024 * 1024  # 5 Go
+
+# Copie locale servie sans vérification si SharePoint ne donne pas de métadonnées
+MIRROR_TRUST_UNVERIFIED = True
+
+META_SUFFIX = ".meta.json"
+
+
+class SharePointMirror:
+    """Miroir disque des fichiers lus depuis SharePoint"""
+
+    def __init__(self, mirror_dir: Path = MIRROR_DIR, max_bytes: int = MIRROR_MAX_BYTES):
+        self.mirror_dir = Path(mirror_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _local_path(self, remote_path: str) -> Path:
+        key = hashlib.sha1(remote_path.encode("utf-8")).hexdigest()[:16]
+        return self.mirror_dir / f"{key}_{Path(remote_path).name}"
+
+    @staticmethod
+    def _meta_path(local_path: Path) -> Path:
+        return local_path.with_name(local_path.name + META_SUFFIX)
+
+    @staticmethod
+    def _remote_metadata(client, remote_path: str):
+        get_metadata = getattr(client, "get_file_metadata", None)
+        if get_metadata is None:
+            return None
+        try:
+            return get_metadata(remote_path)
+        except Exception as e:
+            logger.warning(f"Métadonnées indisponibles pour {remote_path}: {e}")
+            return None
+
+    @staticmethod
+    def _is_current(local_meta: dict, remote_meta: dict) -> bool:
+        """ETag si disponible des deux côtés, sinon taille + date de modification"""
+        if local_meta.get("etag") and remote_meta.get("etag"):
+            return local_meta["etag"] == remote_meta["etag"]
+        return (local_meta.get("size") == remote_meta.get("size")
+                and local_meta.get("last_modified") == remote_meta.get("last_modified"))
+
+    def _read_local(self, local_path: Path, remote_meta):
+        meta_path = self._meta_path(local_path)
+        if not local_path.exists() or not meta_path.exists():
+            return None
+
+        try:
+            local_meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+        if remote_meta is None:
+            if not MIRROR_TRUST_UNVERIFIED:
+                return None
+        elif not self._is_current(local_meta, remote_meta):
+            return None
+
+        try:
+            content = local_path.read_bytes()
+        except FileNotFoundError:  # évincé entre-temps
+            return None
+        if len(content) != local_meta.get("size", len(content)):
+            return None
+
+        # Rafraîchir l'horodatage LRU
+        os.utime(local_path)
+        return content
+
+    def _store(self, local_path: Path, content: bytes, remote_meta):
+        try:
+            self.mirror_dir.mkdir(parents=True, exist_ok=True)
+            meta = dict(remote_meta or {})
+            meta["size"] = len(content)
+            meta["mirrored_at"] = datetime.now().isoformat()
+
+            # Écriture atomique : fichier temporaire puis renommage
+            suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+            tmp_path = local_path.with_name(local_path.name + suffix)
+            tmp_path.write_bytes(content)
+            os.replace(tmp_path, local_path)
+
+            tmp_meta = self._meta_path(local_path).with_name(self._meta_path(local_path).name + suffix)
+            tmp_meta.write_text(json.dumps(meta, default=str), encoding="utf-8")
+            os.replace(tmp_meta, self._meta_path(local_path))
+
+        except Exception as e:
+            logger.warning(f"Impossible de copier {local_path.name} dans le miroir: {e}")
+            return
+
+        self.evict_if_needed()
+
+    def read(self, client, remote_path: str) -> bytes:
+        """Contenu du fichier, depuis le miroir s'il est à jour, sinon depuis client"""
+        local_path = self._local_path(remote_path)
+        remote_meta = self._remote_metadata(client, remote_path)
+
+        content = self._read_local(local_path, remote_meta)
+        if content is not None:
+            logger.info(f"Miroir SharePoint: {Path(remote_path).name} servi en local")
+            return content
+
+        content = client.read_binary_file(remote_path)
+        self._store(local_path, content, remote_meta)
+        logger.info(f"Miroir SharePoint: {Path(remote_path).name} téléchargé ({len(content) / 1024 / 1024:.1f} MB)")
+        return content
+
+    def evict_if_needed(self):
+        """Supprime les fichiers les moins récemment lus au-delà de max_bytes"""
+        with self._lock:
+            if not self.mirror_dir.exists():
+                return
+
+            entries = []
+            for path in self.mirror_dir.iterdir():
+                if path.name.endswith(META_SUFFIX) or path.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                self._meta_path(path).unlink(missing_ok=True)
+                total -= size
+                logger.info(f"Miroir SharePoint: éviction de {path.name}")
+
+
+class MirroredSharePointClient:
+    """Client SharePoint dont read_binary_file passe par le miroir local"""
+
+    def __init__(self, client, mirror: SharePointMirror):
+        self.client = client
+        self.mirror = mirror
+
+    def read_binary_file(self, path: str) -> bytes:
+        return self.mirror.read(self.client, path)
+
+    def __getattr__(self, name):
+        # list_files_in_path, save_dataframe_in_sharepoint, ... : client d'origine
+        return getattr(self.client, name)
@@ -12,6 +12,9 @@
 
 let filesReady = { j: false, j1: false, m1: false };
 let chatMessages = [];
+const DRILLDOWN_PAGE_SIZE = 50; // clients chargés par clic sur "Show more"
+let lastAnalysis = null; // { etag, result } de la dernière analyse reçue
+let availableDates = new Set();
 
 
 // ================================= INITIALISATION  =================================
@@ -258,7 +261,12 @@ async function uploadFile(file, type) {
         clearTimeout(timeoutId);
         
         if (response.ok) {
-            const result = await response.json();
+            let result = await response.json();
+            
+            // Le serveur parse le fichier en arrière-plan : suivre le job
+            if (result.job_id) {
+                result = await waitForIngestion(result.job_id, statusDiv, file);
+            }
             console.log(`✅ Upload ${type} réussi:`, result);
             
             // Mise à jour du statut
@@ -347,6 +355,41 @@ function initializeDateSelection() {
     } else {
         console.error('❌ analysisDate input not found!'); // Debug
     }
+    
+    loadAvailableDates();
+}
+
+/**
+ * Récupère les dates disponibles sur SharePoint pour borner le sélecteur
+ */
+async function loadAvailableDates() {
+    const dateInput = document.getElementById('analysisDate');
+    if (!dateInput) return;
+    
+    try {
+        const response = await fetch('/api/available-dates');
+        if (!response.ok) return;  // Endpoint absent ou SharePoint indisponible
+        
+        const result = await response.json();
+        availableDates = new Set(result.dates);
+        if (result.dates.length === 0) return;
+        
+        dateInput.min = result.dates[0];
+        dateInput.max = result.dates[result.dates.length - 1];
+        if (!availableDates.has(dateInput.value)) {
+            dateInput.value = dateInput.max;
+        }
+        
+        dateInput.addEventListener('change', () => {
+            if (dateInput.value && !availableDates.has(dateInput.value)) {
+                showNotification(`No complete file set on SharePoint for ${dateInput.value}`, 'warning');
+            }
+        });
+        console.log(`✅ ${result.dates.length} available dates`);
+        
+    } catch (error) {
+        console.warn('Available dates not loaded:', error);
+    }
 }
 
 async function loadFilesByDate() {
@@ -403,6 +446,7 @@ async function loadFilesByDate() {
                             <small class="text-muted">
                                 ${result.files.j.rows.toLocaleString()} rows • 
                                 ${result.files.j.columns} columns
+                                ${result.files.j.timings ? `• ${result.files.j.timings.total_seconds}s` : ''}
                             </small>
                         </div>
                         <span class="badge bg-success">OK</span>
@@ -422,6 +466,7 @@ async function loadFilesByDate() {
                             <small class="text-muted">
                                 ${result.files.jMinus1.rows.toLocaleString()} rows • 
                                 ${result.files.jMinus1.columns} columns
+                                ${result.files.jMinus1.timings ? `• ${result.files.jMinus1.timings.total_seconds}s` : ''}
                             </small>
                         </div>
                         <span class="badge bg-success">OK</span>
@@ -441,6 +486,7 @@ async function loadFilesByDate() {
                             <small class="text-muted">
                                 ${result.files.mMinus1.rows.toLocaleString()} rows • 
                                 ${result.files.mMinus1.columns} columns
+                                ${result.files.mMinus1.timings ? `• ${result.files.mMinus1.timings.total_seconds}s` : ''}
                             </small>
                         </div>
                         <span class="badge bg-success">OK</span>
@@ -454,7 +500,8 @@ async function loadFilesByDate() {
             filesReady.m1 = true;
             checkAnalyzeButtonState();
             
-            showNotification(`Three files loaded for ${selectedDate}`, 'success');
+            const elapsed = result.elapsed_seconds !== undefined ? ` in ${result.elapsed_seconds}s` : '';
+            showNotification(`Three files loaded for ${selectedDate}${elapsed}`, 'success');
             
         } else {
             const errorData = await response.json();
@@ -485,6 +532,41 @@ async function loadFilesByDate() {
     }
 }
 
+/**
+ * Suit un job d'ingestion jusqu'à la fin et retourne son résultat
+ */
+async function waitForIngestion(jobId, statusDiv, file) {
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        
+        const response = await fetch(`/api/ingest-status/${jobId}`);
+        if (!response.ok) {
+            throw new Error(`Erreur HTTP ${response.status}`);
+        }
+        const status = await response.json();
+        
+        if (status.status === 'done') {
+            return status.result;
+        }
+        if (status.status === 'error') {
+            throw new Error(status.error || 'Erreur de traitement');
+        }
+        
+        const percent = status.file_size ? Math.min(100, Math.round(status.bytes_read / status.file_size * 100)) : 0;
+        statusDiv.innerHTML = `
+            <div class="alert alert-info fade-in-up">
+                <div class="d-flex align-items-center">
+                    <div class="spinner-border spinner-border-sm me-3"></div>
+                    <div>
+                        <strong>Processing... ${percent}%</strong><br>
+                        <small>${file.name} • ${status.rows_kept.toLocaleString()} rows kept • ${status.elapsed_seconds}s</small>
+                    </div>
+                </div>
+            </div>
+        `;
+    }
+}
+
 /**
  * Vérifie l'état du bouton d'analyse
  */
@@ -536,9 +618,292 @@ async function cleanupMemory() {
 // ================================= GESTION ANALYSE =================================
 
 /**
- * Lance l'analyse des fichiers
+ * Reconstruit les objets d'un contenu au format compact (?format=compact) :
+ * colonnes {"$rows", "$columns"} -> liste de lignes, {"$labels"} -> libellés partagés
+ * @param {Object} payload - { format: 'compact', labels, data }
+ * @returns {*} Contenu au format JSON habituel
+ */
+function decodeCompact(payload) {
+    // Contenu JSON habituel (serveur sans format compact, ex. run.py) : inchangé
+    if (!payload || payload.format !== 'compact') return payload;
+    const labels = payload.labels;
+
+    const decodeColumn = (column) => {
+        if (Array.isArray(column)) return column.map(decodeValue);
+        if ('$labels' in column) return column.$labels.map(id => (id === null ? null : labels[id]));
+        return decodeRows(column);
+    };
+
+    const decodeRows = (table) => {
+        const rows = Array.from({ length: table.$rows }, () => ({}));
+        for (const [key, column] of Object.entries(table.$columns)) {
+            decodeColumn(column).forEach((value, i) => { rows[i][key] = value; });
+        }
+        return rows;
+    };
+
+    const decodeValue = (value) => {
+        if (Array.isArray(value)) return value.map(decodeValue);
+        if (value === null || typeof value !== 'object') return value;
+        if ('$columns' in value) return decodeRows(value);
+        const decoded = {};
+        for (const [key, item] of Object.entries(value)) decoded[key] = decodeValue(item);
+        return decoded;
+    };
+
+    return decodeValue(payload.data);
+}
+
+/**
+ * Lance l'analyse des fichiers en tâche de fond et affiche chaque tableau
+ * dès qu'il est calculé (Server-Sent Events). Repli sur analyzeStream si le
+ * serveur ne propose pas les jobs d'analyse.
  */
 async function analyze() {
+    if (!window.EventSource) {
+        return analyzeStream();
+    }
+    console.log('🔍 Lancement de l\'analyse TCD (tâche de fond)');
+    showAnalysisProgress(0, null);
+
+    let job;
+    try {
+        const response = await fetch('/api/analyze-jobs', { method: 'POST' });
+        if (response.status === 404 || response.status === 405) {
+            // Serveur sans jobs d'analyse
+            return analyzeStream();
+        }
+        if (!response.ok) {
+            const errorText = await response.text();
+            throw new Error(`Erreur serveur ${response.status}: ${errorText}`);
+        }
+        job = await response.json();
+    } catch (error) {
+        console.error('❌ Erreur analyse:', error);
+        showAnalysisError(error);
+        return;
+    }
+
+    const partialResults = {};
+    const source = new EventSource(`/api/analyze-jobs/${job.job_id}/events?format=compact`);
+    let finished = false;
+
+    source.addEventListener('table', (e) => {
+        const event = JSON.parse(e.data);
+        partialResults[event.name] = decodeCompact(event.table);
+        console.log(`📊 Tableau reçu: ${event.name}`);
+        renderPartialResults(partialResults, job.tables.length);
+    });
+
+    source.addEventListener('done', async (e) => {
+        finished = true;
+        source.close();
+        const event = JSON.parse(e.data);
+        const result = { ...event, results: partialResults };
+        lastAnalysis = event.etag ? { etag: event.etag, result } : null;
+        await onAnalysisResults(result);
+    });
+
+    source.addEventListener('failed', (e) => {
+        finished = true;
+        source.close();
+        const event = JSON.parse(e.data);
+        showAnalysisError(new Error(event.error || 'Erreur dans l\'analyse'));
+    });
+
+    source.onerror = () => {
+        // Le navigateur se reconnecte seul (reprise par Last-Event-ID) tant que le flux n'est pas fermé
+        if (!finished && source.readyState === EventSource.CLOSED) {
+            showAnalysisError(new Error('Flux d\'analyse interrompu'));
+        }
+    };
+}
+
+/**
+ * Barre d'avancement de l'analyse
+ * @param {number} done - Tableaux calculés
+ * @param {number|null} total - Tableaux attendus (inconnu au lancement)
+ */
+function analysisProgressHTML(done, total) {
+    const percent = total ? Math.round(100 * done / total) : 100;
+    const label = total ? `Generating analyses... (${done}/${total} tables)` : 'Generating analyses...';
+    return `
+        <div class="analysis-section fade-in-up" id="analysis-progress">
+            <div class="card border-0">
+                <div class="card-body text-center py-4">
+                    <div class="spinner-border text-primary mb-3" style="width: 3rem; height: 3rem;"></div>
+                    <h4 class="text-primary">${label}</h4>
+                    <div class="progress mt-3" style="height: 6px;">
+                        <div class="progress-bar progress-bar-striped progress-bar-animated" 
+                             style="width: ${percent}%"></div>
+                    </div>
+                </div>
+            </div>
+        </div>
+    `;
+}
+
+function showAnalysisProgress(done, total) {
+    document.getElementById('results').innerHTML = analysisProgressHTML(done, total);
+}
+
+/**
+ * Affiche les tableaux déjà reçus sous la barre d'avancement
+ * @param {Object} partialResults - Tableaux reçus, par nom
+ * @param {number} total - Nombre de tableaux attendus
+ */
+function renderPartialResults(partialResults, total) {
+    const done = Object.keys(partialResults).length;
+    document.getElementById('results').innerHTML =
+        analysisProgressHTML(done, total) + generateResultsHTML(partialResults);
+}
+
+/**
+ * Suite commune des deux modes d'analyse : affichage final et chatbot
+ * @param {Object} result - Réponse d'analyse ({success, context_ready, results})
+ */
+async function onAnalysisResults(result) {
+    if (result.success) {
+        // Attendre que l'affichage soit complètement terminé
+        await displayCompleteResults(result.results);
+
+        // AFFICHER L'INDICATEUR DE CHARGEMENT CONTEXTE
+        document.getElementById('context-loading').style.display = 'block';
+
+        // Vérifier que le contexte est prêt côté serveur
+        if (result.context_ready) {
+            showNotification('Analyses successfully completed!', 'success');
+
+            // Double vérification avec un petit délai pour l'effet visuel
+            setTimeout(async () => {
+                const contextStatus = await verifyContextReady();
+
+                // MASQUER L'INDICATEUR DE CHARGEMENT
+                document.getElementById('context-loading').style.display = 'none';
+
+                if (contextStatus) {
+                    console.log('✅ Contexte vérifié, affichage du chatbot');
+                    showNotification('AI Assistant ready!', 'success');
+                    showChatbot();
+                } else {
+                    console.warn('⚠️ Contexte pas encore prêt');
+                    showNotification('AI Assistant loading...', 'info');
+                    setTimeout(() => {
+                        document.getElementById('context-loading').style.display = 'none';
+                        showChatbot();
+                    }, 1000);
+                }
+            }, 1000); // Délai pour montrer le chargement
+        } else {
+            // Fallback
+            showNotification('Analysis completed, preparing chatbot...', 'info');
+            setTimeout(() => {
+                document.getElementById('context-loading').style.display = 'none';
+                showChatbot();
+            }, 3000);
+        }
+    } else {
+        throw new Error(result.message || 'Erreur dans l\'analyse');
+    }
+}
+
+/**
+ * Affiche une erreur d'analyse
+ * @param {Error} error
+ */
+function showAnalysisError(error) {
+    // MASQUER L'INDICATEUR EN CAS D'ERREUR
+    document.getElementById('context-loading').style.display = 'none';
+
+    document.getElementById('results').innerHTML = `
+        <div class="analysis-section fade-in-up">
+            <div class="alert alert-danger">
+                <div class="d-flex align-items-center">
+                    <i class="fas fa-exclamation-triangle fa-2x me-3"></i>
+                    <div>
+                        <h5 class="mb-1">Erreur lors de l'analyse</h5>
+                        <p class="mb-0">${error.message}</p>
+                    </div>
+                </div>
+            </div>
+        </div>
+    `;
+
+    showNotification('Erreur lors de l\'analyse', 'error');
+}
+
+/**
+ * Lance l'analyse en une requête dont la réponse NDJSON livre chaque tableau
+ * dès qu'il est calculé (une ligne JSON par enregistrement). Repli sur
+ * analyzeSync si le serveur ne propose pas le flux.
+ */
+async function analyzeStream() {
+    console.log('🔍 Lancement de l\'analyse TCD (flux NDJSON)');
+    showAnalysisProgress(0, null);
+
+    try {
+        const response = await fetch('/api/analyze-stream?format=compact', {
+            method: 'POST',
+            headers: { 'Accept': 'application/x-ndjson' }
+        });
+        if (response.status === 404 || response.status === 405) {
+            // Serveur sans flux d'analyse
+            return analyzeSync();
+        }
+        if (!response.ok) {
+            const errorText = await response.text();
+            throw new Error(`Erreur serveur ${response.status}: ${errorText}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        const partialResults = {};
+        let tableNames = [];
+        let doneRecord = null;
+        let buffer = '';
+
+        for (;;) {
+            const { value, done } = await reader.read();
+            buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+
+            // Dernier élément : ligne incomplète, complétée par le morceau suivant
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+
+            for (const line of lines) {
+                if (!line.trim()) continue;
+                const record = JSON.parse(line);
+                if (record.type === 'started') {
+                    tableNames = record.tables;
+                } else if (record.type === 'table') {
+                    partialResults[record.name] = decodeCompact(record.table);
+                    console.log(`📊 Tableau reçu: ${record.name}`);
+                    renderPartialResults(partialResults, tableNames.length);
+                } else if (record.type === 'done') {
+                    doneRecord = record;
+                } else if (record.type === 'failed') {
+                    throw new Error(record.error || 'Erreur dans l\'analyse');
+                }
+            }
+            if (done) break;
+        }
+
+        if (!doneRecord) {
+            throw new Error('Flux d\'analyse interrompu');
+        }
+        const result = { ...doneRecord, results: partialResults };
+        lastAnalysis = doneRecord.etag ? { etag: doneRecord.etag, result } : null;
+        await onAnalysisResults(result);
+    } catch (error) {
+        console.error('❌ Erreur analyse:', error);
+        showAnalysisError(error);
+    }
+}
+
+/**
+ * Lance l'analyse des fichiers en une seule requête
+ */
+async function analyzeSync() {
     console.log('🔍 Lancement de l\'analyse TCD');
     
     // Affichage du statut d'analyse
@@ -561,59 +926,29 @@ async function analyze() {
         const controller = new AbortController();
         const timeoutId = setTimeout(() => controller.abort(), 600000);
 
-        const response = await fetch('/api/analyze', { 
+        const response = await fetch('/api/analyze?format=compact', { 
             method: 'POST',
+            headers: lastAnalysis ? { 'If-None-Match': lastAnalysis.etag } : {},
             signal: controller.signal 
         });
         
         clearTimeout(timeoutId);
         
-        if (response.ok) {
-            const result = await response.json();
+        let result = null;
+        if (response.status === 304 && lastAnalysis) {
+            // Mêmes fichiers, mêmes tableaux : résultat déjà reçu
+            result = lastAnalysis.result;
+        } else if (response.ok) {
+            result = await response.json();
+            result.results = decodeCompact(result.results);
+            const etag = response.headers.get('ETag');
+            lastAnalysis = etag ? { etag, result } : null;
+        }
+
+        if (result) {
             console.log('📊 Résultats de l\'analyse:', result);
             
-            if (result.success) {
-                // Attendre que l'affichage soit complètement terminé
-                await displayCompleteResults(result.results);
-                
-                // AFFICHER L'INDICATEUR DE CHARGEMENT CONTEXTE
-                document.getElementById('context-loading').style.display = 'block';
-                
-                // Vérifier que le contexte est prêt côté serveur
-                if (result.context_ready) {
-                    showNotification('Analyses successfully completed!', 'success');
-                    
-                    // Double vérification avec un petit délai pour l'effet visuel
-                    setTimeout(async () => {
-                        const contextStatus = await verifyContextReady();
-                        
-                        // MASQUER L'INDICATEUR DE CHARGEMENT
-                        document.getElementById('context-loading').style.display = 'none';
-                        
-                        if (contextStatus) {
-                            console.log('✅ Contexte vérifié, affichage du chatbot');
-                            showNotification('AI Assistant ready!', 'success');
-                            showChatbot();
-                        } else {
-                            console.warn('⚠️ Contexte pas encore prêt');
-                            showNotification('AI Assistant loading...', 'info');
-                            setTimeout(() => {
-                                document.getElementById('context-loading').style.display = 'none';
-                                showChatbot();
-                            }, 1000);
-                        }
-                    }, 1000); // Délai pour montrer le chargement
-                } else {
-                    // Fallback
-                    showNotification('Analysis completed, preparing chatbot...', 'info');
-                    setTimeout(() => {
-                        document.getElementById('context-loading').style.display = 'none';
-                        showChatbot();
-                    }, 3000);
-                }
-            } else {
-                throw new Error(result.message || 'Erreur dans l\'analyse');
-            }
+            await onAnalysisResults(result);
 
         } else {
             const errorText = await response.text();
@@ -622,24 +957,7 @@ async function analyze() {
     } catch (error) {
         console.error('❌ Erreur analyse:', error);
         
-        // MASQUER L'INDICATEUR EN CAS D'ERREUR
-        document.getElementById('context-loading').style.display = 'none';
-        
-        document.getElementById('results').innerHTML = `
-            <div class="analysis-section fade-in-up">
-                <div class="alert alert-danger">
-                    <div class="d-flex align-items-center">
-                        <i class="fas fa-exclamation-triangle fa-2x me-3"></i>
-                        <div>
-                            <h5 class="mb-1">Erreur lors de l'analyse</h5>
-                            <p class="mb-0">${error.message}</p>
-                        </div>
-                    </div>
-                </div>
-            </div>
-        `;
-        
-        showNotification('Erreur lors de l\'analyse', 'error');
+        showAnalysisError(error);
     }
 }
 
@@ -677,124 +995,132 @@ function displayCompleteResults(analysisResults) {
             return;
         }
         
-        let html = '';
+        document.getElementById('results').innerHTML = generateResultsHTML(analysisResults);
 
-        if (analysisResults.simple_totals) {
-            html += '<div class="analysis-section fade-in-up">';
-            html += '<div class="row">';
-            html += '<div class="col-12">';
-            html += generateSimpleTotalsSection(analysisResults.simple_totals);
-            html += '</div>';
-            html += '</div>';
-            html += '</div>';
-        }
+        // Attendre que le DOM soit à jour avant de charger l'historique
+        setTimeout(() => {
+            resolve();
+        }, 100);
 
-        // Section SI Remettant Bar juste après les totaux
-        if (analysisResults.si_remettant) {
-            html += '<div class="analysis-section fade-in-up">';
-            html += '<div class="row">';
-            html += '<div class="col-12">';
-            html += generateSiRemettantBar(analysisResults.si_remettant);
-            html += '</div>';
-            html += '</div>';
-            html += '</div>';
-        }
-        
-        // Section avec BUFFER/Summary à gauche et Consumption & Resources à droite
+        // Charger l'historique après un délai plus long
+        setTimeout(() => {
+            loadHistoricalTables();
+        }, 800);
+    });
+}
+
+/**
+ * Génère le HTML des résultats (tableaux absents ignorés)
+ * @param {Object} analysisResults - Résultats de l'analyse, complets ou partiels
+ */
+function generateResultsHTML(analysisResults) {
+    let html = '';
+
+    if (analysisResults.simple_totals) {
         html += '<div class="analysis-section fade-in-up">';
         html += '<div class="row">';
+        html += '<div class="col-12">';
+        html += generateSimpleTotalsSection(analysisResults.simple_totals);
+        html += '</div>';
+        html += '</div>';
+        html += '</div>';
+    }
+
+    // Section SI Remettant Bar juste après les totaux
+    if (analysisResults.si_remettant) {
+        html += '<div class="analysis-section fade-in-up">';
+        html += '<div class="row">';
+        html += '<div class="col-12">';
+        html += generateSiRemettantBar(analysisResults.si_remettant);
+        html += '</div>';
+        html += '</div>';
+        html += '</div>';
+    }
+    
+    // Section avec BUFFER/Summary à gauche et Consumption & Resources à droite
+    html += '<div class="analysis-section fade-in-up">';
+    html += '<div class="row">';
+    
+    // Colonne gauche : BUFFER + Summary
+    if (analysisResults.buffer) {
+        html += '<div class="col-lg-6">';
+        html += generateBufferSection(analysisResults.buffer);
         
-        // Colonne gauche : BUFFER + Summary
-        if (analysisResults.buffer) {
-            html += '<div class="col-lg-6">';
-            html += generateBufferSection(analysisResults.buffer);
-            
-            // Tableau de synthèse juste en dessous du BUFFER (sans titre)
-            if (analysisResults.summary) {
-                html += '<div class="mt-3">';
-                html += generateSummarySection(analysisResults.summary);
-                html += '</div>';
-            }
-            
+        // Tableau de synthèse juste en dessous du BUFFER (sans titre)
+        if (analysisResults.summary) {
+            html += '<div class="mt-3">';
+            html += generateSummarySection(analysisResults.summary);
             html += '</div>';
         }
         
-        // Colonne droite : Consumption & Resources avec analyse IA
-        html += '<div class="col-lg-6">';
-        html += generateConsumptionResourcesBlockSection(analysisResults);
         html += '</div>';
-        
+    }
+    
+    // Colonne droite : Consumption & Resources avec analyse IA
+    html += '<div class="col-lg-6">';
+    html += generateConsumptionResourcesBlockSection(analysisResults);
+    html += '</div>';
+    
+    html += '</div>';
+    html += '</div>';
+
+    // Tableau CAPPAGE en pleine largeur
+    if (analysisResults.cappage) {
+        html += '<div class="analysis-section fade-in-up">';
+        html += '<div class="row">';
+        html += '<div class="col-12">';
+        html += '<div id="cappage-container">Chargement de l\'historique...</div>';
+        html += '</div>';
         html += '</div>';
         html += '</div>';
+    }
 
-        // Tableau CAPPAGE en pleine largeur
-        if (analysisResults.cappage) {
-            html += '<div class="analysis-section fade-in-up">';
-            html += '<div class="row">';
-            html += '<div class="col-12">';
-            html += '<div id="cappage-container">Chargement de l\'historique...</div>';
-            html += '</div>';
-            html += '</div>';
-            html += '</div>';
-        }
+    // Tableaux BUFFER & NCO empilés
+    if (analysisResults.buffer_nco) {
+        html += '<div class="analysis-section fade-in-up">';
+        html += '<div class="row">';
+        html += '<div class="col-12">';
+        html += '<div class="card border-0">';
+        html += '<div class="card-header no-background">';
+        html += '<h3 style="color: #76279b;">BUFFER & NCO - TCD Analysis</h3>';
+        html += '</div>';
+        html += '<div class="card-body p-0">';
+        html += '<div id="buffer-nco-buffer-container">Chargement...</div>';
+        html += '<div id="buffer-nco-nco-container">Chargement...</div>';
+        html += '</div></div></div></div></div>';
+    }
 
-        // Tableaux BUFFER & NCO empilés
-        if (analysisResults.buffer_nco) {
-            html += '<div class="analysis-section fade-in-up">';
-            html += '<div class="row">';
-            html += '<div class="col-12">';
-            html += '<div class="card border-0">';
-            html += '<div class="card-header no-background">';
-            html += '<h3 style="color: #76279b;">BUFFER & NCO - TCD Analysis</h3>';
-            html += '</div>';
-            html += '<div class="card-body p-0">';
-            html += '<div id="buffer-nco-buffer-container">Chargement...</div>';
-            html += '<div id="buffer-nco-nco-container">Chargement...</div>';
-            html += '</div></div></div></div></div>';
-        }
-
-        // Tableaux CONSUMPTION & RESOURCES empilés
-        if (analysisResults.consumption_resources) {
-            html += '<div class="analysis-section fade-in-up">';
-            html += '<div class="row">';
-            html += '<div class="col-12">';
-            html += '<div class="card border-0">';
-            html += '<div class="card-header no-background">';
-            html += '<h3 style="color: #76279b;">CONSUMPTION & RESOURCES</h3>';
-            html += '</div>';
-            html += '<div class="card-body p-0">';
-            html += '<div id="consumption-container">Chargement...</div>';
-            html += '<div id="resources-container">Chargement...</div>';
-            html += '</div></div></div></div></div>';
-        }
+    // Tableaux CONSUMPTION & RESOURCES empilés
+    if (analysisResults.consumption_resources) {
+        html += '<div class="analysis-section fade-in-up">';
+        html += '<div class="row">';
+        html += '<div class="col-12">';
+        html += '<div class="card border-0">';
+        html += '<div class="card-header no-background">';
+        html += '<h3 style="color: #76279b;">CONSUMPTION & RESOURCES</h3>';
+        html += '</div>';
+        html += '<div class="card-body p-0">';
+        html += '<div id="consumption-container">Chargement...</div>';
+        html += '<div id="resources-container">Chargement...</div>';
+        html += '</div></div></div></div></div>';
+    }
 
-        // Bouton export PDF
-        html += `
-        <div class="text-center my-4">
-            <button class="btn btn-analyze btn-lg" onclick="exportToPDF()">
-                <i class="fas fa-file-pdf me-2"></i>DOWNLOAD PDF REPORT
-            </button>
-            <div class="mt-2">
-                <small class="text-muted">
-                    <i class="fas fa-lightbulb me-1"></i>
-                    Report includes analysis results and the latest AI response
-                </small>
-            </div>
+    // Bouton export PDF
+    html += `
+    <div class="text-center my-4">
+        <button class="btn btn-analyze btn-lg" onclick="exportToPDF()">
+            <i class="fas fa-file-pdf me-2"></i>DOWNLOAD PDF REPORT
+        </button>
+        <div class="mt-2">
+            <small class="text-muted">
+                <i class="fas fa-lightbulb me-1"></i>
+                Report includes analysis results and the latest AI response
+            </small>
         </div>
-        `;
-        
-        document.getElementById('results').innerHTML = html;
-
-        // Attendre que le DOM soit à jour avant de charger l'historique
-        setTimeout(() => {
-            resolve();
-        }, 100);
-
-        // Charger l'historique après un délai plus long
-        setTimeout(() => {
-            loadHistoricalTables();
-        }, 800);
-    });
+    </div>
+    `;
+    
+    return html;
 }
 
 async function loadHistoricalTables() {
@@ -1137,6 +1463,135 @@ function generateSummarySection(summaryData) {
 }
 
 
+/**
+ * Ligne client du tableau BUFFER (valeur D et variations)
+ * @param {Object} detail - Détail client (ou ligne Others)
+ * @param {string} label - Libellé affiché (nom du client par défaut)
+ */
+function bufferClientRowHTML(detail, label = null) {
+    let html = `<tr class="tcd-detail-row">`;
+    
+    // Client indenté dans la même colonne
+    html += `<td class="tcd-client-detail">
+                <div class="tcd-hierarchy-level-1">
+                    ${label || detail.client}
+                </div>
+            </td>`;
+    
+    // Valeur D (Today)
+    const valueJ = detail.value_j || 0;
+    html += `<td class="text-end tcd-data-cell">${valueJ.toFixed(3)}</td>`;
+    
+    // Variation Daily
+    const varDaily = detail.variation_daily || 0;
+    const dailyClass = varDaily >= 0 ? 'tcd-positive-var' : 'tcd-negative-var';
+    const dailyIcon = varDaily >= 0 ? '▲' : '▼';
+    html += `<td class="text-end ${dailyClass}">
+                ${varDaily >= 0 ? '+' : ''}${varDaily.toFixed(3)}
+                <span class="variation-icon">${dailyIcon}</span>
+            </td>`;
+    
+    // Variation Monthly
+    const varMonthly = detail.variation_monthly || 0;
+    const monthlyClass = varMonthly >= 0 ? 'tcd-positive-var' : 'tcd-negative-var';
+    const monthlyIcon = varMonthly >= 0 ? '▲' : '▼';
+    html += `<td class="text-end ${monthlyClass}">
+                ${varMonthly >= 0 ? '+' : ''}${varMonthly.toFixed(3)}
+                <span class="variation-icon">${monthlyIcon}</span>
+            </td>`;
+    
+    html += '</tr>';
+    return html;
+}
+
+/**
+ * Ligne client du tableau BUFFER & NCO (valeurs par date)
+ * @param {Object} detail - Détail client (ou ligne Others)
+ * @param {Array} dates - Dates des colonnes
+ * @param {string} label - Libellé affiché (nom du client par défaut)
+ */
+function bufferNcoClientRowHTML(detail, dates, label = null) {
+    let html = `<tr class="tcd-detail-row">`;
+    
+    // Client indenté
+    html += `<td class="tcd-client-detail">
+                <div class="tcd-hierarchy-level-1">
+                    ${label || detail.client}
+                </div>
+            </td>`;
+    
+    // Valeurs par date
+    dates.forEach(date => {
+        const value = detail.date_values[date] || 0;
+        const cellClass = value === 0 ? 'tcd-zero-value' : 'tcd-data-cell';
+        html += `<td class="text-end ${cellClass}">${value.toFixed(3)}</td>`;
+    });
+    
+    html += '</tr>';
+    return html;
+}
+
+/**
+ * Ligne "Others" : clients regroupés par l'élagage du serveur, avec un
+ * bouton qui charge les suivants (/api/drilldown)
+ * @param {string} table - 'buffer' ou 'buffer_nco'
+ * @param {string} section - Section du tableau
+ * @param {Object} others - Ligne Others (sommes et client_count)
+ * @param {number} offset - Nombre de clients déjà affichés dans la section
+ */
+function othersRowHTML(table, section, others, offset) {
+    const label = `
+        <em>${others.client}</em>
+        <button class="btn btn-link btn-sm p-0 ms-2" data-table="${table}" data-section="${section}"
+                data-offset="${offset}" onclick="loadDrilldown(this)">Show more</button>`;
+    const html = table === 'buffer'
+        ? bufferClientRowHTML(others, label)
+        : bufferNcoClientRowHTML(others, Object.keys(others.date_values), label);
+    return html.replace('<tr class="tcd-detail-row">', '<tr class="tcd-detail-row tcd-others-row">');
+}
+
+/**
+ * Charge la page suivante des clients regroupés dans "Others" et l'insère
+ * avant la ligne Others, remplacée par le reste (ou retirée)
+ * @param {HTMLElement} button - Bouton "Show more" de la ligne Others
+ */
+async function loadDrilldown(button) {
+    const { table, section } = button.dataset;
+    const offset = parseInt(button.dataset.offset, 10);
+    const othersRow = button.closest('tr');
+    button.disabled = true;
+
+    try {
+        const response = await fetch(
+            `/api/drilldown/${table}/${encodeURIComponent(section)}?offset=${offset}&limit=${DRILLDOWN_PAGE_SIZE}`
+        );
+        if (response.status === 404) {
+            // Drill-down indisponible (serveur sans /api/drilldown) : ligne Others seule
+            button.remove();
+            return;
+        }
+        if (!response.ok) {
+            const errorText = await response.text();
+            throw new Error(`Erreur serveur ${response.status}: ${errorText}`);
+        }
+        const page = await response.json();
+
+        const rows = page.clients.map(detail => (table === 'buffer'
+            ? bufferClientRowHTML(detail)
+            : bufferNcoClientRowHTML(detail, Object.keys(detail.date_values))));
+        othersRow.insertAdjacentHTML('beforebegin', rows.join(''));
+
+        if (page.others) {
+            othersRow.outerHTML = othersRowHTML(table, section, page.others, offset + page.clients.length);
+        } else {
+            othersRow.remove();
+        }
+    } catch (error) {
+        console.error('❌ Erreur drill-down:', error);
+        button.disabled = false;
+    }
+}
+
 /**
  * Génère le HTML du tableau BUFFER avec structure TCD Excel et variations
  */
@@ -1213,40 +1668,12 @@ function generateBufferTableHTML(bufferData) {
         // LIGNES DE DÉTAIL : Clients indentés
         // N'afficher les détails QUE pour la section "1.1- Cash"
         if (sectionGroup.section === "1.1- Cash") {
-            clientDetails.forEach((detail, detailIndex) => {
-                html += `<tr class="tcd-detail-row">`;
-                
-                // Client indenté dans la même colonne
-                html += `<td class="tcd-client-detail">
-                            <div class="tcd-hierarchy-level-1">
-                                ${detail.client}
-                            </div>
-                        </td>`;
-                
-                // Valeur D (Today)
-                const valueJ = detail.value_j || 0;
-                html += `<td class="text-end tcd-data-cell">${valueJ.toFixed(3)}</td>`;
-                
-                // Variation Daily
-                const varDaily = detail.variation_daily || 0;
-                const dailyClass = varDaily >= 0 ? 'tcd-positive-var' : 'tcd-negative-var';
-                const dailyIcon = varDaily >= 0 ? '▲' : '▼';
-                html += `<td class="text-end ${dailyClass}">
-                            ${varDaily >= 0 ? '+' : ''}${varDaily.toFixed(3)}
-                            <span class="variation-icon">${dailyIcon}</span>
-                        </td>`;
-                
-                // Variation Monthly
-                const varMonthly = detail.variation_monthly || 0;
-                const monthlyClass = varMonthly >= 0 ? 'tcd-positive-var' : 'tcd-negative-var';
-                const monthlyIcon = varMonthly >= 0 ? '▲' : '▼';
-                html += `<td class="text-end ${monthlyClass}">
-                            ${varMonthly >= 0 ? '+' : ''}${varMonthly.toFixed(3)}
-                            <span class="variation-icon">${monthlyIcon}</span>
-                        </td>`;
-                
-                html += '</tr>';
+            clientDetails.forEach(detail => {
+                html += bufferClientRowHTML(detail);
             });
+            if (sectionGroup.others) {
+                html += othersRowHTML('buffer', sectionGroup.section, sectionGroup.others, clientDetails.length);
+            }
         }
         // Pour toutes les autres sections, on ne montre PAS les détails clients
         // On passe directement à la ligne de séparation
@@ -2178,25 +2605,12 @@ function generateBufferNcoBufferSingleDayHTML(bufferNcoData) {
         // LIGNES DE DÉTAIL : Clients indentés
         // N'afficher les détails QUE pour la section "1.1- Cash"
         if (sectionGroup.section === "1.1- Cash") {
-            clientDetails.forEach((detail, detailIndex) => {
-                html += `<tr class="tcd-detail-row">`;
-                
-                // Client indenté
-                html += `<td class="tcd-client-detail">
-                            <div class="tcd-hierarchy-level-1">
-                                ${detail.client}
-                            </div>
-                        </td>`;
-                
-                // Valeurs par date
-                dates.forEach(date => {
-                    const value = detail.date_values[date] || 0;
-                    const cellClass = value === 0 ? 'tcd-zero-value' : 'tcd-data-cell';
-                    html += `<td class="text-end ${cellClass}">${value.toFixed(3)}</td>`;
-                });
-                
-                html += '</tr>';
+            clientDetails.forEach(detail => {
+                html += bufferNcoClientRowHTML(detail, dates);
             });
+            if (sectionGroup.others) {
+                html += othersRowHTML('buffer_nco', sectionGroup.section, sectionGroup.others, clientDetails.length);
+            }
         }
         // Pour toutes les autres sections, on ne montre PAS les détails clients
         
@@ -0,0 +1,297 @@
+# table_specs.py
+"""
+Registre des spécifications de tableaux
+=======================================
+
+Chaque tableau d'analyse est décrit par une entrée de TABLE_SPECS :
+filtres (prédicats nommés de PREDICATES), hiérarchie de lignes, dimension
+en colonne, mesure et échelle. compile_plan regroupe les spécifications en
+un plan d'exécution : chaque prédicat est évalué une seule fois par cube,
+chaque combinaison de filtres n'est calculée qu'une fois, puis chaque
+spécification est agrégée par un groupby vectorisé.
+
+Ajouter un tableau de pilotage = ajouter un prédicat si besoin et une
+entrée dans TABLE_SPECS (avec "render": "generic" si aucun format JSON
+dédié n'est requis).
+"""
+
+import hashlib
+import json
+import logging
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+ASSIETTE = "LCR_Assiette Pondérée"
+IMPACT = "LCR_ECO_IMPACT_LCR"
+DATE = "Date d'arrêté"
+BILLION = 1_000_000_000
+
+CONSUMPTION_GROUPES = ["A&WM & Insurance", "CIB Financing", "CIB Markets", "GLOBAL TRADE", "Other Consumption"]
+CONSUMPTION_EXCLUDED_SOUS_METIER = ["GT TREASURY SOLUTIONS", "GT GROUP SERVICES"]
+RESOURCES_GROUPES = ["GLOBAL TRADE", "Other Contribution", "Treasury"]
+RESOURCES_EXCLUDED_SOUS_METIER = ["GT GROUP SERVICES", "GT COMMODITY", "GT TRADE FINANCE", "SYN GLOBAL TRADE"]
+# Le tableau CONSUMPTION & RESOURCES par date n'exclut pas SYN GLOBAL TRADE
+RESOURCES_BY_DATE_EXCLUDED_SOUS_METIER = ["GT GROUP SERVICES", "GT COMMODITY", "GT TRADE FINANCE"]
+EXCLUDED_PRODUIT = ["SIGHT DEPOSIT MIRROR", "SIGHT FINANCING MIRROR"]
+CAPPAGE_SI_REMETTANT = ["SHORT_LCR", "CAPREOS"]
+AJUST_SI_REMETTANT = ['AJUST AJUSTGAP', 'AJUST SUMMIT', 'AJUST SUMMIT_TITRES']
+
+# Prédicats nommés : (colonne, opérateur, valeur(s)), opérateur parmi eq / isin / notin
+PREDICATES = {
+    "buffer_category": ("LCR_Catégorie", "eq", "1- Buffer"),
+    "consumption_groupes": ("LCR_ECO_GROUPE_METIERS", "isin", CONSUMPTION_GROUPES),
+    "consumption_sous_metier": ("Sous-Métier", "notin", CONSUMPTION_EXCLUDED_SOUS_METIER),
+    "resources_groupes": ("LCR_ECO_GROUPE_METIERS", "isin", RESOURCES_GROUPES),
+    "resources_sous_metier": ("Sous-Métier", "notin", RESOURCES_EXCLUDED_SOUS_METIER),
+    "resources_by_date_sous_metier": ("Sous-Métier", "notin", RESOURCES_BY_DATE_EXCLUDED_SOUS_METIER),
+    "excluded_produit": ("Produit", "notin", EXCLUDED_PRODUIT),
+    "cappage_si_remettant": ("SI Remettant", "isin", CAPPAGE_SI_REMETTANT),
+    "ajust_si_remettant": ("SI Remettant", "isin", AJUST_SI_REMETTANT),
+}
+
+# Spécifications des agrégats (toutes sur les lignes Top Conso = "O" du cube)
+#   filters: prédicats combinés en ET
+#   rows: hiérarchie de lignes
+#   columns: dimension en colonne (TCD), None pour une simple somme
+#   all_columns: colonnes = toutes les valeurs du fichier (sinon celles des lignes filtrées)
+#   measure: colonne (ou liste de colonnes) sommée
+#   scale: diviseur appliqué aux sommes
+#   render / title (optionnels): "generic" pour une restitution sans mise en
+#     forme dédiée (lcr_tables.create_generic_table), sous ce titre
+TABLE_SPECS = {
+    "buffer": {
+        "filters": ["buffer_category"],
+        "rows": ["LCR_Template Section 1", "Libellé Client"],
+        "columns": None,
+        "measure": ASSIETTE,
+        "scale": BILLION,
+    },
+    "summary": {
+        "filters": [],
+        "rows": [DATE],
+        "columns": None,
+        "measure": [ASSIETTE, IMPACT],
+        "scale": BILLION,
+    },
+    "consumption": {
+        "filters": ["consumption_groupes", "consumption_sous_metier", "excluded_produit"],
+        "rows": ["LCR_ECO_GROUPE_METIERS"],
+        "columns": None,
+        "measure": IMPACT,
+        "scale": 1,
+    },
+    "resources": {
+        "filters": ["resources_groupes", "resources_sous_metier", "excluded_produit"],
+        "rows": ["LCR_ECO_GROUPE_METIERS"],
+        "columns": None,
+        "measure": IMPACT,
+        "scale": 1,
+    },
+    "cappage": {
+        "filters": ["cappage_si_remettant"],
+        "rows": ["SI Remettant", "Commentaire"],
+        "columns": DATE,
+        "all_columns": False,
+        "measure": ASSIETTE,
+        "scale": BILLION,
+    },
+    "buffer_nco_buffer": {
+        "filters": ["buffer_category"],
+        "rows": ["LCR_Template Section 1", "Libellé Client"],
+        "columns": DATE,
+        "all_columns": True,
+        "measure": ASSIETTE,
+        "scale": BILLION,
+    },
+    "buffer_nco_nco": {
+        "filters": [],
+        "rows": ["LCR_Catégorie"],
+        "columns": DATE,
+        "all_columns": True,
+        "measure": ASSIETTE,
+        "scale": BILLION,
+    },
+    "consumption_by_date": {
+        "filters": ["consumption_groupes", "consumption_sous_metier"],
+        "rows": ["LCR_ECO_GROUPE_METIERS"],
+        "columns": DATE,
+        "all_columns": True,
+        "measure": IMPACT,
+        "scale": BILLION,
+    },
+    "resources_by_date": {
+        "filters": ["resources_groupes", "resources_by_date_sous_metier"],
+        "rows": ["LCR_ECO_GROUPE_METIERS"],
+        "columns": DATE,
+        "all_columns": True,
+        "measure": IMPACT,
+        "scale": BILLION,
+    },
+    "si_remettant": {
+        "filters": ["ajust_si_remettant"],
+        "rows": ["SI Remettant"],
+        "columns": None,
+        "measure": ASSIETTE,
+        "scale": BILLION,
+    },
+    # Tableau de pilotage sans mise en forme dédiée (create_generic_table)
+    "impact_by_category": {
+        "filters": ["excluded_produit"],
+        "rows": ["LCR_Catégorie"],
+        "columns": DATE,
+        "all_columns": True,
+        "measure": IMPACT,
+        "scale": BILLION,
+        "render": "generic",
+        "title": "LCR ECO IMPACT BY CATEGORY",
+    },
+}
+
+
+def _spec_version():
+    """Empreinte des prédicats et spécifications (change avec la configuration)"""
+    payload = json.dumps({"predicates": PREDICATES, "specs": TABLE_SPECS}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+# Version des spécifications, partie des clés de cache des analyses et des cubes
+SPEC_VERSION = _spec_version()
+
+
+def predicate_values(name):
+    """Valeur(s) d'un prédicat (pour les métadonnées des tableaux)"""
+    return PREDICATES[name][2]
+
+
+def spec_columns(*spec_names):
+    """Colonnes source nécessaires aux spécifications (dont Top Conso)"""
+    columns = ["Top Conso"]
+    for name in spec_names:
+        spec = TABLE_SPECS[name]
+        measures = spec["measure"] if isinstance(spec["measure"], list) else [spec["measure"]]
+        candidates = ([PREDICATES[p][0] for p in spec["filters"]] + spec["rows"]
+                      + ([spec["columns"]] if spec["columns"] else []) + measures)
+        for col in candidates:
+            if col not in columns:
+                columns.append(col)
+    return columns
+
+
+def compile_plan(spec_names=None):
+    """
+    Plan d'exécution pour les spécifications demandées (toutes par défaut) :
+    prédicats distincts, combinaisons de filtres distinctes, spécifications
+    """
+    spec_names = list(TABLE_SPECS) if spec_names is None else list(spec_names)
+
+    predicates = []
+    filter_sets = []
+    for name in spec_names:
+        filters = tuple(sorted(TABLE_SPECS[name]["filters"]))
+        for predicate in filters:
+            if predicate not in predicates:
+                predicates.append(predicate)
+        if filters not in filter_sets:
+            filter_sets.append(filters)
+
+    return {
+        "predicates": predicates,
+        "filter_sets": filter_sets,
+        "specs": spec_names,
+    }
+
+
+def _evaluate_predicate(data, name):
+    column, operator, values = PREDICATES[name]
+    if operator == "eq":
+        mask = data[column] == values
+    elif operator == "isin":
+        mask = data[column].isin(values)
+    elif operator == "notin":
+        mask = ~data[column].isin(values)
+    else:
+        raise ValueError(f"Opérateur de prédicat inconnu: {operator}")
+    return mask.to_numpy()
+
+
+def _aggregate(rows, spec, all_column_values):
+    """Agrégat d'une spécification sur les lignes déjà filtrées"""
+    keys = spec["rows"] + ([spec["columns"]] if spec["columns"] else [])
+    measure = spec["measure"]
+
+    if spec["columns"]:
+        column_values = (all_column_values[spec["columns"]] if spec.get("all_columns")
+                         else sorted(rows[spec["columns"]].unique()))
+        if len(rows) == 0:
+            return pd.DataFrame(columns=column_values, dtype="float64")
+        sums = rows.groupby(keys, observed=True)[measure].sum()
+        pivot = sums.unstack(spec["columns"], fill_value=0.0)
+        result = pivot.reindex(columns=column_values, fill_value=0.0).sort_index()
+    else:
+        result = rows.groupby(keys, observed=True)[measure].sum()
+
+    return result / spec["scale"]
+
+
+def aggregate_rows(rows, spec_name, column_values=None):
+    """
+    Agrégat d'une spécification sur des lignes déjà filtrées par ses
+    prédicats (ex. sélection par FrameIndex)
+    column_values: colonnes du TCD si all_columns (toutes les dates du
+    fichier), celles des lignes par défaut
+    """
+    spec = TABLE_SPECS[spec_name]
+    if spec["columns"] and column_values is None:
+        column_values = sorted(rows[spec["columns"]].unique())
+    return _aggregate(rows, spec, {spec["columns"]: column_values})
+
+
+def execute_plan(plan, data, index=None):
+    """
+    Exécute un plan sur les données d'un cube.
+    index: FrameIndex de data, optionnel ; les prédicats des colonnes
+    indexées sont alors évalués par bitmaps (et gardés en cache dans l'index),
+    les filtres combinés par ET bit à bit.
+    Retourne {nom de spécification: Series (sans colonne) ou DataFrame (TCD)},
+    None pour une spécification dont des colonnes manquent dans le fichier
+    """
+    runnable = [name for name in plan["specs"]
+                if all(col in data.columns for col in spec_columns(name)[1:])]
+    needed_filters = {tuple(sorted(TABLE_SPECS[name]["filters"])) for name in runnable}
+
+    indexed = [name for name in plan["predicates"] if index is not None and index.can_evaluate(name)]
+    masks = {name: _evaluate_predicate(data, name) for name in plan["predicates"]
+             if name not in indexed and any(name in filters for filters in needed_filters)}
+
+    filtered = {}
+    for filters in plan["filter_sets"]:
+        if filters not in needed_filters:
+            continue
+        if not filters:
+            filtered[filters] = data
+            continue
+        if all(name in indexed for name in filters):
+            # ET bit à bit des bitmaps, un seul dépaquetage
+            filtered[filters] = data[index.select(*filters)]
+            continue
+        mask = None
+        for predicate in filters:
+            predicate_mask = masks[predicate] if predicate in masks else index.mask(index.predicate(predicate))
+            mask = predicate_mask if mask is None else mask & predicate_mask
+        filtered[filters] = data[mask]
+
+    # Valeurs de colonnes sur l'ensemble du fichier (ex: toutes les dates)
+    all_column_values = {}
+    for name in runnable:
+        column = TABLE_SPECS[name]["columns"]
+        if column and column not in all_column_values:
+            all_column_values[column] = sorted(data[column].unique())
+
+    return {
+        name: (_aggregate(filtered[tuple(sorted(TABLE_SPECS[name]["filters"]))],
+                          TABLE_SPECS[name], all_column_values)
+               if name in runnable else None)
+        for name in plan["specs"]
+    }
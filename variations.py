@@ -0,0 +1,100 @@
+# variations.py
+"""
+Moteur de variations J / J-1 / M-1
+==================================
+
+Aligne un agrégat (Series indexée par ses colonnes clés) sur les trois
+périodes par jointure externe, puis calcule en une passe vectorisée :
+- variation absolue : J - J-1 (daily), J - M-1 (monthly)
+- variation relative : variation / |référence| (None si référence nulle)
+- contribution : variation / |total de la référence|, la somme des
+  contributions donne la variation relative du total
+
+Utilisé par le tableau BUFFER et par le tableau VARIATIONS (toutes les
+spécifications de table_specs), lui-même repris dans le contexte du chatbot.
+"""
+
+import numpy as np
+import pandas as pd
+
+BASE_PERIOD = "j"
+# Comparaisons : nom -> période de référence
+COMPARISONS = {"daily": "jMinus1", "monthly": "mMinus1"}
+PERIODS = [BASE_PERIOD] + list(COMPARISONS.values())
+
+
+def align_periods(series_by_period: dict, how: str = "outer"):
+    """
+    Aligne {période: Series} sur leurs clés.
+    how="outer": union des clés ; how="left": clés de la période J seulement
+    Retourne un DataFrame (index = clés, colonnes = PERIODS), 0 si absent
+    """
+    present = {period: series for period, series in series_by_period.items()
+               if period in PERIODS and series is not None and len(series) > 0}
+    if not present:
+        return pd.DataFrame(columns=PERIODS, dtype="float64")
+
+    aligned = pd.concat(present, axis=1, join="outer", sort=True)
+    aligned = aligned.reindex(columns=PERIODS).astype("float64").fillna(0.0)
+
+    if how == "left":
+        base = present.get(BASE_PERIOD)
+        aligned = aligned.loc[aligned.index.isin(base.index)] if base is not None else aligned.iloc[0:0]
+    return aligned
+
+
+def compute_variations(aligned):
+    """
+    Variations d'un DataFrame aligné (align_periods).
+    Colonnes : value_<période>, variation_<comparaison>, variation_<comparaison>_pct,
+    contribution_<comparaison>
+    """
+    result = pd.DataFrame(index=aligned.index)
+    for period in PERIODS:
+        result[f"value_{period}"] = aligned[period]
+
+    base = aligned[BASE_PERIOD].to_numpy()
+    for name, period in COMPARISONS.items():
+        reference = aligned[period].to_numpy()
+        delta = base - reference
+        reference_total = abs(reference.sum())
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = np.where(reference != 0, delta / np.abs(reference), np.nan)
+        contribution = delta / reference_total if reference_total else np.full(len(delta), np.nan)
+
+        result[f"variation_{name}"] = delta
+        result[f"variation_{name}_pct"] = pct
+        result[f"contribution_{name}"] = contribution
+    return result
+
+
+def period_variations(series_by_period: dict, how: str = "outer"):
+    """align_periods puis compute_variations"""
+    return compute_variations(align_periods(series_by_period, how))
+
+
+def total_variations(variations):
+    """Totaux d'un DataFrame de variations : valeurs, variations absolues et relatives"""
+    totals = {}
+    for period in PERIODS:
+        totals[f"value_{period}"] = float(variations[f"value_{period}"].sum())
+    for name, period in COMPARISONS.items():
+        delta = totals[f"value_{BASE_PERIOD}"] - totals[f"value_{period}"]
+        reference = totals[f"value_{period}"]
+        totals[f"variation_{name}"] = delta
+        totals[f"variation_{name}_pct"] = delta / abs(reference) if reference else None
+    return totals
+
+
+def variations_to_records(variations, key_names):
+    """Lignes JSON : clés nommées + colonnes de variations (NaN -> None)"""
+    columns = list(variations.columns)
+    values = variations.to_numpy(dtype="float64")
+    records = []
+    for keys, row in zip(variations.index, values.tolist()):
+        keys = keys if isinstance(keys, tuple) else (keys,)
+        record = {name: str(key) for name, key in zip(key_names, keys)}
+        record.update({col: (None if value != value else value) for col, value in zip(columns, row)})
+        records.append(record)
+    return records
@@ -0,0 +1,132 @@
+# wire_format.py
+"""
+Format compact des résultats d'analyse
+======================================
+
+Les tableaux d'analyse sont des listes de dictionnaires : chaque ligne
+client répète ses clés ("client", "value_j", "is_detail", ...) et chaque
+ligne de cappage répète tout son dictionnaire date_values. Le format
+compact (opt-in, ?format=compact) transpose ces listes en colonnes :
+
+    {"$rows": n, "$columns": {clé: colonne}}
+
+Une colonne de textes devient une liste d'indices dans le dictionnaire de
+libellés partagé par toute la réponse ({"$labels": [...]}), une colonne de
+dictionnaires de mêmes clés est elle-même transposée. La réponse vaut
+{"format": "compact", "labels": [...], "data": ...} ; decodeCompact
+(main.js) reconstruit les objets d'origine.
+
+La sérialisation passe par orjson si installé (json sinon), la compression
+par StreamAwareGZipMiddleware (gzip, sauf flux SSE et NDJSON).
+"""
+
+import json
+
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # orjson absent : json standard
+    orjson = None
+
+# Taille minimale d'une liste de dictionnaires pour la transposer en colonnes
+COMPACT_MIN_ROWS = 2
+
+# Taille minimale d'une réponse compressée (octets)
+GZIP_MIN_SIZE = 1024
+
+# Types acceptés des requêtes de flux, jamais compressées
+STREAMING_MEDIA_TYPES = (b"text/event-stream", b"application/x-ndjson")
+
+
+class _CompactEncoder:
+    """Transpose les listes de lignes et collecte les libellés partagés"""
+
+    def __init__(self):
+        self.labels = []
+        self._label_ids = {}
+
+    def label(self, text: str) -> int:
+        label_id = self._label_ids.get(text)
+        if label_id is None:
+            label_id = self._label_ids[text] = len(self.labels)
+            self.labels.append(text)
+        return label_id
+
+    def value(self, value):
+        if isinstance(value, dict):
+            return {key: self.value(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            table = self.columns(value)
+            return table if table is not None else [self.value(item) for item in value]
+        return value
+
+    def columns(self, rows):
+        """Liste de dictionnaires de mêmes clés -> colonnes, None sinon"""
+        if len(rows) < COMPACT_MIN_ROWS or not all(isinstance(row, dict) for row in rows):
+            return None
+        keys = rows[0].keys()
+        if any(row.keys() != keys for row in rows):
+            return None
+        return {
+            "$rows": len(rows),
+            "$columns": {key: self.column([row[key] for row in rows]) for key in keys},
+        }
+
+    def column(self, values):
+        if all(value is None or isinstance(value, str) for value in values) and any(values):
+            return {"$labels": [None if value is None else self.label(value) for value in values]}
+        table = self.columns(values)
+        if table is not None:
+            return table
+        return [self.value(value) for value in values]
+
+
+def encode_compact(content):
+    """Contenu JSON -> {"format": "compact", "labels": [...], "data": ...}"""
+    encoder = _CompactEncoder()
+    data = encoder.value(content)
+    return {"format": "compact", "labels": encoder.labels, "data": data}
+
+
+def _json_default(value):
+    # Scalaires numpy / pandas et dates éventuels dans les tableaux
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def dumps(content) -> bytes:
+    """Sérialisation JSON (orjson si disponible)"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_json_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """Réponse JSON sérialisée par dumps (sans passage par jsonable_encoder)"""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+class StreamAwareGZipMiddleware(GZipMiddleware):
+    """
+    Compression gzip des réponses, sauf les flux (Server-Sent Events, NDJSON) :
+    gzip retiendrait les enregistrements dans son tampon au lieu de les envoyer un à un
+    """
+
+    def __init__(self, app, minimum_size: int = GZIP_MIN_SIZE, **kwargs):
+        super().__init__(app, minimum_size=minimum_size, **kwargs)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            accept = dict(scope.get("headers") or []).get(b"accept", b"")
+            if any(media_type in accept for media_type in STREAMING_MEDIA_TYPES):
+                await self.app(scope, receive, send)
+                return
+        await super().__call__(scope, receive, send)